@@ -0,0 +1,130 @@
+"""
+Shared fixtures of the benchmark suite.
+
+The benchmarks only run when QUIZLY_BENCHMARK=1 is set, so a plain
+`pytest` run of the functional tests stays fast. All results are written
+to one JSON report (QUIZLY_BENCHMARK_REPORT, default
+benchmarks/report.json) whose keys are stable, so reports of two commits
+can be compared with any JSON diff tool.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+import django
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCHMARK_DIR / "fixtures"
+REPORT_PATH = Path(
+    os.getenv("QUIZLY_BENCHMARK_REPORT", BENCHMARK_DIR / "report.json")
+)
+ENABLED = os.getenv("QUIZLY_BENCHMARK") == "1"
+
+
+def pytest_collection_modifyitems(config, items):
+    if ENABLED:
+        return
+    skip = pytest.mark.skip(reason="set QUIZLY_BENCHMARK=1 to run")
+    for item in items:
+        if BENCHMARK_DIR in Path(item.fspath).parents:
+            item.add_marker(skip)
+
+
+class BenchmarkReport:
+    """
+    Collects benchmark results and writes them as JSON.
+
+    Methods:
+        - measure(name, func, iterations, **extra): Times `func`, counts
+          its queries and stores latency percentiles and throughput.
+        - record(name, **values): Stores arbitrary values under `name`.
+        - write(): Writes the report to `REPORT_PATH`.
+    """
+
+    def __init__(self):
+        self.results = {}
+
+    def measure(self, name, func, iterations, **extra):
+        durations = []
+        queries = []
+        for index in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                func(index)
+                durations.append(time.perf_counter() - start)
+            queries.append(len(captured.captured_queries))
+
+        durations.sort()
+        total = sum(durations)
+        result = {
+            "iterations": iterations,
+            "mean_ms": round(statistics.mean(durations) * 1000, 3),
+            "p50_ms": round(_percentile(durations, 50) * 1000, 3),
+            "p95_ms": round(_percentile(durations, 95) * 1000, 3),
+            "max_ms": round(durations[-1] * 1000, 3),
+            "throughput_per_s": round(iterations / total, 2),
+            "queries": max(queries),
+        }
+        result.update(extra)
+        self.results[name] = result
+        return result
+
+    def record(self, name, **values):
+        self.results[name] = values
+
+    def write(self):
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            },
+            "results": dict(sorted(self.results.items())),
+        }
+        REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        REPORT_PATH.write_text(
+            json.dumps(report, indent=2) + "\n", encoding="utf-8"
+        )
+
+
+def _percentile(sorted_values, percent):
+    index = round((len(sorted_values) - 1) * percent / 100)
+    return sorted_values[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=BENCHMARK_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@pytest.fixture(scope="session")
+def report():
+    benchmark_report = BenchmarkReport()
+    yield benchmark_report
+    if benchmark_report.results:
+        benchmark_report.write()
+
+
+@pytest.fixture(autouse=True)
+def isolated_metrics(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path / "metrics")
+
+
+@pytest.fixture
+def audio_fixture():
+    return FIXTURES_DIR / "short_audio.wav"
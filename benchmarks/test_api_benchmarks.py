@@ -0,0 +1,266 @@
+"""
+Latency, throughput and query counts of the quiz and auth endpoints.
+
+Sizes can be tuned with QUIZLY_BENCHMARK_USERS,
+QUIZLY_BENCHMARK_QUIZZES (per user), QUIZLY_BENCHMARK_QUESTIONS
+(per quiz), QUIZLY_BENCHMARK_ITERATIONS and
+QUIZLY_BENCHMARK_ATTEMPT_ITERATIONS. Run with
+QUIZ_DENORMALISED_QUESTIONS=True to measure the cached read path.
+"""
+
+import os
+import time
+import tracemalloc
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from quiz_app.models import (Quiz, QuizQuestions, QuizSearchDocument,
+                             question_cache_entry)
+from quiz_app.scoring import get_answer_index, score_answers
+
+USERS = int(os.getenv("QUIZLY_BENCHMARK_USERS", "3"))
+QUIZZES = int(os.getenv("QUIZLY_BENCHMARK_QUIZZES", "2000"))
+QUESTIONS = int(os.getenv("QUIZLY_BENCHMARK_QUESTIONS", "10"))
+ITERATIONS = int(os.getenv("QUIZLY_BENCHMARK_ITERATIONS", "20"))
+LOGIN_ITERATIONS = int(os.getenv("QUIZLY_BENCHMARK_LOGIN_ITERATIONS", "5"))
+ATTEMPT_ITERATIONS = int(
+    os.getenv("QUIZLY_BENCHMARK_ATTEMPT_ITERATIONS", "500")
+)
+BATCH_SIZE = 1000
+PASSWORD = "benchmark-password"
+
+pytestmark = pytest.mark.django_db
+
+
+def seed_user(username):
+    user = User.objects.create_user(username=username, password=PASSWORD)
+    quizzes = Quiz.objects.bulk_create(
+        [
+            Quiz(
+                owner=user,
+                title=f"Quiz {number}",
+                description=f"Benchmark quiz {number} of {username}.",
+                video_url=f"https://www.youtube.com/watch?v=bench{number}",
+            )
+            for number in range(QUIZZES)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    questions = QuizQuestions.objects.bulk_create(
+        [
+            QuizQuestions(
+                question_title=f"Question {number}?",
+                question_options=["A", "B", "C", "D"],
+                answer="A",
+            )
+            for number in range(QUIZZES * QUESTIONS)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    through = Quiz.questions.through
+    through.objects.bulk_create(
+        [
+            through(quiz_id=quiz.id, quizquestions_id=question.id)
+            for index, quiz in enumerate(quizzes)
+            for question in questions[
+                index * QUESTIONS:(index + 1) * QUESTIONS
+            ]
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    for index, quiz in enumerate(quizzes):
+        quiz.questions_cache = [
+            question_cache_entry(question)
+            for question in questions[
+                index * QUESTIONS:(index + 1) * QUESTIONS
+            ]
+        ]
+    Quiz.objects.bulk_update(quizzes, ["questions_cache"],
+                             batch_size=BATCH_SIZE)
+
+    QuizSearchDocument.objects.bulk_create(
+        [
+            QuizSearchDocument(
+                quiz_id=quiz.id,
+                owner=user,
+                title=quiz.title,
+                description=quiz.description,
+                questions=" ".join(
+                    question["question_title"]
+                    for question in quiz.questions_cache
+                ),
+            )
+            for quiz in quizzes
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return user, [quiz.id for quiz in quizzes]
+
+
+@pytest.fixture(scope="module")
+def seeded(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        users = [seed_user(f"bench_user_{number}") for number in range(USERS)]
+        yield users
+        for user, _ in users:
+            QuizQuestions.objects.filter(quiz__owner=user).delete()
+            user.delete()
+
+
+@pytest.fixture
+def logged_in(seeded):
+    user, quiz_ids = seeded[0]
+    client = APIClient()
+    response = client.post(
+        reverse("login"),
+        {"username": user.username, "password": PASSWORD},
+        format="json",
+    )
+    assert response.status_code == 200
+    return client, quiz_ids
+
+
+def test_list_quizzes(report, logged_in):
+    client, _ = logged_in
+    url = reverse("quizzes-view")
+
+    def request(index):
+        response = client.get(url)
+        assert response.status_code == 200
+
+    report.measure("api.list", request, ITERATIONS,
+                   quizzes=QUIZZES, questions_per_quiz=QUESTIONS)
+
+
+def test_search(report, logged_in):
+    client, _ = logged_in
+    url = reverse("quiz-search")
+
+    def request(index):
+        response = client.get(url, {"q": f"quiz {index}"})
+        assert response.status_code == 200
+        assert response.data["count"] > 0
+
+    report.measure("api.search", request, ITERATIONS, quizzes=QUIZZES)
+
+
+def test_export(report, logged_in):
+    client, _ = logged_in
+    url = reverse("quiz-export")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url)
+    lines = sum(1 for _ in response.streaming_content)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert lines == QUIZZES
+    report.record(
+        "api.export",
+        quizzes=lines,
+        seconds=round(seconds, 3),
+        quizzes_per_s=round(lines / seconds, 1),
+        peak_memory_kib=round(peak / 1024, 1),
+    )
+
+
+def test_quiz_detail(report, logged_in):
+    client, quiz_ids = logged_in
+
+    def request(index):
+        url = reverse("quiz-single-view",
+                      kwargs={"pk": quiz_ids[index % len(quiz_ids)]})
+        response = client.get(url)
+        assert response.status_code == 200
+
+    report.measure("api.detail", request, ITERATIONS)
+
+
+def test_quiz_patch(report, logged_in):
+    client, quiz_ids = logged_in
+
+    def request(index):
+        url = reverse("quiz-single-view",
+                      kwargs={"pk": quiz_ids[index % len(quiz_ids)]})
+        response = client.patch(url, {"title": f"Renamed {index}"},
+                                format="json")
+        assert response.status_code == 200
+
+    report.measure("api.patch", request, ITERATIONS)
+
+
+def test_quiz_attempt(report, logged_in):
+    client, quiz_ids = logged_in
+    quiz_id = quiz_ids[-1]
+    url = reverse("quiz-attempts", kwargs={"pk": quiz_id})
+    answers = [
+        {"question_id": question_id, "answer": "A"}
+        for question_id in get_answer_index(quiz_id)["answers"]
+    ]
+
+    def request(index):
+        response = client.post(url, {"answers": answers}, format="json")
+        assert response.status_code == 201
+
+    report.measure("api.attempt", request, ATTEMPT_ITERATIONS,
+                   questions_per_quiz=QUESTIONS)
+
+
+def test_attempt_scoring(report, seeded):
+    _, quiz_ids = seeded[0]
+    answer_index = get_answer_index(quiz_ids[-1])
+    answers = [
+        (question_id, "A") for question_id in answer_index["answers"]
+    ]
+
+    def score(index):
+        score_answers(answer_index, answers)
+
+    report.measure("scoring.score", score, ATTEMPT_ITERATIONS,
+                   questions_per_quiz=QUESTIONS)
+
+
+def test_quiz_delete(report, logged_in):
+    client, quiz_ids = logged_in
+
+    def request(index):
+        url = reverse("quiz-single-view", kwargs={"pk": quiz_ids[index]})
+        response = client.delete(url)
+        assert response.status_code == 204
+
+    report.measure("api.delete", request, min(ITERATIONS, len(quiz_ids)))
+
+
+def test_login(report, seeded):
+    user, _ = seeded[0]
+    client = APIClient()
+    url = reverse("login")
+
+    def request(index):
+        response = client.post(
+            url,
+            {"username": user.username, "password": PASSWORD},
+            format="json",
+        )
+        assert response.status_code == 200
+
+    report.measure("api.login", request, LOGIN_ITERATIONS)
+
+
+def test_token_refresh(report, logged_in):
+    client, _ = logged_in
+    url = reverse("token_refresh")
+
+    def request(index):
+        response = client.post(url)
+        assert response.status_code == 200
+
+    report.measure("api.refresh", request, ITERATIONS)
@@ -0,0 +1,70 @@
+"""
+Insert throughput of `QuizQuestions` with per-row and batch validation.
+
+The number of questions can be changed with QUIZLY_BENCHMARK_INSERTS.
+"""
+
+import os
+import time
+
+import pytest
+
+from quiz_app.models import QuizQuestions
+from quiz_app.validators import validate_questions
+
+INSERTS = int(os.getenv("QUIZLY_BENCHMARK_INSERTS", "10000"))
+BATCH_SIZE = 1000
+
+pytestmark = pytest.mark.django_db
+
+
+def make_questions():
+    return [
+        QuizQuestions(
+            question_title=f"Question {number}?",
+            question_options=["A", "B", "C", "D"],
+            answer="A",
+        )
+        for number in range(INSERTS)
+    ]
+
+
+def record_inserts(report, name, seconds):
+    report.record(
+        name,
+        questions=INSERTS,
+        seconds=round(seconds, 3),
+        inserts_per_s=round(INSERTS / seconds, 1),
+    )
+
+
+def test_insert_with_full_clean_per_row(report):
+    questions = make_questions()
+
+    start = time.perf_counter()
+    for question in questions:
+        question.full_clean()
+        question.save()
+    record_inserts(report, "questions.full_clean_save",
+                   time.perf_counter() - start)
+
+
+def test_insert_with_save_per_row(report):
+    questions = make_questions()
+
+    start = time.perf_counter()
+    for question in questions:
+        question.save()
+    record_inserts(report, "questions.save", time.perf_counter() - start)
+
+
+def test_insert_with_batch_validation(report):
+    questions = make_questions()
+
+    start = time.perf_counter()
+    validate_questions(questions)
+    QuizQuestions.objects.bulk_create(questions, batch_size=BATCH_SIZE)
+    record_inserts(report, "questions.validate_bulk_create",
+                   time.perf_counter() - start)
+
+    assert QuizQuestions.objects.count() == INSERTS
@@ -0,0 +1,269 @@
+"""
+Timings of the `AudioQuestionGenerator` stages, fully offline.
+
+yt-dlp is replaced by a fake that copies the bundled audio fixture and
+Gemini by a fake client returning a canned quiz. The transcription stage
+uses the real Whisper model and is skipped if Whisper (or its cached
+weights) is not available.
+"""
+
+import json
+import os
+import shutil
+import time
+import wave
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from quiz_app.api.prompting import TranscriptPacker, count_tokens
+from quiz_app.api.utils import AudioQuestionGenerator, SharedWhisperModel
+from quiz_app.fingerprint import (find_transcript, fingerprint_file,
+                                  remember_transcript)
+from quiz_app.transcription import transcribe_file
+from quiz_app.vad import extract_speech
+
+ITERATIONS = int(os.getenv("QUIZLY_BENCHMARK_PIPELINE_ITERATIONS", "3"))
+PADDED_REPEATS = int(os.getenv("QUIZLY_BENCHMARK_VAD_REPEATS", "30"))
+
+pytestmark = pytest.mark.django_db
+
+GEMINI_LATENCY = float(os.getenv("QUIZLY_BENCHMARK_GEMINI_LATENCY", "0.2"))
+
+GENERATED_QUIZ = {
+    "title": "Benchmark Quiz",
+    "description": "A quiz generated by the fake Gemini client.",
+    "questions": [
+        {
+            "question_title": f"Question {number}?",
+            "question_options": ["A", "B", "C", "D"],
+            "answer": "A",
+        }
+        for number in range(10)
+    ],
+}
+
+
+class FakeYoutubeDL:
+    """
+    Stands in for `yt_dlp.YoutubeDL` and "downloads" the audio fixture.
+    """
+
+    source = None
+
+    def __init__(self, options):
+        self.options = options
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def extract_info(self, url, download=False):
+        if download:
+            target = self.options["outtmpl"] + ".wav"
+            shutil.copyfile(self.source, target)
+            size = os.path.getsize(target)
+            for hook in self.options.get("progress_hooks", []):
+                hook({"status": "finished", "filename": target,
+                      "downloaded_bytes": size, "total_bytes": size})
+        return {"duration": 3}
+
+
+class FakeGeminiModels:
+    def generate_content(self, model, contents):
+        return SimpleNamespace(
+            text="```json " + json.dumps(GENERATED_QUIZ) + "```",
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(contents) // 4,
+                candidates_token_count=400,
+            ),
+        )
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "media").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def fake_services(audio_fixture):
+    FakeYoutubeDL.source = audio_fixture
+    client = SimpleNamespace(models=FakeGeminiModels())
+    with patch("yt_dlp.YoutubeDL", FakeYoutubeDL), \
+            patch("quiz_app.api.providers.gemini",
+                  return_value=client):
+        yield
+
+
+def test_download_stage(report, workdir, fake_services):
+    generators = []
+
+    def stage(index):
+        generate = AudioQuestionGenerator(job_id=f"bench{index}")
+        generate.download_audio("https://www.youtube.com/watch?v=benchmark")
+        generators.append(generate)
+
+    report.measure("pipeline.download", stage, ITERATIONS)
+    report.results["pipeline.download"]["download_bytes"] = \
+        generators[0].download_bytes
+
+
+def test_transcription_stage(report, workdir, fake_services):
+    pytest.importorskip("whisper")
+    generators = []
+    for index in range(ITERATIONS):
+        generate = AudioQuestionGenerator(job_id=f"bench{index}")
+        generate.download_audio("https://www.youtube.com/watch?v=benchmark")
+        generators.append(generate)
+
+    def stage(index):
+        generators[index].transcribe_whisper()
+
+    report.measure("pipeline.transcribe", stage, ITERATIONS,
+                   audio_seconds=3)
+
+
+@pytest.fixture
+def padded_audio(audio_fixture, tmp_path):
+    """
+    The audio fixture followed by 7 seconds of silence, repeated
+    PADDED_REPEATS times (about 70 % of the recording is silence).
+    """
+    with wave.open(str(audio_fixture), "rb") as source:
+        params = source.getparams()
+        speech = source.readframes(source.getnframes())
+    silence = b"\0" * (7 * params.framerate * params.sampwidth
+                       * params.nchannels)
+
+    path = tmp_path / "padded.wav"
+    with wave.open(str(path), "wb") as target:
+        target.setparams(params)
+        target.writeframes((speech + silence) * PADDED_REPEATS)
+    return path
+
+
+def test_voice_activity_detection(report, padded_audio):
+    speech = extract_speech(padded_audio)
+
+    report.measure(
+        "pipeline.vad",
+        lambda index: extract_speech(padded_audio),
+        ITERATIONS,
+        audio_seconds=round(speech.audio_seconds, 2),
+        speech_seconds=round(speech.speech_seconds, 2),
+        skipped_share=round(
+            speech.skipped_seconds / speech.audio_seconds, 3
+        ),
+    )
+
+
+def test_fingerprint_lookup(report, settings, padded_audio):
+    """
+    Fingerprint of the padded recording and its lookup among
+    QUIZ_FINGERPRINT_CANDIDATES stored recordings of the same duration,
+    one of which matches. This is all a re-upload costs instead of the
+    transcription.
+    """
+    prints, duration = fingerprint_file(padded_audio)
+    random = np.random.default_rng(0)
+    for _ in range(settings.QUIZ_FINGERPRINT_CANDIDATES - 1):
+        other = random.integers(0, 2 ** 32, len(prints), dtype=np.uint32)
+        remember_transcript(other, duration, "Other transcript.")
+    remember_transcript(prints, duration, "Matching transcript.")
+
+    def lookup(index):
+        match, _ = find_transcript(*fingerprint_file(padded_audio))
+        assert match.text == "Matching transcript."
+
+    report.measure(
+        "pipeline.fingerprint_lookup",
+        lookup,
+        ITERATIONS,
+        audio_seconds=round(duration, 2),
+        fingerprint_bytes=len(prints) * 4,
+        candidates=settings.QUIZ_FINGERPRINT_CANDIDATES,
+    )
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_transcription_with_vad(report, settings, padded_audio, enabled):
+    pytest.importorskip("whisper")
+    settings.QUIZ_VAD_ENABLED = enabled
+    model = SharedWhisperModel().get()
+
+    report.measure(
+        f"pipeline.transcribe_padded.vad_{'on' if enabled else 'off'}",
+        lambda index: transcribe_file(model, str(padded_audio)),
+        1,
+    )
+
+
+def test_long_transcript_summary(report, settings):
+    """
+    Map-reduce summary of a transcript of about 4x the prompt budget. The
+    fake Gemini call sleeps GEMINI_LATENCY seconds, so the result shows
+    that the parallel calls take about one call's latency.
+    """
+    settings.QUIZ_TOKEN_ENCODING = ""
+
+    class SlowModels:
+        def generate_content(self, model, contents):
+            time.sleep(GEMINI_LATENCY)
+            return SimpleNamespace(text="Summary.", usage_metadata=None)
+
+    sentence = "The lecture explains how plants turn light into energy. "
+    transcript = sentence * (
+        4 * settings.QUIZ_PROMPT_TOKEN_BUDGET // count_tokens(sentence)
+    )
+    packers = []
+
+    def pack(index):
+        packer = TranscriptPacker()
+        packer.pack(transcript)
+        packers.append(packer)
+
+    client = SimpleNamespace(models=SlowModels())
+    with patch("quiz_app.api.providers.gemini", return_value=client):
+        report.measure(
+            "pipeline.summarise_long_transcript", pack, ITERATIONS,
+            transcript_tokens=count_tokens(transcript),
+            gemini_latency_ms=GEMINI_LATENCY * 1000,
+        )
+    report.results["pipeline.summarise_long_transcript"]["chunks"] = \
+        packers[0].summary_chunks
+
+
+def test_question_generation_stage(report, workdir, fake_services):
+    transcript = "This is a short benchmark transcript. " * 400
+    generators = []
+    for index in range(ITERATIONS):
+        generate = AudioQuestionGenerator(job_id=f"bench{index}")
+        generate.write_file(f"media/{generate.transcribed_text}.txt",
+                            transcript)
+        generators.append(generate)
+
+    def stage(index):
+        generators[index].generate_questions_gemini()
+
+    report.measure("pipeline.generate", stage, ITERATIONS)
+
+
+def test_text_cleaning_stage(report, workdir, fake_services):
+    generators = []
+    for index in range(ITERATIONS):
+        generate = AudioQuestionGenerator(job_id=f"bench{index}")
+        generate.write_file(f"media/{generate.generated_text}.txt",
+                            "```json " + json.dumps(GENERATED_QUIZ) + "```")
+        generators.append(generate)
+
+    def stage(index):
+        content = generators[index].edge_cleaner_text()
+        assert json.loads(content)["title"] == "Benchmark Quiz"
+
+    report.measure("pipeline.clean", stage, ITERATIONS)
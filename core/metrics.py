@@ -0,0 +1,337 @@
+"""
+Prometheus-style metrics shared by all server workers.
+
+Every process keeps its counters and histograms in memory and writes them
+to its own JSON file in `settings.METRICS_DIR`. The file is written by a
+timer thread at most `FLUSH_INTERVAL` seconds after a value changed, so
+requests do not wait for the write and the last values of an idle worker
+are not held back. The `/metrics` endpoint merges the files of all
+processes, so the exposed values are aggregated across gunicorn workers.
+When a worker exits, the gunicorn master merges its file into
+`RETIRED_FILE` and removes it (see `MetricsRegistry.retire`), so the
+counters do not go back and the directory does not grow with every
+recycled worker. The approach follows the multiprocess mode of the
+official Prometheus client without adding it as a dependency.
+"""
+
+import atexit
+import hmac
+import json
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+FLUSH_INTERVAL = 1.0
+RETIRED_FILE = "metrics_retired.json"
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300, 600,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+HELP = {
+    "quizly_http_request_duration_seconds":
+        "Request latency per URL name.",
+    "quizly_http_request_db_queries":
+        "Database queries executed per request.",
+    "quizly_cache_requests_total":
+        "Cache lookups per cache and result (hit or miss).",
+    "quizly_whisper_model_loads_total":
+        "Number of times a Whisper model was loaded.",
+    "quizly_download_bytes_total":
+        "Bytes downloaded from YouTube for quiz generations.",
+    "quizly_transcription_requests_total":
+        "Requests of the transcription service per result.",
+    "quizly_vad_skipped_seconds_total":
+        "Audio seconds left out of transcriptions as non-speech.",
+    "quizly_idempotency_requests_total":
+        "Quiz creations with an Idempotency-Key per result.",
+    "quizly_pipeline_stage_duration_seconds":
+        "Duration of the quiz generation pipeline stages.",
+    "quizly_pipeline_stage_process_cpu_seconds":
+        "CPU time of the whole worker process (all its requests and "
+        "threads) during the pipeline stages.",
+    "quizly_transcription_slot_wait_seconds":
+        "Time transcriptions waited for a CPU slot.",
+}
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics persisted to a shared directory.
+
+    Samples are keyed by metric name and sorted label pairs. After a fork
+    the child starts with empty values, so nothing is counted twice.
+
+    Methods:
+        - inc(name, amount, **labels): Increments a counter.
+        - observe(name, value, buckets, **labels): Records a histogram value.
+        - flush(): Writes this process' values to its file.
+        - collect(): Returns the values of all processes merged.
+        - retire(pid): Merges the file of an exited process into the
+          file of the retired processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.counters = {}
+        self.histograms = {}
+        self.timer = None
+
+    @property
+    def directory(self):
+        directory = getattr(settings, "METRICS_DIR", None)
+        return Path(directory) if directory else None
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            self._ensure_process()
+            key = self._key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self._schedule_flush()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        with self.lock:
+            self._ensure_process()
+            key = self._key(name, labels)
+            histogram = self.histograms.setdefault(key, {
+                "buckets": list(buckets),
+                "counts": [0] * len(buckets),
+                "sum": 0.0,
+                "count": 0,
+            })
+            for index, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            self._schedule_flush()
+
+    def flush(self):
+        directory = self.directory
+        if directory is None:
+            return
+
+        with self.lock:
+            self._ensure_process()
+            data = json.dumps({
+                "counters": self.counters,
+                "histograms": self.histograms,
+            })
+
+        directory.mkdir(parents=True, exist_ok=True)
+        _write(directory / f"metrics_{self.pid}.json", data)
+
+    def collect(self):
+        self.flush()
+        counters = {}
+        histograms = {}
+
+        directory = self.directory
+        paths = directory.glob("metrics_*.json") if directory else []
+        for path in paths:
+            data = _read(path)
+            if data is not None:
+                _merge(counters, histograms, data)
+
+        return counters, histograms
+
+    def retire(self, pid):
+        """
+        Merges the file of the exited process `pid` into RETIRED_FILE and
+        removes it. Only the gunicorn master calls this, one worker at a
+        time, so the retired file has a single writer.
+        """
+        directory = self.directory
+        if directory is None:
+            return
+
+        path = directory / f"metrics_{pid}.json"
+        data = _read(path)
+        if data is None:
+            return
+
+        retired_path = directory / RETIRED_FILE
+        counters = {}
+        histograms = {}
+        retired = _read(retired_path)
+        if retired is not None:
+            _merge(counters, histograms, retired)
+        _merge(counters, histograms, data)
+
+        _write(retired_path, json.dumps({
+            "counters": counters,
+            "histograms": histograms,
+        }))
+        path.unlink(missing_ok=True)
+
+    def _ensure_process(self):
+        pid = os.getpid()
+        if self.pid == pid:
+            return
+
+        self.pid = pid
+        self.counters = {}
+        self.histograms = {}
+        # A timer inherited from the parent did not survive the fork.
+        self.timer = None
+
+        directory = self.directory
+        path = directory / f"metrics_{pid}.json" if directory else None
+        if path is not None and path.exists():
+            # A previous process with the same PID left values behind;
+            # continue from them so they are not overwritten.
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return
+            self.counters = data.get("counters", {})
+            self.histograms = data.get("histograms", {})
+
+    def _schedule_flush(self):
+        # Called with the lock held.
+        if self.timer is not None or self.directory is None:
+            return
+        self.timer = threading.Timer(FLUSH_INTERVAL, self._deferred_flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _deferred_flush(self):
+        with self.lock:
+            self.timer = None
+        self.flush()
+
+    def _key(self, name, labels):
+        return json.dumps([name, sorted(labels.items())])
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(data, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _merge(counters, histograms, data):
+    for key, value in data.get("counters", {}).items():
+        counters[key] = counters.get(key, 0) + value
+
+    for key, histogram in data.get("histograms", {}).items():
+        merged = histograms.get(key)
+        buckets = histogram["buckets"]
+        if merged is None or merged["buckets"] != buckets:
+            histograms[key] = {
+                "buckets": buckets,
+                "counts": list(histogram["counts"]),
+                "sum": histogram["sum"],
+                "count": histogram["count"],
+            }
+            continue
+        merged["counts"] = [
+            a + b for a, b in zip(merged["counts"], histogram["counts"])
+        ]
+        merged["sum"] += histogram["sum"]
+        merged["count"] += histogram["count"]
+
+
+def render(counters, histograms):
+    """
+    Renders merged metrics in the Prometheus text exposition format.
+    """
+    families = {}
+    for key, value in sorted(counters.items()):
+        name, labels = json.loads(key)
+        families.setdefault(name, ("counter", []))[1].append(
+            f"{name}{_labels(labels)} {_number(value)}"
+        )
+
+    for key, histogram in sorted(histograms.items()):
+        name, labels = json.loads(key)
+        lines = families.setdefault(name, ("histogram", []))[1]
+        for bound, count in zip(histogram["buckets"], histogram["counts"]):
+            bucket_labels = labels + [["le", _number(bound)]]
+            lines.append(f"{name}_bucket{_labels(bucket_labels)} {count}")
+        inf_labels = labels + [["le", "+Inf"]]
+        lines.append(
+            f"{name}_bucket{_labels(inf_labels)} {histogram['count']}"
+        )
+        lines.append(
+            f"{name}_sum{_labels(labels)} {_number(histogram['sum'])}"
+        )
+        lines.append(
+            f"{name}_count{_labels(labels)} {histogram['count']}"
+        )
+
+    output = []
+    for name in sorted(families):
+        kind, lines = families[name]
+        if name in HELP:
+            output.append(f"# HELP {name} {HELP[name]}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            label,
+            str(value).replace("\\", "\\\\").replace('"', '\\"')
+        )
+        for label, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def metrics_view(request):
+    """
+    Expose the aggregated metrics of all workers for Prometheus.
+
+    Only clients listed in `settings.METRICS_ALLOWED_IPS` may scrape. If
+    `settings.METRICS_TOKEN` is set, they must also send it as a bearer
+    token, which is needed behind a reverse proxy on the same machine:
+    every client then has the proxy's address.
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+
+    token = settings.METRICS_TOKEN
+    if token:
+        authorization = request.META.get("HTTP_AUTHORIZATION", "")
+        if not hmac.compare_digest(authorization.encode(),
+                                   f"Bearer {token}".encode()):
+            return HttpResponseForbidden()
+
+    counters, histograms = registry.collect()
+    return HttpResponse(
+        render(counters, histograms),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def _flush_at_exit():
+    if registry.pid == os.getpid():
+        registry.flush()
+
+
+registry = MetricsRegistry()
+atexit.register(_flush_at_exit)
@@ -0,0 +1,48 @@
+import time
+
+from django.db import connection
+
+from .metrics import QUERY_BUCKETS, registry
+
+
+class MetricsMiddleware:
+    """
+    Records latency and database queries of every request.
+
+    The samples are labelled with the URL name of the resolved view
+    (e.g. "create-quiz", "quizzes-view", "login"), so the cardinality
+    stays bounded regardless of the requested IDs.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match and match.url_name else "unmatched"
+
+        registry.observe(
+            "quizly_http_request_duration_seconds",
+            duration,
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        registry.observe(
+            "quizly_http_request_db_queries",
+            queries[0],
+            buckets=QUERY_BUCKETS,
+            view=view,
+        )
+        return response
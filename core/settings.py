@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -63,6 +64,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.MetricsMiddleware",
 ]
 
 CORS_ALLOW_CREDENTIALS = True
@@ -87,6 +89,7 @@ CORS_ALLOW_HEADERS = (
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -127,13 +130,70 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# - DB_ENGINE: "sqlite" (default) or "postgresql".
+# - DB_CONN_MAX_AGE: Seconds a connection is kept open between requests.
+# PostgreSQL:
+# - DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT: Connection settings.
+# - DB_POOL: Use Django's native connection pool (requires psycopg[pool]).
+#   Pooled connections replace persistent ones, so CONN_MAX_AGE is 0 then.
+# - DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE: Connections per worker process.
+# - DB_POOL_TIMEOUT: Seconds to wait for a free pooled connection.
+# SQLite:
+# - DB_NAME: Path of the database file.
+# - DB_SQLITE_TIMEOUT: Seconds a writer waits for the database lock
+#   (busy_timeout) instead of failing with "database is locked".
+# WAL mode lets readers continue while one connection writes, and
+# IMMEDIATE transactions take the write lock up front, so the busy
+# timeout also applies to transactions that read before they write.
+
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite").lower()
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+
+if DB_ENGINE == "postgresql":
+    DB_POOL = os.getenv("DB_POOL", "True").upper() == "TRUE"
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DB_NAME", "quizly"),
+            "USER": os.getenv("DB_USER", ""),
+            "PASSWORD": os.getenv("DB_PASSWORD", ""),
+            "HOST": os.getenv("DB_HOST", "localhost"),
+            "PORT": os.getenv("DB_PORT", "5432"),
+            "CONN_MAX_AGE": 0 if DB_POOL else DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+    if DB_POOL:
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        }
+else:
+    DB_SQLITE_TIMEOUT = int(os.getenv("DB_SQLITE_TIMEOUT", "20"))
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "OPTIONS": {
+                "timeout": DB_SQLITE_TIMEOUT,
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    f"PRAGMA busy_timeout={DB_SQLITE_TIMEOUT * 1000};"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA temp_store=MEMORY;"
+                    "PRAGMA cache_size=-20000;"
+                    "PRAGMA mmap_size=134217728;"
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -199,6 +259,295 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": True,
 }
 
+# Metrics
+# - METRICS_DIR: Directory shared by all workers for their metric files.
+#   Leave empty to disable writing metrics.
+# - METRICS_ALLOWED_IPS: Client addresses allowed to scrape /metrics.
+# - METRICS_TOKEN: Bearer token required to scrape /metrics (empty: none).
+#   Set it if a reverse proxy on the same machine forwards the requests,
+#   because every client then has the proxy's address.
+
+METRICS_DIR = os.getenv("METRICS_DIR", str(BASE_DIR / "metrics"))
+METRICS_ALLOWED_IPS = os.getenv(
+    "METRICS_ALLOWED_IPS", "127.0.0.1,::1"
+).split(",")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+# The "quiz_app.pipeline" logger writes one JSON line per quiz generation.
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "quiz_app": {
+            "handlers": ["console"],
+            "level": os.getenv("QUIZ_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
+# Admission control for quiz generation.
+# - QUIZ_MAX_CONCURRENT_GENERATIONS: Generations running at once (all users).
+# - QUIZ_MAX_CONCURRENT_GENERATIONS_PER_USER: Generations per user at once.
+# - QUIZ_GENERATION_SLOT_LEASE: Seconds after which an unreleased slot
+#   (e.g. from a crashed worker) is considered free again.
+# - QUIZ_ADMISSION_WAIT: Seconds a request queues for a free slot before
+#   it is rejected with 429 Too Many Requests (0 rejects immediately).
+# - QUIZ_ADMISSION_RETRY_AFTER: Seconds sent in the Retry-After header.
+
+QUIZ_MAX_CONCURRENT_GENERATIONS = int(
+    os.getenv("QUIZ_MAX_CONCURRENT_GENERATIONS", "2")
+)
+QUIZ_MAX_CONCURRENT_GENERATIONS_PER_USER = int(
+    os.getenv("QUIZ_MAX_CONCURRENT_GENERATIONS_PER_USER", "1")
+)
+QUIZ_GENERATION_SLOT_LEASE = int(
+    os.getenv("QUIZ_GENERATION_SLOT_LEASE", str(30 * 60))
+)
+QUIZ_ADMISSION_WAIT = int(os.getenv("QUIZ_ADMISSION_WAIT", "0"))
+QUIZ_ADMISSION_RETRY_AFTER = int(
+    os.getenv("QUIZ_ADMISSION_RETRY_AFTER", "30")
+)
+
+# Idempotency-Key header of createQuiz.
+# - QUIZ_IDEMPOTENCY_TTL: Seconds a key and its quiz are remembered.
+# - QUIZ_IDEMPOTENCY_TIMEOUT: The first request refreshes its key while it
+#   runs; a key not refreshed for this long is considered abandoned.
+# - QUIZ_IDEMPOTENCY_WAIT: Seconds a retry waits for the first request with
+#   its key before it is answered with 409 Conflict and a Retry-After
+#   header (QUIZ_ADMISSION_RETRY_AFTER), so it does not block a worker.
+
+QUIZ_IDEMPOTENCY_TTL = int(
+    os.getenv("QUIZ_IDEMPOTENCY_TTL", str(24 * 60 * 60))
+)
+QUIZ_IDEMPOTENCY_TIMEOUT = int(
+    os.getenv("QUIZ_IDEMPOTENCY_TIMEOUT", str(30 * 60))
+)
+QUIZ_IDEMPOTENCY_WAIT = float(os.getenv("QUIZ_IDEMPOTENCY_WAIT", "5"))
+
+# Denormalised question storage.
+# - QUIZ_DENORMALISED_QUESTIONS: Read quizzes with their questions from the
+#   `Quiz.questions_cache` JSON column (one row, no joins). The column is
+#   kept in sync on every write, so this can be switched at any time.
+
+QUIZ_DENORMALISED_QUESTIONS = (
+    os.getenv("QUIZ_DENORMALISED_QUESTIONS", "False").upper() == "TRUE"
+)
+
+# Batch quiz creation (createQuiz/batch/).
+# - QUIZ_BATCH_MAX_ITEMS: Videos accepted per batch (URLs or playlist).
+# - QUIZ_BATCH_VALIDATION_WORKERS: Threads checking the video metadata of a
+#   batch in parallel.
+# - QUIZ_BATCH_ADMISSION_WAIT: Seconds a batch item queues for a generation
+#   slot before it fails.
+# - QUIZ_BATCH_BACKGROUND: Run every batch in a background thread of the
+#   web worker. Items left running by a recycled or killed worker are
+#   resumed when the batch is read. When disabled, batches are only run by
+#   `python manage.py run_quiz_batches`.
+
+QUIZ_BATCH_MAX_ITEMS = int(os.getenv("QUIZ_BATCH_MAX_ITEMS", "20"))
+QUIZ_BATCH_VALIDATION_WORKERS = int(
+    os.getenv("QUIZ_BATCH_VALIDATION_WORKERS", "8")
+)
+QUIZ_BATCH_ADMISSION_WAIT = int(
+    os.getenv("QUIZ_BATCH_ADMISSION_WAIT", str(30 * 60))
+)
+QUIZ_BATCH_BACKGROUND = (
+    os.getenv("QUIZ_BATCH_BACKGROUND", "True").upper() == "TRUE"
+)
+
+# Coalescing of concurrent generations for the same video.
+# - QUIZ_SINGLEFLIGHT_TIMEOUT: The worker generating a video refreshes its
+#   row while it runs; a row not refreshed for this long is considered
+#   abandoned and is taken over. Defaults to the longest admission wait
+#   plus a generation slot lease. Batch items wait this long for another
+#   worker generating the same video.
+# - QUIZ_SINGLEFLIGHT_WAIT: Seconds a request waits for another worker
+#   generating the same video before it is answered with 503 and a
+#   Retry-After header (QUIZ_ADMISSION_RETRY_AFTER), so it does not block
+#   a worker for a whole generation.
+# - QUIZ_SINGLEFLIGHT_RESULT_TTL: Seconds a finished result is kept and
+#   reused for further requests of the same video.
+
+QUIZ_SINGLEFLIGHT_TIMEOUT = int(
+    os.getenv(
+        "QUIZ_SINGLEFLIGHT_TIMEOUT",
+        str(max(QUIZ_ADMISSION_WAIT, QUIZ_BATCH_ADMISSION_WAIT)
+            + QUIZ_GENERATION_SLOT_LEASE),
+    )
+)
+QUIZ_SINGLEFLIGHT_WAIT = float(os.getenv("QUIZ_SINGLEFLIGHT_WAIT", "5"))
+QUIZ_SINGLEFLIGHT_RESULT_TTL = int(
+    os.getenv("QUIZ_SINGLEFLIGHT_RESULT_TTL", "120")
+)
+
+# Audio download.
+# - QUIZ_AUDIO_MIN_ABR: Minimum audio bitrate (kbps) considered adequate for
+#   the transcription; the smallest audio-only stream with at least this
+#   bitrate is downloaded.
+# - QUIZ_DOWNLOAD_FRAGMENTS: Fragments of a stream downloaded at once.
+# - QUIZ_DOWNLOAD_MAX_BYTES: Bytes a single audio download may transfer
+#   (0 for no limit). The transferred bytes are stored with every
+#   generation run and counted in quizly_download_bytes_total.
+
+QUIZ_AUDIO_MIN_ABR = int(os.getenv("QUIZ_AUDIO_MIN_ABR", "48"))
+QUIZ_DOWNLOAD_FRAGMENTS = int(os.getenv("QUIZ_DOWNLOAD_FRAGMENTS", "4"))
+QUIZ_DOWNLOAD_MAX_BYTES = int(
+    os.getenv("QUIZ_DOWNLOAD_MAX_BYTES", str(30 * 1024 * 1024))
+)
+
+# yt-dlp isolation (quiz_app/api/ytdlp.py).
+# - YTDLP_ISOLATION: Run every yt-dlp operation in a child process that is
+#   killed when it exceeds its timeout.
+# - YTDLP_INFO_TIMEOUT: Seconds a metadata lookup may take.
+# - YTDLP_DOWNLOAD_TIMEOUT: Seconds an audio download may take.
+# - YTDLP_MAX_PROCESSES: yt-dlp processes per worker process at a time.
+# - YTDLP_START_METHOD: multiprocessing start method of the children.
+#   "forkserver" forks them from a single-threaded server process that
+#   has imported yt-dlp once; "fork" copies the (multi-threaded) worker,
+#   which can deadlock the child on a lock held by another thread.
+
+YTDLP_ISOLATION = os.getenv("YTDLP_ISOLATION", "True").upper() == "TRUE"
+YTDLP_INFO_TIMEOUT = int(os.getenv("YTDLP_INFO_TIMEOUT", "60"))
+YTDLP_DOWNLOAD_TIMEOUT = int(os.getenv("YTDLP_DOWNLOAD_TIMEOUT", "600"))
+YTDLP_MAX_PROCESSES = int(os.getenv("YTDLP_MAX_PROCESSES", "8"))
+YTDLP_START_METHOD = os.getenv("YTDLP_START_METHOD", "forkserver")
+
+# Transcription service (python manage.py run_transcription_service).
+# - WHISPER_SERVICE_SOCKET: Unix socket of the service. When set, the web
+#   workers send their audio to the service instead of loading Whisper
+#   themselves. Leave empty to transcribe in the web worker.
+# - WHISPER_SERVICE_TIMEOUT: Seconds a worker waits for a transcript,
+#   including the time its request waits in the queue.
+# - WHISPER_SERVICE_QUEUE: Requests that may wait in the service at a time;
+#   further requests fail instead of queueing.
+# - WHISPER_SERVICE_MAX_AUDIO_SIZE: Bytes of audio the service accepts in
+#   one request; larger requests are refused before they are read.
+
+WHISPER_SERVICE_SOCKET = os.getenv("WHISPER_SERVICE_SOCKET", "")
+WHISPER_SERVICE_TIMEOUT = int(
+    os.getenv("WHISPER_SERVICE_TIMEOUT", str(30 * 60))
+)
+WHISPER_SERVICE_QUEUE = int(os.getenv("WHISPER_SERVICE_QUEUE", "16"))
+WHISPER_SERVICE_MAX_AUDIO_SIZE = int(
+    os.getenv("WHISPER_SERVICE_MAX_AUDIO_SIZE", str(512 * 1024 * 1024))
+)
+
+# CPU scheduling of the transcriptions (quiz_app/scheduler.py).
+# - QUIZ_TRANSCRIPTION_CORES: Cores reserved for transcriptions (the last
+#   ones of the machine); gunicorn workers serve requests on the others.
+#   0 (the default) reserves none: transcriptions may use every core and
+#   the workers are not pinned. Workers are never pinned when
+#   WHISPER_SERVICE_SOCKET is set.
+# - QUIZ_TRANSCRIPTION_SLOTS: Transcriptions running at the same time on
+#   the machine; each gets an equal share of the transcription cores as
+#   torch threads. Every process transcribes one audio at a time, so more
+#   slots only let several web workers transcribe at once; the shared
+#   transcription service always uses one.
+# - QUIZ_TRANSCRIPTION_WAIT: Seconds a transcription waits for a slot.
+# - QUIZ_TRANSCRIPTION_NICE: Nice value of the transcription threads.
+# - QUIZ_TRANSCRIPTION_LOCK_DIR: Directory of the slot lock files; all
+#   processes of the machine must use the same one.
+
+QUIZ_TRANSCRIPTION_CORES = int(os.getenv("QUIZ_TRANSCRIPTION_CORES", "0"))
+QUIZ_TRANSCRIPTION_SLOTS = int(os.getenv("QUIZ_TRANSCRIPTION_SLOTS", "1"))
+QUIZ_TRANSCRIPTION_WAIT = int(
+    os.getenv("QUIZ_TRANSCRIPTION_WAIT", str(30 * 60))
+)
+QUIZ_TRANSCRIPTION_NICE = int(os.getenv("QUIZ_TRANSCRIPTION_NICE", "10"))
+QUIZ_TRANSCRIPTION_LOCK_DIR = os.getenv(
+    "QUIZ_TRANSCRIPTION_LOCK_DIR",
+    os.path.join(tempfile.gettempdir(), "quizly-transcription-slots"),
+)
+
+# Voice activity detection before the transcription.
+# - QUIZ_VAD_ENABLED: Transcribe only the speech segments of the audio and
+#   skip silence, noise and sustained music (see quiz_app/vad.py). The
+#   skipped seconds are counted in quizly_vad_skipped_seconds_total and
+#   the speech seconds are stored with every generation run.
+
+QUIZ_VAD_ENABLED = os.getenv("QUIZ_VAD_ENABLED", "True").upper() == "TRUE"
+
+# Reuse of transcripts for the same audio under another video.
+# - QUIZ_FINGERPRINT_ENABLED: Fingerprint every downloaded recording and
+#   reuse the stored transcript of a matching one (see
+#   quiz_app/fingerprint.py) instead of transcribing it again.
+# - QUIZ_FINGERPRINT_MAX_BER: Highest share of differing fingerprint bits
+#   for a match. Re-encoded copies stay below 0.2, unrelated audio is
+#   around 0.5.
+# - QUIZ_FINGERPRINT_TOLERANCE: Seconds the durations of two matching
+#   recordings may differ by; also the largest shift between them.
+# - QUIZ_FINGERPRINT_CANDIDATES: Stored recordings compared at most.
+
+QUIZ_FINGERPRINT_ENABLED = (
+    os.getenv("QUIZ_FINGERPRINT_ENABLED", "True").upper() == "TRUE"
+)
+QUIZ_FINGERPRINT_MAX_BER = float(
+    os.getenv("QUIZ_FINGERPRINT_MAX_BER", "0.25")
+)
+QUIZ_FINGERPRINT_TOLERANCE = float(
+    os.getenv("QUIZ_FINGERPRINT_TOLERANCE", "3")
+)
+QUIZ_FINGERPRINT_CANDIDATES = int(
+    os.getenv("QUIZ_FINGERPRINT_CANDIDATES", "50")
+)
+
+# Transcript in the Gemini prompt.
+# - QUIZ_PROMPT_TOKEN_BUDGET: Tokens of transcript put into the quiz prompt.
+#   Longer transcripts are split into parts that are summarised by
+#   parallel Gemini calls; the quiz is built from the joined summaries.
+# - QUIZ_SUMMARY_CHUNK_TOKENS: Tokens per summarised part.
+# - QUIZ_SUMMARY_MAX_CHUNKS: Parts per transcript; for very long
+#   transcripts the parts grow instead, so there is one round of calls.
+# - QUIZ_SUMMARY_WORKERS: Summary calls running at the same time.
+# - QUIZ_TOKEN_ENCODING: tiktoken encoding used to count tokens. If it is
+#   empty or cannot be loaded, tokens are estimated from the text length.
+
+QUIZ_PROMPT_TOKEN_BUDGET = int(os.getenv("QUIZ_PROMPT_TOKEN_BUDGET", "4000"))
+QUIZ_SUMMARY_CHUNK_TOKENS = int(
+    os.getenv("QUIZ_SUMMARY_CHUNK_TOKENS", "2000")
+)
+QUIZ_SUMMARY_MAX_CHUNKS = int(os.getenv("QUIZ_SUMMARY_MAX_CHUNKS", "8"))
+QUIZ_SUMMARY_WORKERS = int(os.getenv("QUIZ_SUMMARY_WORKERS", "8"))
+QUIZ_TOKEN_ENCODING = os.getenv("QUIZ_TOKEN_ENCODING", "cl100k_base")
+
+# Quiz attempts.
+# - QUIZ_EXPOSE_ANSWERS: Include the correct `answer` of every question when
+#   quizzes are returned. Attempts are scored on the server, so clients
+#   that submit attempts do not need it and it can be switched off.
+# - QUIZ_ANSWER_INDEX_TTL: Seconds the answer index of a quiz stays cached.
+
+QUIZ_EXPOSE_ANSWERS = (
+    os.getenv("QUIZ_EXPOSE_ANSWERS", "True").upper() == "TRUE"
+)
+QUIZ_ANSWER_INDEX_TTL = int(os.getenv("QUIZ_ANSWER_INDEX_TTL", "3600"))
+
+# Cache
+# - CACHE_BACKEND: Django cache backend. The default local memory cache is
+#   private to each worker process. Cached entries are keyed by the version
+#   of what they cache (e.g. the answer index by `Quiz.updated_at`), so
+#   this is safe with several workers; a shared backend (e.g.
+#   django.core.cache.backends.redis.RedisCache) only saves building an
+#   entry once per worker.
+# - CACHE_LOCATION: Location of the cache (e.g. redis://127.0.0.1:6379).
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "quizly"),
+    }
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -0,0 +1,240 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.metrics import MetricsRegistry, registry, render
+
+
+class MetricsRegistryTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.override = override_settings(METRICS_DIR=self.tmp.name)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def test_collect_merges_files_of_all_workers(self):
+        metrics = MetricsRegistry()
+        metrics.inc("quizly_whisper_model_loads_total", model="small")
+        metrics.observe("quizly_pipeline_stage_duration_seconds", 0.3,
+                        buckets=(0.1, 1), stage="download")
+
+        key = json.dumps(
+            ["quizly_whisper_model_loads_total", [["model", "small"]]]
+        )
+        with open(f"{self.tmp.name}/metrics_999999.json", "w") as file:
+            json.dump({"counters": {key: 2}, "histograms": {}}, file)
+
+        counters, histograms = metrics.collect()
+
+        self.assertEqual(counters[key], 3)
+        histogram = next(iter(histograms.values()))
+        self.assertEqual(histogram["counts"], [0, 1])
+        self.assertEqual(histogram["count"], 1)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_idle_worker_samples_reach_other_processes(self):
+        metrics = MetricsRegistry()
+        key = json.dumps(["quizly_whisper_model_loads_total", []])
+        ready, done = os.pipe(), os.pipe()
+
+        with patch("core.metrics.FLUSH_INTERVAL", 0.1):
+            pid = os.fork()
+            if pid == 0:
+                # Worker: one sample just after a flush, then idle.
+                metrics.inc("quizly_whisper_model_loads_total")
+                metrics.flush()
+                metrics.inc("quizly_whisper_model_loads_total")
+                os.write(ready[1], b"x")
+                os.read(done[0], 1)
+                os._exit(0)
+
+            try:
+                os.read(ready[0], 1)
+                deadline = time.monotonic() + 5
+                while time.monotonic() < deadline:
+                    counters, _ = MetricsRegistry().collect()
+                    if counters.get(key) == 2:
+                        break
+                    time.sleep(0.05)
+            finally:
+                os.write(done[1], b"x")
+                os.waitpid(pid, 0)
+
+        self.assertEqual(counters.get(key), 2)
+
+    def test_retire_merges_exited_worker_into_retired_file(self):
+        key = json.dumps(["quizly_whisper_model_loads_total", []])
+        for pid, value in ((999998, 2), (999999, 3)):
+            with open(f"{self.tmp.name}/metrics_{pid}.json", "w") as file:
+                json.dump({"counters": {key: value}, "histograms": {}},
+                          file)
+
+        metrics = MetricsRegistry()
+        metrics.retire(999998)
+        metrics.retire(999999)
+
+        self.assertEqual(sorted(os.listdir(self.tmp.name)),
+                         ["metrics_retired.json"])
+        counters, _ = MetricsRegistry().collect()
+        self.assertEqual(counters[key], 5)
+
+    def test_render_prometheus_text_format(self):
+        metrics = MetricsRegistry()
+        metrics.inc("quizly_cache_requests_total",
+                    cache="singleflight", result="hit")
+        metrics.observe("quizly_http_request_duration_seconds", 0.2,
+                        buckets=(0.1, 0.5), view="quizzes-view")
+
+        text = render(*metrics.collect())
+
+        self.assertIn("# TYPE quizly_cache_requests_total counter", text)
+        self.assertIn(
+            'quizly_cache_requests_total{cache="singleflight",'
+            'result="hit"} 1', text
+        )
+        self.assertIn(
+            'quizly_http_request_duration_seconds_bucket'
+            '{view="quizzes-view",le="0.5"} 1', text
+        )
+        self.assertIn(
+            'quizly_http_request_duration_seconds_count'
+            '{view="quizzes-view"} 1', text
+        )
+
+
+class MetricsEndpointTest(APITestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.override = override_settings(METRICS_DIR=self.tmp.name)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+        registry.pid = None
+
+    def test_requests_are_recorded_per_url_name(self):
+        user = User.objects.create_user(username="m", password="p")
+        self.client.force_authenticate(user=user)
+        self.client.get(reverse("quizzes-view"))
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'quizly_http_request_duration_seconds_count'
+            '{method="GET",status="200",view="quizzes-view"} 1', text
+        )
+        self.assertIn("quizly_http_request_db_queries_bucket", text)
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"])
+    def test_scraping_is_restricted_to_allowed_ips(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_scraping_requires_token_if_set(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(reverse("metrics"),
+                                   HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(reverse("metrics"),
+                                   HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+
+@unittest.skipUnless(
+    settings.DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3",
+    "SQLite specific settings",
+)
+class SQLiteConcurrencyTest(SimpleTestCase):
+    """
+    Runs concurrent writers against a file database configured like the
+    default database (the test database itself lives in memory).
+    """
+
+    alias = "concurrency"
+    databases = {alias}
+    writers = 8
+    transactions = 20
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        connections.settings[cls.alias] = dict(
+            connections.settings["default"],
+            NAME=os.path.join(cls.tmp.name, "concurrency.sqlite3"),
+            TEST={},
+        )
+        super().setUpClass()
+
+        with connections[cls.alias].cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE counter (id INTEGER PRIMARY KEY, seen INTEGER)"
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[cls.alias].close()
+        del connections.settings[cls.alias]
+        if hasattr(connections._connections, cls.alias):
+            delattr(connections._connections, cls.alias)
+        cls.tmp.cleanup()
+
+    def test_pragmas_are_applied_on_connect(self):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertGreaterEqual(cursor.fetchone()[0], 1000)
+
+    def test_concurrent_writers_do_not_fail_with_database_locked(self):
+        errors = []
+
+        def write():
+            try:
+                for _ in range(self.transactions):
+                    with transaction.atomic(using=self.alias):
+                        with connections[self.alias].cursor() as cursor:
+                            cursor.execute("SELECT COUNT(*) FROM counter")
+                            seen = cursor.fetchone()[0]
+                            time.sleep(0.001)
+                            cursor.execute(
+                                "INSERT INTO counter (seen) VALUES (%s)",
+                                [seen],
+                            )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections[self.alias].close()
+
+        threads = [
+            threading.Thread(target=write) for _ in range(self.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), MAX(seen) FROM counter")
+            count, max_seen = cursor.fetchone()
+        total = self.writers * self.transactions
+        self.assertEqual(count, total)
+        self.assertEqual(max_seen, total - 1)
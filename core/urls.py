@@ -19,8 +19,11 @@ from django.contrib import admin
 from django.urls import include
 from django.urls import path
 
+from core.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("api/", include("auth_app.api.urls")),
     path("api/", include("quiz_app.api.urls")),
 ]
@@ -0,0 +1,175 @@
+"""
+Gunicorn configuration of the Quizly backend.
+
+Start the server with `gunicorn core.wsgi` from the project directory;
+gunicorn reads this file automatically. Every value can be changed with
+an environment variable:
+
+- GUNICORN_BIND: Address to listen on (default 0.0.0.0:8000).
+- GUNICORN_WORKERS: Worker processes (default: number of CPU cores).
+- GUNICORN_THREADS: Threads per worker (default 1).
+- GUNICORN_TIMEOUT: Seconds a request may run before its worker is
+  restarted. A quiz generation downloads, transcribes and generates in
+  the request, so the default matches the generation slot lease
+  (QUIZ_GENERATION_SLOT_LEASE, 30 minutes).
+- GUNICORN_MAX_REQUESTS, GUNICORN_MAX_REQUESTS_JITTER: Restart a worker
+  after this many requests (default 500 +- 50), so memory fragmented by
+  Whisper runs is returned to the system. 0 disables recycling.
+- GUNICORN_PRELOAD: Load the application in the master (default True).
+- GUNICORN_PRELOAD_MODULES: Comma-separated modules imported in the
+  master before the workers are forked (default: yt_dlp and
+  google.genai, which quiz_app imports lazily).
+- GUNICORN_PRELOAD_WHISPER: Load the Whisper model in the master (default
+  False). The workers then share its weights copy-on-write instead of
+  loading one copy each; the web workers do not need it if the
+  transcription service (WHISPER_SERVICE_SOCKET) is used.
+- GUNICORN_TORCH_THREADS: Torch threads per worker (default: CPU cores
+  divided by the number of workers, at least 1). Transcriptions set
+  their own count from QUIZ_TRANSCRIPTION_CORES and
+  QUIZ_TRANSCRIPTION_SLOTS (see quiz_app.scheduler).
+
+With preloading, the application is loaded in the master, so Django, DRF
+and the preloaded modules are imported once and shared by all workers.
+After the imports the master calls `gc.freeze()`, so the garbage
+collector of the workers does not write to (and thereby copy) the
+shared objects.
+
+If QUIZ_TRANSCRIPTION_CORES reserves cores for transcriptions in the web
+workers, every worker is pinned to the other cores, so requests keep
+their cores while Whisper runs. Without a reservation, or when the
+workers send their audio to the transcription service
+(WHISPER_SERVICE_SOCKET), the workers are not pinned.
+
+yt-dlp runs in child processes of the workers (see quiz_app.api.ytdlp);
+when a worker is aborted or exits, its running children are killed.
+
+When a worker has exited, the master merges its metric file into the
+file of the retired workers (see core.metrics).
+"""
+
+import gc
+import importlib
+import os
+import sys
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+CPU_COUNT = os.cpu_count() or 1
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+wsgi_app = "core.wsgi:application"
+workers = _env_int("GUNICORN_WORKERS", CPU_COUNT)
+threads = _env_int("GUNICORN_THREADS", 1)
+timeout = _env_int("GUNICORN_TIMEOUT", 30 * 60)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 60)
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 500)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 50)
+preload_app = os.getenv("GUNICORN_PRELOAD", "True").upper() == "TRUE"
+
+PRELOAD_MODULES = [
+    module.strip()
+    for module in os.getenv(
+        "GUNICORN_PRELOAD_MODULES", "yt_dlp,google.genai"
+    ).split(",")
+    if module.strip()
+]
+PRELOAD_WHISPER = (
+    os.getenv("GUNICORN_PRELOAD_WHISPER", "False").upper() == "TRUE"
+)
+TORCH_THREADS = _env_int(
+    "GUNICORN_TORCH_THREADS", max(1, CPU_COUNT // max(1, workers))
+)
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def when_ready(server):
+    """
+    Runs in the master after the application is loaded and before the
+    workers are forked.
+    """
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            server.log.warning("Could not preload %s: %s", module, e)
+
+    if PRELOAD_WHISPER:
+        _set_torch_threads()
+        from quiz_app.api.utils import SharedWhisperModel
+
+        SharedWhisperModel.preload()
+        server.log.info("Preloaded the Whisper model.")
+
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    Limits the torch threads of every worker, so the workers together
+    use no more threads than there are CPU cores, and pins the worker to
+    the request cores if cores are reserved for transcriptions.
+    """
+    _set_torch_threads()
+    server.log.info("Worker %s uses %s torch threads.",
+                    worker.pid, TORCH_THREADS)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    try:
+        from django.conf import settings
+        from quiz_app.scheduler import CpuScheduler
+
+        if settings.WHISPER_SERVICE_SOCKET:
+            return
+        scheduler = CpuScheduler()
+        if not scheduler.reserved:
+            return
+        scheduler.pin_requests()
+    except Exception as e:
+        server.log.warning("Could not pin worker %s: %s", worker.pid, e)
+    else:
+        server.log.info("Worker %s serves requests on cores %s.",
+                        worker.pid, scheduler.request_cores)
+
+
+def worker_abort(worker):
+    """
+    Kills the yt-dlp processes of a worker that timed out.
+    """
+    _terminate_ytdlp()
+
+
+def worker_exit(server, worker):
+    _terminate_ytdlp()
+
+
+def child_exit(server, worker):
+    """
+    Runs in the master after a worker exited.
+    """
+    try:
+        from core.metrics import registry
+
+        registry.retire(worker.pid)
+    except Exception as e:
+        server.log.warning("Could not retire the metrics of worker %s: %s",
+                           worker.pid, e)
+
+
+def _terminate_ytdlp():
+    ytdlp = sys.modules.get("quiz_app.api.ytdlp")
+    if ytdlp is not None:
+        ytdlp.terminate_all()
+
+
+def _set_torch_threads():
+    # Torch reads the variables when it is imported; if it is imported
+    # already (preloaded Whisper), the thread count is set directly.
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(TORCH_THREADS)
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(TORCH_THREADS)
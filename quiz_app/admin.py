@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from .models import Quiz, QuizQuestions
+from .models import GenerationRun, Quiz, QuizAttempt, QuizQuestions, QuizStats
 
 admin.site.register(Quiz)
 admin.site.register(QuizQuestions)
+admin.site.register(GenerationRun)
+admin.site.register(QuizAttempt)
+admin.site.register(QuizStats)
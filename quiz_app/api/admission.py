@@ -0,0 +1,128 @@
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from quiz_app.models import GenerationSlot
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when no generation slot became free in time.
+
+    Attributes:
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("No free quiz generation slot.")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps the number of quiz generations running at the same time.
+
+    Every running generation holds a `GenerationSlot` row. Because the
+    slots live in the database, the global and per-user limits are shared
+    by all server workers.
+
+    A slot is acquired optimistically: the row is inserted first and the
+    active slots are counted afterwards. If a limit is exceeded, the row
+    is removed again. Two racing requests may therefore both back off,
+    but the limits are never exceeded.
+
+    Attributes:
+        - global_limit (int): Maximum number of generations for all users.
+        - user_limit (int): Maximum number of generations per user.
+        - lease (int): Seconds until an unreleased slot expires.
+        - wait (int): Seconds to queue for a slot before rejecting.
+        - retry_after (int): Seconds suggested to rejected clients.
+        - poll_interval (float): Seconds between two queued attempts.
+
+    Methods:
+        - admit(user): Context manager holding a slot for its duration.
+        - acquire(user): Acquires a slot or raises `AdmissionRejected`.
+        - release(slot): Frees a previously acquired slot.
+        - usage(user): Returns the current slot usage.
+    """
+
+    poll_interval = 1.0
+
+    def __init__(self, global_limit=None, user_limit=None, lease=None,
+                 wait=None, retry_after=None):
+        self.global_limit = (
+            settings.QUIZ_MAX_CONCURRENT_GENERATIONS
+            if global_limit is None else global_limit
+        )
+        self.user_limit = (
+            settings.QUIZ_MAX_CONCURRENT_GENERATIONS_PER_USER
+            if user_limit is None else user_limit
+        )
+        self.lease = (
+            settings.QUIZ_GENERATION_SLOT_LEASE
+            if lease is None else lease
+        )
+        self.wait = settings.QUIZ_ADMISSION_WAIT if wait is None else wait
+        self.retry_after = (
+            settings.QUIZ_ADMISSION_RETRY_AFTER
+            if retry_after is None else retry_after
+        )
+
+    @contextmanager
+    def admit(self, user):
+        slot = self.acquire(user)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def acquire(self, user):
+        deadline = time.monotonic() + self.wait
+
+        while True:
+            slot = self.try_acquire(user)
+            if slot is not None:
+                return slot
+            if time.monotonic() + self.poll_interval > deadline:
+                raise AdmissionRejected(self.retry_after)
+            time.sleep(self.poll_interval)
+
+    def try_acquire(self, user):
+        now = timezone.now()
+        GenerationSlot.objects.filter(expires_at__lte=now).delete()
+
+        slot = GenerationSlot.objects.create(
+            owner=user,
+            expires_at=now + timedelta(seconds=self.lease)
+        )
+
+        active = self.active_slots()
+        if (
+            active.count() > self.global_limit
+            or active.filter(owner=user).count() > self.user_limit
+        ):
+            slot.delete()
+            return None
+        return slot
+
+    def release(self, slot):
+        GenerationSlot.objects.filter(id=slot.id).delete()
+
+    def active_slots(self):
+        return GenerationSlot.objects.filter(expires_at__gt=timezone.now())
+
+    def usage(self, user):
+        active = self.active_slots()
+        return {
+            "global": {
+                "used": active.count(),
+                "limit": self.global_limit,
+            },
+            "user": {
+                "used": active.filter(owner=user).count(),
+                "limit": self.user_limit,
+            },
+        }
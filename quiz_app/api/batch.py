@@ -0,0 +1,278 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from quiz_app.models import QuizBatchItem
+from . import ytdlp
+from .admission import AdmissionController, AdmissionRejected
+from .instrumentation import PipelineTimer
+from .singleflight import SingleFlight, keep_alive
+from .serializers import YoutubeURLSerializer
+from .utils import SharedWhisperModel
+
+logger = logging.getLogger("quiz_app.batch")
+
+
+def expand_playlist(url):
+    """
+    Returns the video URLs of a YouTube playlist. Uses yt-dlp's flat
+    extraction, which lists the entries without resolving every video.
+    """
+    ydl_opts = {
+        "quiet": True,
+        "skip_download": True,
+        "no_warnings": True,
+        "extract_flat": "in_playlist",
+    }
+    info = ytdlp.extract_info(url, ydl_opts)
+
+    return [
+        f"https://www.youtube.com/watch?v={entry['id']}"
+        for entry in (info or {}).get("entries") or []
+        if entry and entry.get("id")
+    ]
+
+
+def validate_urls(urls, context):
+    """
+    Validates the video URLs with `YoutubeURLSerializer` in parallel
+    (every validation fetches the video metadata) and returns one
+    serializer per URL. Errors of the metadata lookup are reported as
+    validation errors of the URL.
+    """
+
+    def validate(url):
+        serializer = YoutubeURLSerializer(data={"url": url}, context=context)
+        try:
+            serializer.is_valid()
+        except Exception as e:
+            serializer.lookup_error = str(e)
+        return serializer
+
+    workers = max(1, min(settings.QUIZ_BATCH_VALIDATION_WORKERS, len(urls)))
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="quiz-batch-validate"
+                            ) as executor:
+        return list(executor.map(validate, urls))
+
+
+def validation_error(serializer):
+    """
+    Returns the validation error of a serializer from `validate_urls`
+    as text, or an empty string if it is valid.
+    """
+    lookup_error = getattr(serializer, "lookup_error", None)
+    if lookup_error:
+        return lookup_error
+    if serializer.errors:
+        return "; ".join(
+            str(message)
+            for messages in serializer.errors.values()
+            for message in messages
+        )
+    return ""
+
+
+class BatchRunner:
+    """
+    Generates the quizzes of the pending items of a `QuizBatch`.
+
+    Up to `workers` items are processed at the same time, as many as the
+    admission control lets one user generate at once (the per-user and
+    global generation limits); more threads would only queue for a slot.
+    All generations of the batch share one `SharedWhisperModel`, so
+    Whisper is loaded once per batch, and the process-wide Gemini client.
+    Every item passes through the regular pipeline of `CreateQuizView`
+    (admission control, coalescing of equal videos and timing); items
+    wait up to `QUIZ_BATCH_ADMISSION_WAIT` seconds for a generation slot
+    and, unlike requests, up to `QUIZ_SINGLEFLIGHT_TIMEOUT` seconds for
+    another worker generating the same video.
+
+    Items are claimed with a conditional update, so a batch can be run by
+    a background thread and by `run_quiz_batches` without processing an
+    item twice. A running item is refreshed while it is generated; items
+    whose runner died (e.g. a recycled worker) stop being refreshed and are
+    put back to pending by `release_stale_items`. The result of an item is
+    only written while it is still running, so a released item that was
+    claimed again is not overwritten by its first runner.
+
+    Attributes:
+        - batch (QuizBatch): The batch to run.
+        - build_quiz (callable): Builds a quiz from a validated
+          `YoutubeURLSerializer` (see `CreateQuizView.build_quiz`).
+        - serializers (dict): Validated serializers by item ID; items
+          without one are validated again.
+        - workers (int): Items generated at the same time.
+
+    Methods:
+        - run(): Processes all pending items of the batch.
+    """
+
+    def __init__(self, batch, build_quiz, serializers=None):
+        self.batch = batch
+        self.build_quiz = build_quiz
+        self.serializers = serializers or {}
+        self.whisper_model = (
+            SharedWhisperModel.preloaded or SharedWhisperModel()
+        )
+        self.admission = AdmissionController(
+            wait=settings.QUIZ_BATCH_ADMISSION_WAIT
+        )
+        self.singleflight = SingleFlight(
+            wait=settings.QUIZ_SINGLEFLIGHT_TIMEOUT
+        )
+        self.workers = max(1, min(self.admission.user_limit,
+                                  self.admission.global_limit))
+
+    def run(self):
+        items = list(QuizBatchItem.objects.filter(
+            batch=self.batch, status=QuizBatchItem.PENDING
+        ).order_by("position"))
+
+        workers = min(self.workers, len(items))
+        if workers <= 1:
+            for item in items:
+                self.process(item)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="quiz-batch-generate"
+                                ) as executor:
+            list(executor.map(self.process_in_thread, items))
+
+    def process(self, item):
+        if self.claim(item):
+            self.run_item(item)
+
+    def process_in_thread(self, item):
+        try:
+            self.process(item)
+        finally:
+            connections.close_all()
+
+    def claim(self, item):
+        return QuizBatchItem.objects.filter(
+            id=item.id, status=QuizBatchItem.PENDING
+        ).update(status=QuizBatchItem.RUNNING, updated_at=timezone.now()) == 1
+
+    def run_item(self, item):
+        owner = self.batch.owner
+        timer = PipelineTimer(owner=owner, video_id=item.video_id)
+        timer.details["batch_id"] = self.batch.id
+        status_code = 201
+
+        running = QuizBatchItem.objects.filter(
+            id=item.id, status=QuizBatchItem.RUNNING
+        )
+        refresh_interval = max(1.0, settings.QUIZ_GENERATION_SLOT_LEASE / 3)
+        try:
+            serializer = self.serializer(item)
+            with keep_alive(running, refresh_interval), \
+                    timer.count_queries():
+                quiz = self.build_quiz(
+                    owner,
+                    serializer,
+                    timer,
+                    admission=self.admission,
+                    whisper_model=self.whisper_model,
+                    singleflight=self.singleflight,
+                )
+        except Exception as e:
+            status_code = error_status(e)
+            item.status = QuizBatchItem.FAILED
+            item.error = str(e)
+            logger.warning("Batch %s item %s failed: %s",
+                           self.batch.id, item.position, e)
+        else:
+            item.status = QuizBatchItem.DONE
+            item.quiz = quiz
+
+        timer.finish(status_code)
+        item.updated_at = timezone.now()
+        finished = running.update(
+            status=item.status,
+            error=item.error,
+            quiz=item.quiz,
+            updated_at=item.updated_at,
+        )
+        if not finished:
+            logger.warning("Batch %s item %s was released while it ran; "
+                           "its result is dropped.",
+                           self.batch.id, item.position)
+
+    def serializer(self, item):
+        serializer = self.serializers.get(item.id)
+        if serializer is None:
+            serializer = YoutubeURLSerializer(
+                data={"url": item.url},
+                context={"owner": self.batch.owner},
+            )
+            serializer.is_valid(raise_exception=True)
+        return serializer
+
+
+def error_status(error):
+    if isinstance(error, AdmissionRejected):
+        return 429
+    response = getattr(error, "response", None)
+    if response is not None:
+        return response.status_code
+    return getattr(error, "status_code", 500)
+
+
+def start_batch(batch, build_quiz, serializers):
+    """
+    Runs the batch in a background thread of the current process.
+    """
+
+    def run():
+        try:
+            BatchRunner(batch, build_quiz, serializers).run()
+        except Exception:
+            logger.exception("Batch %s stopped.", batch.id)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run,
+                              name=f"quiz-batch-{batch.id}",
+                              daemon=True
+                              )
+    thread.start()
+    return thread
+
+
+def release_stale_items(batch=None):
+    """
+    Puts running items that were not refreshed for the generation slot
+    lease (because their worker was restarted or killed) back to pending,
+    only those of `batch` if given. Returns the number of released items.
+    """
+    stale = timezone.now() - timedelta(
+        seconds=settings.QUIZ_GENERATION_SLOT_LEASE
+    )
+    items = QuizBatchItem.objects.filter(
+        status=QuizBatchItem.RUNNING, updated_at__lte=stale
+    )
+    if batch is not None:
+        items = items.filter(batch=batch)
+    return items.update(status=QuizBatchItem.PENDING,
+                        updated_at=timezone.now())
+
+
+def resume_batch(batch, build_quiz):
+    """
+    Releases the stale items of the batch and, with QUIZ_BATCH_BACKGROUND,
+    runs them again in a background thread of the current process.
+    Returns the number of released items.
+    """
+    released = release_stale_items(batch)
+    if released and settings.QUIZ_BATCH_BACKGROUND:
+        logger.info("Resuming %s stale items of batch %s.",
+                    released, batch.id)
+        start_batch(batch, build_quiz, {})
+    return released
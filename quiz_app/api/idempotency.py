@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from core.metrics import registry
+from quiz_app.models import IdempotencyKey
+from .singleflight import keep_alive
+
+logger = logging.getLogger("quiz_app.idempotency")
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyReused(APIException):
+    """
+    Raised when a key is sent again with a different request.
+    """
+
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = (
+        "The Idempotency-Key was already used for a different request."
+    )
+    default_code = "idempotency_key_reused"
+
+
+class IdempotencyInProgress(APIException):
+    """
+    Raised when the original request of a key did not finish in time.
+    DRF sends `wait` as the `Retry-After` header.
+    """
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        "A request with this Idempotency-Key is still being processed."
+    )
+    default_code = "idempotency_in_progress"
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+def request_fingerprint(request):
+    """
+    Returns the SHA-256 of the request path and body, which a retry of
+    the request must match.
+    """
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(
+        f"{request.path}\n{body}".encode("utf-8")
+    ).hexdigest()
+
+
+class IdempotentRequests:
+    """
+    Makes quiz creation requests with an `Idempotency-Key` header safe to
+    retry.
+
+    The first request with a key inserts an `IdempotencyKey` row (the
+    key is unique per user) and runs the work. Once it created a quiz,
+    the quiz is stored on the row and every retry with the same key gets
+    the same quiz back (with an `Idempotent-Replayed: true` header)
+    instead of generating another one. A retry arriving while the first
+    request still runs waits up to `wait` seconds for it, the same way
+    `SingleFlight` waits for a running generation, and is otherwise
+    answered with 409 Conflict and a `Retry-After` header; the first
+    request refreshes its row meanwhile, so it is not taken for abandoned.
+
+    Failed requests remove their row, so a retry runs the work again.
+    Retries must send the same request; a key reused for another body is
+    rejected. Requests without the header are not affected.
+
+    Attributes:
+        - ttl (int): Seconds a key is remembered.
+        - timeout (int): Seconds after which running rows that were not
+          refreshed are considered abandoned.
+        - wait (float): Seconds a retry waits for the original request.
+        - retry_after (int): Seconds suggested to retries that gave up.
+        - poll_interval (float): Seconds between two polls of the row.
+
+    Methods:
+        - run(request, work, replay): Returns `work()` for a new key and
+          `replay(quiz)` for a key that already created `quiz`.
+    """
+
+    poll_interval = 1.0
+
+    def __init__(self, ttl=None, timeout=None, wait=None, retry_after=None):
+        self.ttl = settings.QUIZ_IDEMPOTENCY_TTL if ttl is None else ttl
+        self.timeout = (
+            settings.QUIZ_IDEMPOTENCY_TIMEOUT
+            if timeout is None else timeout
+        )
+        self.wait = settings.QUIZ_IDEMPOTENCY_WAIT if wait is None else wait
+        self.retry_after = (
+            settings.QUIZ_ADMISSION_RETRY_AFTER
+            if retry_after is None else retry_after
+        )
+
+    def run(self, request, work, replay):
+        key = request.headers.get(HEADER)
+        if not key:
+            return work()
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({
+                HEADER: f"Must not be longer than {MAX_KEY_LENGTH} "
+                        f"characters."
+            })
+
+        digest = request_fingerprint(request)
+        deadline = time.monotonic() + self.wait
+
+        while True:
+            entry, leader = self.join(request.user, key, digest)
+
+            if leader:
+                self.count("new")
+                return self.lead(entry, work)
+
+            if entry is not None:
+                if entry.fingerprint != digest:
+                    self.count("reused")
+                    raise IdempotencyKeyReused()
+
+                if entry.status == IdempotencyKey.DONE:
+                    if entry.quiz is not None:
+                        self.count("replayed")
+                        response = replay(entry.quiz)
+                        response["Idempotent-Replayed"] = "true"
+                        return response
+                    # The quiz was deleted since; the key is forgotten.
+                    entry.delete()
+                    continue
+
+            if time.monotonic() + self.poll_interval > deadline:
+                self.count("in_progress")
+                raise IdempotencyInProgress(wait=self.retry_after)
+            time.sleep(self.poll_interval)
+
+    def join(self, user, key, digest):
+        now = timezone.now()
+        IdempotencyKey.objects.filter(owner=user, key=key).filter(
+            Q(created_at__lte=now - timedelta(seconds=self.ttl))
+            | Q(status=IdempotencyKey.RUNNING,
+                updated_at__lte=now - timedelta(seconds=self.timeout))
+        ).delete()
+
+        try:
+            with transaction.atomic():
+                entry = IdempotencyKey.objects.create(
+                    owner=user, key=key, fingerprint=digest
+                )
+                return entry, True
+        except IntegrityError:
+            entry = (
+                IdempotencyKey.objects.select_related("quiz")
+                .filter(owner=user, key=key).first()
+            )
+            return entry, False
+
+    def lead(self, entry, work):
+        running = IdempotencyKey.objects.filter(
+            id=entry.id, status=IdempotencyKey.RUNNING
+        )
+        try:
+            with keep_alive(running, max(1.0, self.timeout / 3)):
+                response = work()
+        except BaseException:
+            running.delete()
+            raise
+
+        quiz_id = None
+        if status.is_success(response.status_code):
+            quiz_id = (response.data or {}).get("id")
+
+        if quiz_id is None:
+            running.delete()
+        elif not running.update(status=IdempotencyKey.DONE,
+                                quiz_id=quiz_id,
+                                updated_at=timezone.now()):
+            # The row was taken for abandoned and removed meanwhile; the
+            # quiz exists all the same, so it is still returned.
+            logger.warning("Idempotency key %s vanished before quiz %s "
+                           "was stored.", entry.key, quiz_id)
+        return response
+
+    def count(self, result):
+        registry.inc("quizly_idempotency_requests_total", result=result)
@@ -0,0 +1,188 @@
+import json
+import logging
+import resource
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.utils import timezone
+
+from core.metrics import registry
+from quiz_app.models import GenerationRun
+
+logger = logging.getLogger("quiz_app.pipeline")
+
+
+def process_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class PipelineTimer:
+    """
+    Measures one quiz generation request stage by stage.
+
+    Stage durations are taken with `time.perf_counter`, the CPU time of
+    the whole worker process during every stage with `getrusage`. The CPU
+    time divided by the duration is the process CPU share of the stage in
+    cores. Being process-wide, it includes the transcription thread and
+    its torch threads (which a per-thread measurement would miss), but
+    also every other request the worker serves meanwhile, and not the
+    transcription service, which runs in another process. Database queries
+    are counted with a connection execute wrapper while `count_queries()`
+    is active. When the request is done, `finish()` stores the
+    measurements as a `GenerationRun`, logs them as one JSON line and
+    `server_timing()` renders them for the `Server-Timing` header.
+
+    Attributes:
+        - owner (User): The user who requested the quiz.
+        - video_id (str): The normalised YouTube video ID.
+        - stage_seconds (dict): Duration of every finished stage.
+        - process_cpu_seconds (dict): CPU time of the whole process during
+          every finished stage.
+        - db_queries (int): Number of queries seen by `count_queries()`.
+        - coalesced (bool): Whether the content came from another request.
+        - metrics (dict): Counters collected from the generator.
+        - details (dict): Additional pipeline specific measurements.
+
+    Methods:
+        - stage(name): Context manager timing one stage.
+        - count_queries(): Context manager counting database queries.
+        - process_cpu_share(): Returns the process CPU share (cores) of
+          every stage.
+        - collect(generate): Takes over the generator's counters.
+        - server_timing(): Returns the `Server-Timing` header value.
+        - finish(status_code): Persists and logs the run.
+    """
+
+    DETAILS = ("download_bytes", "speech_seconds", "transcript_tokens",
+               "summary_chunks", "fingerprint_ber")
+
+    def __init__(self, owner=None, video_id=""):
+        self.owner = owner
+        self.video_id = video_id
+        self.started_at = timezone.now()
+        self.started = time.perf_counter()
+        self.stage_seconds = {}
+        self.process_cpu_seconds = {}
+        self.db_queries = 0
+        self.coalesced = True
+        self.metrics = {}
+        self.details = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        cpu_start = process_cpu_seconds()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            cpu = process_cpu_seconds() - cpu_start
+            self.stage_seconds[name] = (
+                self.stage_seconds.get(name, 0.0) + duration
+            )
+            self.process_cpu_seconds[name] = (
+                self.process_cpu_seconds.get(name, 0.0) + cpu
+            )
+            registry.observe(
+                "quizly_pipeline_stage_duration_seconds",
+                duration,
+                stage=name,
+            )
+            registry.observe(
+                "quizly_pipeline_stage_process_cpu_seconds",
+                cpu,
+                stage=name,
+            )
+
+    def process_cpu_share(self):
+        return {
+            name: round(self.process_cpu_seconds[name] / seconds, 2)
+            for name, seconds in self.stage_seconds.items()
+            if seconds > 0 and name in self.process_cpu_seconds
+        }
+
+    @contextmanager
+    def count_queries(self):
+        with connection.execute_wrapper(self._count_query):
+            yield
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.db_queries += 1
+        return execute(sql, params, many, context)
+
+    def collect(self, generate):
+        self.coalesced = False
+        self.metrics = {
+            "audio_seconds": generate.audio_duration,
+            "transcript_chars": generate.transcript_chars,
+            "prompt_tokens": generate.prompt_tokens,
+            "output_tokens": generate.output_tokens,
+        }
+        for name in self.DETAILS:
+            value = getattr(generate, name, None)
+            if isinstance(value, (int, float)):
+                self.details[name] = round(value, 2)
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def real_time_factor(self):
+        audio_seconds = self.metrics.get("audio_seconds")
+        transcribe = self.stage_seconds.get("transcribe")
+        if not audio_seconds or transcribe is None:
+            return None
+        return transcribe / audio_seconds
+
+    def server_timing(self):
+        timings = [
+            f"{name};dur={seconds * 1000:.1f}"
+            for name, seconds in self.stage_seconds.items()
+        ]
+        timings.append(f"total;dur={self.total_seconds * 1000:.1f}")
+        return ", ".join(timings)
+
+    def finish(self, status_code):
+        self.details["process_cpu_seconds"] = {
+            name: round(seconds, 3)
+            for name, seconds in self.process_cpu_seconds.items()
+        }
+        self.details["process_cpu_share"] = self.process_cpu_share()
+        run = GenerationRun.objects.create(
+            owner=self.owner,
+            video_id=self.video_id,
+            status_code=status_code,
+            coalesced=self.coalesced,
+            started_at=self.started_at,
+            total_seconds=self.total_seconds,
+            stage_seconds=self.stage_seconds,
+            audio_seconds=self.metrics.get("audio_seconds"),
+            real_time_factor=self.real_time_factor,
+            transcript_chars=self.metrics.get("transcript_chars"),
+            prompt_tokens=self.metrics.get("prompt_tokens"),
+            output_tokens=self.metrics.get("output_tokens"),
+            db_queries=self.db_queries,
+            details=self.details,
+        )
+
+        logger.info(json.dumps({
+            "event": "quiz_generation_run",
+            "run_id": run.id,
+            "owner_id": run.owner_id,
+            "video_id": run.video_id,
+            "status_code": run.status_code,
+            "coalesced": run.coalesced,
+            "total_seconds": run.total_seconds,
+            "stage_seconds": run.stage_seconds,
+            "audio_seconds": run.audio_seconds,
+            "real_time_factor": run.real_time_factor,
+            "transcript_chars": run.transcript_chars,
+            "prompt_tokens": run.prompt_tokens,
+            "output_tokens": run.output_tokens,
+            "db_queries": run.db_queries,
+            "details": run.details,
+        }))
+        return run
@@ -0,0 +1,14 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class QuizSearchPagination(PageNumberPagination):
+    """
+    Page number pagination for quiz search results.
+
+    Clients choose the page with `page` and the page size with
+    `page_size` (at most `max_page_size`).
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
@@ -0,0 +1,190 @@
+"""
+Fitting transcripts into the Gemini prompt.
+
+Transcripts are measured in tokens (tiktoken, QUIZ_TOKEN_ENCODING) instead
+of characters. A transcript within QUIZ_PROMPT_TOKEN_BUDGET goes into the
+prompt as a whole. A longer one is split into chunks along sentences,
+every chunk is summarised by its own Gemini call (all calls run at the
+same time) and the quiz is built from the joined summaries. The number of
+chunks is limited by QUIZ_SUMMARY_MAX_CHUNKS, so a long transcript costs
+two rounds of Gemini calls, not more.
+
+If the tiktoken encoding cannot be loaded (it is downloaded on first use
+unless it is in TIKTOKEN_CACHE_DIR), tokens are estimated from the text
+length.
+"""
+
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import providers
+
+logger = logging.getLogger("quiz_app.pipeline")
+
+CHARS_PER_TOKEN = 4
+WORDS_PER_TOKEN = 0.75
+GEMINI_MODEL = "gemini-2.5-flash"
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def encoding():
+    """
+    Returns the tiktoken encoding of QUIZ_TOKEN_ENCODING, or None if it is
+    disabled or cannot be loaded. The result is kept per process.
+    """
+    name = settings.QUIZ_TOKEN_ENCODING
+    if not name:
+        return None
+
+    with _encodings_lock:
+        if name not in _encodings:
+            try:
+                import tiktoken
+
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                logger.warning("Token encoding %s unavailable, estimating "
+                               "tokens instead: %s", name, e)
+                _encodings[name] = None
+    return _encodings[name]
+
+
+def count_tokens(text):
+    tokens = encoding()
+    if tokens is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokens.encode(text, disallowed_special=()))
+
+
+def truncate(text, budget):
+    """
+    Returns the beginning of `text` with at most `budget` tokens.
+    """
+    tokens = encoding()
+    if tokens is None:
+        return text[:budget * CHARS_PER_TOKEN]
+    return tokens.decode(tokens.encode(text, disallowed_special=())[:budget])
+
+
+def split_chunks(text, chunk_tokens):
+    """
+    Splits `text` into chunks of at most about `chunk_tokens` tokens.
+    Chunks end at sentence ends; sentences longer than a chunk are split
+    between words.
+    """
+    units = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        tokens = count_tokens(sentence)
+        if tokens > chunk_tokens:
+            units.extend((word, count_tokens(word))
+                         for word in sentence.split())
+        elif sentence:
+            units.append((sentence, tokens))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit, tokens in units:
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens + 1
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class TranscriptPacker:
+    """
+    Prepares a transcript for the quiz prompt.
+
+    Attributes:
+        - budget (int): Tokens the transcript may take in the prompt.
+        - transcript_tokens (int): Tokens of the last packed transcript.
+        - summary_chunks (int): Chunks summarised for it (0 if it fit).
+        - prompt_tokens (int): Tokens Gemini counted for the summaries.
+        - output_tokens (int): Tokens Gemini generated for them.
+
+    Methods:
+        - pack(transcript): Returns `(text, summarised)`; the transcript
+          itself if it fits the budget, else the joined chunk summaries.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or settings.QUIZ_PROMPT_TOKEN_BUDGET
+        self.transcript_tokens = None
+        self.summary_chunks = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.lock = threading.Lock()
+
+    def pack(self, transcript):
+        self.transcript_tokens = count_tokens(transcript)
+        if self.transcript_tokens <= self.budget:
+            return transcript, False
+
+        max_chunks = settings.QUIZ_SUMMARY_MAX_CHUNKS
+        chunk_tokens = max(settings.QUIZ_SUMMARY_CHUNK_TOKENS,
+                           -(-self.transcript_tokens // max_chunks))
+        chunks = split_chunks(transcript, chunk_tokens)
+        # Chunks ending at sentences are not completely filled, so there
+        # can be a few more than planned; larger chunks bring the number
+        # back to the limit.
+        while len(chunks) > max_chunks:
+            chunk_tokens = -(-chunk_tokens * len(chunks) // max_chunks)
+            chunks = split_chunks(transcript, chunk_tokens)
+        self.summary_chunks = len(chunks)
+        summary_tokens = max(1, self.budget // len(chunks))
+
+        workers = max(1, min(settings.QUIZ_SUMMARY_WORKERS, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="quiz-summary"
+                                ) as executor:
+            summaries = list(executor.map(
+                lambda numbered: self.summarise(
+                    *numbered, len(chunks), summary_tokens
+                ),
+                enumerate(chunks, start=1),
+            ))
+
+        summary = "\n\n".join(summaries)
+        if count_tokens(summary) > self.budget:
+            summary = truncate(summary, self.budget)
+        return summary, True
+
+    def summarise(self, number, chunk, total, summary_tokens):
+        words = max(20, int(summary_tokens * WORDS_PER_TOKEN))
+        prompt = f"""
+            Summarise part {number} of {total} of a video transcript for
+            the author of a quiz about the video.
+
+            Requirements:
+            - Keep every fact, name, number, definition and example a
+              quiz question could ask about; leave out filler.
+            - Answer in English only, as plain text.
+            - Use at most {words} words.
+
+            transcript part:
+            {chunk}
+            """
+
+        response = providers.gemini().models.generate_content(
+            model=GEMINI_MODEL,
+            contents=prompt,
+        )
+
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            with self.lock:
+                self.prompt_tokens += usage.prompt_token_count or 0
+                self.output_tokens += usage.candidates_token_count or 0
+        return response.text.strip()
@@ -0,0 +1,57 @@
+"""
+Lazy access to the heavy dependencies of the quiz pipeline.
+
+yt-dlp, the Gemini SDK and Whisper take most of the time it takes to
+import `quiz_app.api`, although most requests (login, quiz lists, ...)
+never use them. They are therefore imported on first use here and not
+at module level, so loading the URLconf stays fast for every worker,
+management command and test run.
+
+Callers access the providers through the module (`providers.gemini()`)
+so tests can patch them in one place.
+"""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+_gemini_client = None
+_gemini_lock = threading.Lock()
+
+
+def youtube_dl(options):
+    """
+    Returns a `yt_dlp.YoutubeDL` for the given options.
+    """
+    import yt_dlp
+
+    return yt_dlp.YoutubeDL(options)
+
+
+def gemini():
+    """
+    Returns the process-wide Gemini client, creating it on the first
+    call with the GEMINI_API_KEY of the environment.
+    """
+    global _gemini_client
+
+    if _gemini_client is None:
+        with _gemini_lock:
+            if _gemini_client is None:
+                from google import genai
+
+                load_dotenv()
+                _gemini_client = genai.Client(
+                    api_key=os.getenv("GEMINI_API_KEY")
+                )
+    return _gemini_client
+
+
+def whisper_model(name, device):
+    """
+    Loads and returns the Whisper model `name` on `device`.
+    """
+    import whisper
+
+    return whisper.load_model(name, device=device)
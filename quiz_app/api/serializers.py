@@ -1,15 +1,32 @@
 import json
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
-import yt_dlp
+from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
-from quiz_app.models import Quiz, QuizQuestions
+from quiz_app.models import (AttemptAnswer, Quiz, QuizAttempt, QuizBatch,
+                             QuizBatchItem, QuizQuestions, QuizStats,
+                             QuizTranscript)
+from quiz_app.validators import validate_questions
+from . import ytdlp
 
 MAX_VIDEO_DURATION = 15 * 60
 
 
+def hide_answers(data):
+    """
+    Removes the correct answers from serialized quiz data unless
+    `QUIZ_EXPOSE_ANSWERS` is enabled.
+    """
+    if not settings.QUIZ_EXPOSE_ANSWERS:
+        data["questions"] = [
+            {key: value for key, value in question.items() if key != "answer"}
+            for question in data["questions"]
+        ]
+    return data
+
+
 class YoutubeURLSerializer(serializers.Serializer):
     """
     Serializer for validating and processing YouTube video URLs.
@@ -35,8 +52,11 @@ class YoutubeURLSerializer(serializers.Serializer):
     Methods:
         - validate_url(url): Validates and normalizes
           the provided YouTube URL.
-        - create(): Reads quiz data from JSON and creates a `Quiz`
-          with questions.
+        - validate(attrs): Adds the normalized `video_id` of the URL.
+        - load_content(filename): Reads and checks the generated quiz JSON.
+        - create(filename, content): Creates a `Quiz` with questions from
+          `content` or, if not given, from the JSON file, and stores the
+          compressed `transcript` of `content` if present.
 
     Raises:
         - serializers.ValidationError: If the URL or JSON data is invalid, or
@@ -72,17 +92,16 @@ class YoutubeURLSerializer(serializers.Serializer):
         }
 
         video_url = f"https://www.youtube.com/watch?v={video_id}"
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=False)
-            duration = info.get("duration")
+        info = ytdlp.extract_info(video_url, ydl_opts)
+        duration = (info or {}).get("duration")
 
-            if duration is None:
-                raise serializers.ValidationError(
-                    "The length of the video could not be read."
-                )
-            if duration > MAX_VIDEO_DURATION:
-                raise serializers.ValidationError(
-                    "Video is longer than 15 minutes.")
+        if duration is None:
+            raise serializers.ValidationError(
+                "The length of the video could not be read."
+            )
+        if duration > MAX_VIDEO_DURATION:
+            raise serializers.ValidationError(
+                "Video is longer than 15 minutes.")
 
         clean_query = urlencode({"v": video_id})
         clean_url = urlunparse(
@@ -91,24 +110,39 @@ class YoutubeURLSerializer(serializers.Serializer):
 
         return clean_url
 
-    def create(self):
-        filename = "media/generated_text.txt"
+    def validate(self, attrs):
+        query_params = parse_qs(urlparse(attrs["url"]).query)
+        attrs["video_id"] = query_params["v"][0]
+        return attrs
 
+    def load_content(self, filename="media/generated_text.txt"):
         try:
             with open(filename, "r", encoding="utf-8") as file:
                 content = json.load(file)
+        except json.JSONDecodeError:
+            raise serializers.ValidationError(
+                "File does not contain valid JSON.")
 
+        if not content.get("title") or not content.get("questions"):
+            raise serializers.ValidationError(
+                "JSON must contain at least 'title' and 'questions'."
+            )
+        validate_questions(content["questions"])
+        return content
+
+    def create(self, filename="media/generated_text.txt", content=None):
+        if content is None:
+            content = self.load_content(filename)
+        else:
+            validate_questions(content.get("questions", []))
+
+        try:
             title = content.get("title")
             description = content.get("description")
             questions_data = content.get("questions", [])
 
-            if not title or not questions_data:
-                raise serializers.ValidationError(
-                    "JSON must contain at least 'title' and 'questions'."
-                )
-
             request = self.context.get("request")
-            owner = (
+            owner = self.context.get("owner") or (
                 request.user
                 if request and request.user.is_authenticated
                 else User.objects.first()
@@ -123,20 +157,23 @@ class YoutubeURLSerializer(serializers.Serializer):
                 video_url=clean_url
             )
 
-            for q in questions_data:
-                question = QuizQuestions.objects.create(
+            questions = QuizQuestions.objects.bulk_create([
+                QuizQuestions(
                     question_title=q.get("question_title"),
                     question_options=q.get("question_options", []),
                     answer=q.get("answer"),
                 )
-                quiz.questions.add(question)
+                for q in questions_data
+            ])
+            quiz.questions.add(*questions)
+
+            transcript = content.get("transcript")
+            if transcript:
+                QuizTranscript.from_text(quiz, transcript).save()
 
             quiz.save()
             return quiz
 
-        except json.JSONDecodeError:
-            raise serializers.ValidationError(
-                "File does not contain valid JSON.")
         except Exception as e:
             raise serializers.ValidationError(str(e))
 
@@ -218,6 +255,9 @@ class CreateQuizSerializer(serializers.ModelSerializer):
             "questions",
         ]
 
+    def to_representation(self, instance):
+        return hide_answers(super().to_representation(instance))
+
 
 class QuestionForQuizzesSerializer(serializers.ModelSerializer):
     """
@@ -282,6 +322,23 @@ class MyQuizzesSerializer(serializers.ModelSerializer):
             "questions",
         ]
 
+    def to_representation(self, instance):
+        return hide_answers(super().to_representation(instance))
+
+
+class CachedQuizSerializer(MyQuizzesSerializer):
+    """
+    Serializer for `Quiz` reading the questions from `questions_cache`.
+
+    Produces the same output as `MyQuizzesSerializer` from the quiz row
+    alone, without querying the related questions.
+
+    Fields:
+        - id, title, description, created_at, updated_at, video_url, questions
+    """
+
+    questions = serializers.JSONField(source="questions_cache", read_only=True)
+
 
 class QuizSinglePatchSerializer(serializers.ModelSerializer):
     """
@@ -307,3 +364,231 @@ class QuizSinglePatchSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at",
                             "updated_at", "video_url", "questions"]
+
+
+class AttemptAnswerInputSerializer(serializers.Serializer):
+    """
+    Serializer for one answer of a submitted attempt.
+
+    Fields:
+        - question_id (int): The ID of the answered question.
+        - answer (str): The chosen answer option.
+    """
+
+    question_id = serializers.IntegerField()
+    answer = serializers.CharField(max_length=255)
+
+
+class AttemptSubmitSerializer(serializers.Serializer):
+    """
+    Serializer for submitting an attempt at a quiz.
+
+    Expects the answer index of the quiz (see `quiz_app.scoring`) as
+    `answer_index` in the context to check the question IDs.
+
+    Fields:
+        - answers (list): The answers, at most one per question.
+
+    Validation:
+        - Every question ID must belong to the quiz.
+        - A question must not be answered twice.
+    """
+
+    answers = AttemptAnswerInputSerializer(many=True)
+
+    def validate_answers(self, answers):
+        question_ids = [answer["question_id"] for answer in answers]
+        if len(question_ids) != len(set(question_ids)):
+            raise serializers.ValidationError(
+                "Each question can only be answered once."
+            )
+
+        correct_answers = self.context["answer_index"]["answers"]
+        unknown = sorted(set(question_ids) - set(correct_answers))
+        if unknown:
+            raise serializers.ValidationError(
+                f"Questions {unknown} do not belong to this quiz."
+            )
+        return answers
+
+
+class AttemptAnswerSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the stored answers of an attempt.
+
+    Fields:
+        - question, answer, is_correct
+    """
+
+    class Meta:
+        model = AttemptAnswer
+        fields = ["question", "answer", "is_correct"]
+        read_only_fields = ["question", "answer", "is_correct"]
+
+
+class QuizAttemptSerializer(serializers.ModelSerializer):
+    """
+    Serializer for scored `QuizAttempt` objects.
+
+    The answers are read from the `answer_list` attribute, which the
+    views fill either with a prefetch or with the answers just created.
+
+    Fields:
+        - id, quiz, score, total, submitted_at, answers
+    """
+
+    answers = AttemptAnswerSerializer(
+        source="answer_list", many=True, read_only=True
+    )
+
+    class Meta:
+        model = QuizAttempt
+        fields = ["id", "quiz", "score", "total", "submitted_at", "answers"]
+        read_only_fields = [
+            "id",
+            "quiz",
+            "score",
+            "total",
+            "submitted_at",
+            "answers",
+        ]
+
+
+class QuizStatsSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the aggregated statistics of a quiz.
+
+    Expects the answer index of the quiz (see `quiz_app.scoring`) as
+    `answer_index` in the context to leave out questions that no longer
+    belong to the quiz.
+
+    Fields:
+        - quiz, attempt_count, average_score, question_count,
+          score_histogram, question_misses, most_missed_question
+    """
+
+    average_score = serializers.FloatField(read_only=True)
+    question_count = serializers.SerializerMethodField()
+    question_misses = serializers.SerializerMethodField()
+    most_missed_question = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuizStats
+        fields = [
+            "quiz",
+            "attempt_count",
+            "average_score",
+            "question_count",
+            "score_histogram",
+            "question_misses",
+            "most_missed_question",
+        ]
+        read_only_fields = fields
+
+    def get_question_count(self, stats):
+        return len(self.context["answer_index"]["answers"])
+
+    def get_question_misses(self, stats):
+        question_ids = self.context["answer_index"]["answers"]
+        misses = [
+            {"question_id": int(question_id), "misses": count}
+            for question_id, count in stats.question_misses.items()
+            if int(question_id) in question_ids
+        ]
+        return sorted(
+            misses, key=lambda miss: (-miss["misses"], miss["question_id"])
+        )
+
+    def get_most_missed_question(self, stats):
+        misses = self.get_question_misses(stats)
+        return misses[0]["question_id"] if misses else None
+
+
+class QuizBatchCreateSerializer(serializers.Serializer):
+    """
+    Serializer for submitting a batch of quizzes.
+
+    Fields:
+        - urls (list of str): YouTube video URLs.
+        - playlist_url (str): A YouTube playlist URL whose videos are used.
+
+    Validation:
+        - Exactly one of `urls` and `playlist_url` must be given.
+        - At most `QUIZ_BATCH_MAX_ITEMS` URLs.
+        - The playlist URL must be a YouTube URL with a `list` parameter.
+
+    The single video URLs are checked later, in parallel, with
+    `YoutubeURLSerializer`.
+    """
+
+    urls = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+        allow_empty=False,
+    )
+    playlist_url = serializers.CharField(max_length=255, required=False)
+
+    def validate_urls(self, urls):
+        if len(urls) > settings.QUIZ_BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"A batch can contain at most "
+                f"{settings.QUIZ_BATCH_MAX_ITEMS} videos."
+            )
+        return urls
+
+    def validate_playlist_url(self, url):
+        parsed_url = urlparse(url)
+        if parsed_url.netloc not in ["www.youtube.com", "youtube.com",
+                                     "m.youtube.com"]:
+            raise serializers.ValidationError("Invalid YouTube URL domain.")
+        if not parse_qs(parsed_url.query).get("list"):
+            raise serializers.ValidationError(
+                "No playlist ID found in URL."
+            )
+        return url
+
+    def validate(self, attrs):
+        if ("urls" in attrs) == ("playlist_url" in attrs):
+            raise serializers.ValidationError(
+                "Provide either 'urls' or 'playlist_url'."
+            )
+        return attrs
+
+
+class QuizBatchItemSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the items of a `QuizBatch`.
+
+    Fields:
+        - position, url, video_id, status, error, quiz, updated_at
+    """
+
+    class Meta:
+        model = QuizBatchItem
+        fields = [
+            "position",
+            "url",
+            "video_id",
+            "status",
+            "error",
+            "quiz",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+
+class QuizBatchSerializer(serializers.ModelSerializer):
+    """
+    Serializer for `QuizBatch` with the status of every item.
+
+    Fields:
+        - id, status, created_at, updated_at, items
+    """
+
+    status = serializers.CharField(read_only=True)
+    items = QuizBatchItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = QuizBatch
+        fields = ["id", "status", "created_at", "updated_at", "items"]
+        read_only_fields = fields
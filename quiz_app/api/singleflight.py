@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.metrics import registry
+from quiz_app.models import VideoGeneration
+
+logger = logging.getLogger("quiz_app.singleflight")
+
+
+class SingleFlightTimeout(Exception):
+    """
+    Raised when a concurrent generation did not finish in time.
+
+    Attributes:
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent quiz generations for the same video.
+
+    The first request for a video inserts a `VideoGeneration` row and
+    becomes the leader: it runs the expensive work and stores the result
+    on the row. Requests arriving meanwhile fail to insert the row (its
+    `video_id` is unique), so they poll it for up to `wait` seconds and
+    then give up with `SingleFlightTimeout`, so a request thread is not
+    blocked for a whole generation; the client retries later and gets
+    the stored result. The database row works as the lock, which makes
+    this effective across all server workers.
+
+    While the leader works, it refreshes its row every third of `timeout`
+    (see `keep_alive`). If the leader fails, its row is removed and one of
+    the waiting requests takes over; so does a request finding a row that
+    was not refreshed for `timeout` seconds (e.g. of a killed worker).
+    Finished results are kept for `result_ttl` seconds and reused by later
+    requests.
+
+    Attributes:
+        - timeout (int): Seconds after which running rows that were not
+          refreshed are considered abandoned.
+        - result_ttl (int): Seconds a finished result is reused.
+        - wait (float): Seconds to wait for another leader.
+        - retry_after (int): Seconds suggested to clients that gave up.
+        - poll_interval (float): Seconds between two polls of the row.
+
+    Methods:
+        - run(key, work): Returns the result for `key`, calling `work()`
+          only if no other request is already computing it.
+    """
+
+    poll_interval = 1.0
+
+    def __init__(self, timeout=None, result_ttl=None, wait=None,
+                 retry_after=None):
+        self.timeout = (
+            settings.QUIZ_SINGLEFLIGHT_TIMEOUT
+            if timeout is None else timeout
+        )
+        self.result_ttl = (
+            settings.QUIZ_SINGLEFLIGHT_RESULT_TTL
+            if result_ttl is None else result_ttl
+        )
+        self.wait = settings.QUIZ_SINGLEFLIGHT_WAIT if wait is None else wait
+        self.retry_after = (
+            settings.QUIZ_ADMISSION_RETRY_AFTER
+            if retry_after is None else retry_after
+        )
+
+    def run(self, key, work):
+        deadline = time.monotonic() + self.wait
+
+        while True:
+            flight, leader = self.join(key)
+
+            if leader:
+                registry.inc("quizly_cache_requests_total",
+                             cache="singleflight", result="miss")
+                return self.lead(flight, work)
+
+            if flight is not None and flight.status == VideoGeneration.DONE:
+                registry.inc("quizly_cache_requests_total",
+                             cache="singleflight", result="hit")
+                return flight.result
+
+            if time.monotonic() + self.poll_interval > deadline:
+                raise SingleFlightTimeout(
+                    f"Generation for video {key} did not finish in time.",
+                    retry_after=self.retry_after,
+                )
+            time.sleep(self.poll_interval)
+
+    def join(self, key):
+        now = timezone.now()
+        VideoGeneration.objects.filter(video_id=key).filter(
+            Q(status=VideoGeneration.DONE,
+              updated_at__lte=now - timedelta(seconds=self.result_ttl))
+            | Q(status=VideoGeneration.RUNNING,
+                updated_at__lte=now - timedelta(seconds=self.timeout))
+        ).delete()
+
+        try:
+            with transaction.atomic():
+                return VideoGeneration.objects.create(video_id=key), True
+        except IntegrityError:
+            flight = VideoGeneration.objects.filter(video_id=key).first()
+            return flight, False
+
+    def lead(self, flight, work):
+        running = VideoGeneration.objects.filter(
+            id=flight.id, status=VideoGeneration.RUNNING
+        )
+        try:
+            with keep_alive(running, max(1.0, self.timeout / 3)):
+                result = work()
+        except BaseException:
+            running.delete()
+            raise
+
+        stored = running.update(status=VideoGeneration.DONE, result=result,
+                                updated_at=timezone.now())
+        if not stored:
+            # The row was taken for abandoned and removed meanwhile; the
+            # result is still valid for this request.
+            logger.warning("Generation row of video %s vanished before "
+                           "its result was stored.", flight.video_id)
+        return result
+
+
+@contextmanager
+def keep_alive(queryset, interval):
+    """
+    Touches `updated_at` of the rows of `queryset` every `interval` seconds
+    from a background thread while the block runs, so long-running work
+    is not taken for abandoned by other workers.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    queryset.update(updated_at=timezone.now())
+                except DatabaseError:
+                    logger.exception("Could not refresh running rows.")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name="quiz-keep-alive",
+                              daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
@@ -1,23 +1,62 @@
 from django.urls import path
 
-from .views import CreateQuizView, MyQuizzesView, QuizSingleView
+from .views import (CreateQuizView, GenerationSlotsView, MyQuizzesView,
+                    QuestionRegenerateView, QuizAttemptsView,
+                    QuizBatchCreateView, QuizBatchView, QuizExportView,
+                    QuizImportView, QuizSearchView, QuizSingleView,
+                    QuizStatsView)
 
 """
     URL routes for quiz-related API endpoints.
 
     Includes endpoints for:
     - Creating a new quiz
+    - Creating quizzes for several videos or a playlist and following
+      the batch
+    - Reporting the usage of the quiz generation slots
     - Retrieving a list of all quizzes
+    - Searching the quizzes and their questions
+    - Exporting and importing quizzes as NDJSON
     - Retrieving, updating, or deleting a single quiz by its ID
+    - Regenerating a single question of a quiz
+    - Submitting and listing scored attempts at a quiz
+    - Retrieving the attempt statistics of a quiz
 """
 urlpatterns = [
     path("createQuiz/",
          CreateQuizView.as_view(),
          name="create-quiz"),
+    path("createQuiz/batch/",
+         QuizBatchCreateView.as_view(),
+         name="create-quiz-batch"),
+    path("createQuiz/batch/<int:pk>/",
+         QuizBatchView.as_view(),
+         name="quiz-batch"),
+    path("createQuiz/slots/",
+         GenerationSlotsView.as_view(),
+         name="create-quiz-slots"),
     path("quizzes/",
          MyQuizzesView.as_view(),
          name="quizzes-view"),
+    path("quizzes/search/",
+         QuizSearchView.as_view(),
+         name="quiz-search"),
+    path("quizzes/export/",
+         QuizExportView.as_view(),
+         name="quiz-export"),
+    path("quizzes/import/",
+         QuizImportView.as_view(),
+         name="quiz-import"),
     path("quizzes/<int:pk>/",
          QuizSingleView.as_view(),
          name="quiz-single-view"),
+    path("quizzes/<int:pk>/questions/<int:question_pk>/regenerate/",
+         QuestionRegenerateView.as_view(),
+         name="question-regenerate"),
+    path("quizzes/<int:pk>/attempts/",
+         QuizAttemptsView.as_view(),
+         name="quiz-attempts"),
+    path("quizzes/<int:pk>/stats/",
+         QuizStatsView.as_view(),
+         name="quiz-stats"),
 ]
@@ -1,13 +1,72 @@
+import glob
+import json
+import logging
 import os
+import threading
+import uuid
 
-import yt_dlp
-from dotenv import load_dotenv
-from google import genai
+from django.conf import settings
 
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
+from core.metrics import registry
+from quiz_app.transcription import TranscriptionClient, local_service
+from . import providers
+from . import ytdlp
+from .prompting import TranscriptPacker
 
-CLIENT = genai.Client(api_key=API_KEY)
+logger = logging.getLogger("quiz_app.pipeline")
+
+
+class SharedWhisperModel:
+    """
+    Loads a Whisper model on first use and keeps it for all generators
+    it is passed to (e.g. every generation of a quiz batch), so the model
+    is only loaded once.
+
+    A model loaded with `preload()` (e.g. in the gunicorn master before
+    the workers are forked) is used by all generators of the process
+    that are not given a model, so the forked workers share its pages.
+
+    Attributes:
+        - name (str): The Whisper model name.
+        - device (str): The device the model runs on.
+
+    Methods:
+        - get(): Returns the model, loading it on the first call.
+        - preload(name, device): Loads the process-wide model.
+    """
+
+    preloaded = None
+
+    def __init__(self, name="small", device="cpu"):
+        self.name = name
+        self.device = device
+        self.model = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.model is None:
+                self.model = providers.whisper_model(self.name, self.device)
+                registry.inc("quizly_whisper_model_loads_total",
+                             model=self.name)
+        return self.model
+
+    @classmethod
+    def preload(cls, name="small", device="cpu"):
+        model = cls(name, device)
+        model.get()
+        cls.preloaded = model
+        return model
+
+
+def audio_format(min_abr):
+    """
+    Returns the yt-dlp format selector for the download: the smallest
+    audio-only stream with at least `min_abr` kbps (enough for speech
+    recognition, which works on 16 kHz mono), else the best audio-only
+    stream and only then the smallest stream with video.
+    """
+    return f"wa[abr>={min_abr}]/ba/w"
 
 
 class AudioQuestionGenerator:
@@ -16,26 +75,60 @@ class AudioQuestionGenerator:
     from a YouTube audio track.
 
     Workflow:
-        1. Download audio from a YouTube URL and convert to WAV.
-        2. Transcribe the audio using OpenAI Whisper.
+        1. Download the smallest audio stream adequate for transcription
+           from a YouTube URL, within a byte budget, and convert to WAV.
+        2. Transcribe the audio using OpenAI Whisper, on the
+           transcription thread of this process or in the transcription
+           service (WHISPER_SERVICE_SOCKET), within the cores the
+           `CpuScheduler` reserves for it. If the
+           audio fingerprint matches a recording transcribed before (e.g.
+           a re-upload), its transcript is reused instead.
         3. Generate 10 multiple-choice quiz questions from the transcript
-           using Gemini AI, strictly in JSON format.
+           using Gemini AI, strictly in JSON format. Transcripts over the
+           prompt token budget are summarised in parts first.
         4. Clean and save generated quiz text to file.
 
+    Every instance works on its own set of files (suffixed with `job_id`),
+    so several generations can run at the same time. Generators sharing a
+    `SharedWhisperModel` load the Whisper model only once; without one,
+    the preloaded model of the process is used if there is one.
+
     Attributes:
+        - job_id (str): Unique identifier of the generation run.
+        - whisper_model (SharedWhisperModel): The Whisper model to use.
         - audio_track (str): Local filename of the downloaded audio.
         - transcribed_text (str): Local filename of the transcribed text.
         - generated_text (str): Local filename of the generated quiz content.
+        - audio_duration (float): Duration of the downloaded audio (seconds).
+        - download_bytes (int): Bytes transferred for the audio.
+        - speech_seconds (float): Duration of the speech passed to Whisper
+          after the voice activity detection.
+        - transcript (str): The transcript, kept to store it with the quiz.
+        - transcript_chars (int): Length of the transcript.
+        - transcript_tokens (int): Tokens of the transcript.
+        - summary_chunks (int): Transcript parts summarised (0 if the
+          transcript fit into the prompt).
+        - prompt_tokens (int): Tokens Gemini counted for all prompts.
+        - output_tokens (int): Tokens Gemini generated for all prompts.
+        - transcript_reused (bool): Whether the transcript of a matching
+          recording was reused.
+        - fingerprint_ber (float): Bit error rate of that match.
 
     Methods:
         - download_audio(url): Downloads and converts YouTube audio to WAV.
         - transcribe_whisper(): Transcribes audio into text using Whisper.
+        - fingerprint_audio(audio_file): Fingerprints the audio.
+        - find_transcript(prints): Looks up the transcript of a matching
+                                   recording.
+        - remember_transcript(prints, result): Stores the fingerprint
+                                               with the transcript.
         - generate_questions_gemini(): Generates a quiz JSON
                                        from the transcript.
         - edge_cleaner_text(): Cleans formatting of generated quiz text.
         - remove_markdown(content): Removes markdown wrappers from text.
         - read_file(filename): Reads text content from a file.
         - write_file(filename, content): Writes text content to a file.
+        - delete_audio(): Deletes the (partially) downloaded audio.
         - delete_transcribed_text(): Deletes the transcribed text file.
         - delete_generated_text(): Deletes the generated quiz text file.
     """
@@ -44,13 +137,37 @@ class AudioQuestionGenerator:
     transcribed_text = "transcribed_text"
     generated_text = "generated_text"
 
+    def __init__(self, job_id=None, whisper_model=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.whisper_model = (
+            whisper_model
+            or SharedWhisperModel.preloaded
+            or SharedWhisperModel()
+        )
+        self.audio_track = f"audio_track_{self.job_id}"
+        self.transcribed_text = f"transcribed_text_{self.job_id}"
+        self.generated_text = f"generated_text_{self.job_id}"
+        self.audio_duration = None
+        self.download_bytes = None
+        self.speech_seconds = None
+        self.transcript = None
+        self.transcript_chars = None
+        self.transcript_tokens = None
+        self.summary_chunks = None
+        self.prompt_tokens = None
+        self.output_tokens = None
+        self.transcript_reused = False
+        self.fingerprint_ber = None
+
     def download_audio(self, url):
         output_path = "media"
         os.makedirs(output_path, exist_ok=True)
 
         ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": os.path.join(output_path, "audio_track"),
+            "format": audio_format(settings.QUIZ_AUDIO_MIN_ABR),
+            "concurrent_fragment_downloads":
+                settings.QUIZ_DOWNLOAD_FRAGMENTS,
+            "outtmpl": os.path.join(output_path, self.audio_track),
             "postprocessors": [
                 {
                     "key": "FFmpegExtractAudio",
@@ -58,30 +175,120 @@ class AudioQuestionGenerator:
                     "preferredquality": "0",
                 }
             ],
+            # 16 kHz mono is what Whisper and the voice activity detection
+            # work on, so nothing has to be resampled later.
+            "postprocessor_args": {
+                "extractaudio": ["-ar", "16000", "-ac", "1"],
+            },
         }
 
-        with yt_dlp.YoutubeDL(ydl_opts) as audio:
-            audio.extract_info(url, download=True)
-            self.audio_track = "audio_track"
+        try:
+            result = ytdlp.download(url, ydl_opts,
+                                    settings.QUIZ_DOWNLOAD_MAX_BYTES)
+        except Exception as e:
+            self.download_bytes = getattr(e, "download_bytes", None)
+            self.delete_audio()
+            raise
+        else:
+            self.download_bytes = result["bytes"]
+            self.audio_duration = (result["info"] or {}).get("duration")
+        finally:
+            registry.inc("quizly_download_bytes_total",
+                         amount=self.download_bytes or 0)
 
     def transcribe_whisper(self):
-        import whisper 
-        model = whisper.load_model("small", device="cpu")
         audio_file = f"media/{self.audio_track}.wav"
 
-        result = model.transcribe(audio_file)
-        if os.path.exists(audio_file):
-            os.remove(audio_file)
+        try:
+            prints = self.fingerprint_audio(audio_file)
+            result = self.find_transcript(prints)
+            if result is None:
+                result = self.transcribe_audio(audio_file)
+                self.remember_transcript(prints, result)
+        finally:
+            if os.path.exists(audio_file):
+                os.remove(audio_file)
 
-        self.transcript_text = "transcribed_text"
+        text = result["text"]
+        self.speech_seconds = result["speech_seconds"]
+        self.transcript = text
+        self.transcript_chars = len(text)
         text_file_path = f"media/{self.transcribed_text}.txt"
         with open(text_file_path, "w", encoding="utf-8") as f:
-            f.write(result["text"])
+            f.write(text)
+
+    def transcribe_audio(self, audio_file):
+        if settings.WHISPER_SERVICE_SOCKET:
+            return TranscriptionClient().transcribe(path=audio_file)
+        return local_service().submit(
+            audio_file, self.whisper_model
+        ).result()
+
+    def fingerprint_audio(self, audio_file):
+        """
+        Returns the fingerprint and the duration of the audio, or None if
+        fingerprinting is disabled or the audio cannot be read.
+        """
+        if not settings.QUIZ_FINGERPRINT_ENABLED:
+            return None
+
+        from quiz_app import fingerprint
+
+        try:
+            prints, duration = fingerprint.fingerprint_file(audio_file)
+        except Exception as e:
+            logger.warning("Fingerprinting %s failed: %s", audio_file, e)
+            return None
+        return (prints, duration) if len(prints) else None
+
+    def find_transcript(self, prints):
+        """
+        Returns the stored transcript of the same audio as a transcription
+        result, or None if there is none.
+        """
+        if prints is None:
+            return None
+
+        from quiz_app import fingerprint
+
+        try:
+            match, self.fingerprint_ber = fingerprint.find_transcript(
+                *prints
+            )
+        except Exception as e:
+            logger.warning("Transcript lookup failed: %s", e)
+            return None
+
+        registry.inc("quizly_cache_requests_total", cache="fingerprint",
+                     result="miss" if match is None else "hit")
+        if match is None:
+            return None
+        self.transcript_reused = True
+        return {"text": match.text, "speech_seconds": match.speech_seconds}
+
+    def remember_transcript(self, prints, result):
+        if prints is None:
+            return
+
+        from quiz_app import fingerprint
+
+        try:
+            fingerprint.remember_transcript(
+                *prints, result["text"], result.get("speech_seconds")
+            )
+        except Exception as e:
+            logger.warning("Storing the audio fingerprint failed: %s", e)
 
     def generate_questions_gemini(self):
         input_filename = f"media/{self.transcribed_text}.txt"
         transcript = self.read_file(input_filename)
 
+        packer = TranscriptPacker()
+        text, summarised = packer.pack(transcript)
+        self.transcript_tokens = packer.transcript_tokens
+        self.summary_chunks = packer.summary_chunks
+        label = "transcript summary" if summarised else "transcript"
+
         prompt = f"""
             Create a quiz based on the following transcript.
 
@@ -111,16 +318,23 @@ class AudioQuestionGenerator:
             ]
             }}
 
-            transcript:
-            {transcript[:10000]}
+            {label}:
+            {text}
             """
 
-        response = CLIENT.models.generate_content(
+        response = providers.gemini().models.generate_content(
             model="gemini-2.5-flash",
             contents=prompt,
         )
 
-        self.generated_text = "generated_text"
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_token_count or 0
+            self.output_tokens = usage.candidates_token_count or 0
+            if summarised:
+                self.prompt_tokens += packer.prompt_tokens
+                self.output_tokens += packer.output_tokens
+
         filename = f"media/{self.generated_text}.txt"
         self.write_file(filename, response.text)
 
@@ -133,7 +347,8 @@ class AudioQuestionGenerator:
         self.write_file(filename, content)
         return content
 
-    def remove_markdown(self, content):
+    @staticmethod
+    def remove_markdown(content):
         if content.startswith("```json"):
             content = content[len("```json "):]
 
@@ -150,6 +365,10 @@ class AudioQuestionGenerator:
         with open(filename, "w", encoding="utf-8") as file:
             file.write(content)
 
+    def delete_audio(self):
+        for filename in glob.glob(f"media/{self.audio_track}*"):
+            os.remove(filename)
+
     def delete_transcribed_text(self):
         if os.path.exists(f"media/{self.transcribed_text}.txt"):
             os.remove(f"media/{self.transcribed_text}.txt")
@@ -157,3 +376,98 @@ class AudioQuestionGenerator:
     def delete_generated_text(self):
         if os.path.exists(f"media/{self.generated_text}.txt"):
             os.remove(f"media/{self.generated_text}.txt")
+
+
+class QuestionRegenerator:
+    """
+    Asks Gemini for one replacement question based on a stored transcript,
+    instead of running the whole video pipeline again. The transcript is
+    packed with `TranscriptPacker` like for the original quiz, so long
+    videos are covered by their summary instead of their beginning.
+
+    Attributes:
+        - transcript (str): The transcript of the quiz video.
+        - transcript_chars (int): Length of the transcript.
+        - transcript_tokens (int): Tokens of the transcript.
+        - summary_chunks (int): Chunks summarised (0 if it fit).
+        - prompt_tokens (int): Tokens Gemini counted for the prompt.
+        - output_tokens (int): Tokens Gemini generated.
+
+    Methods:
+        - generate(existing_titles): Returns the new question as a dict
+          with `question_title`, `question_options` and `answer`.
+
+    Raises:
+        - ValueError: If Gemini does not return a JSON object.
+    """
+
+    audio_duration = None
+
+    def __init__(self, transcript):
+        self.transcript = transcript
+        self.transcript_chars = len(transcript)
+        self.transcript_tokens = None
+        self.summary_chunks = 0
+        self.prompt_tokens = None
+        self.output_tokens = None
+
+    def generate(self, existing_titles):
+        existing = "\n".join(f"- {title}" for title in existing_titles)
+        packer = TranscriptPacker()
+        text, summarised = packer.pack(self.transcript)
+        self.transcript_tokens = packer.transcript_tokens
+        self.summary_chunks = packer.summary_chunks
+        label = "transcript summary" if summarised else "transcript"
+        prompt = f"""
+            Create one new multiple-choice question based on the following
+            transcript.
+
+            Requirements:
+            - The question must have exactly 4 distinct answer options.
+            - The question must have exactly one correct answer.
+            - Include the correct answer in the 'question_options'.
+            - Do not repeat or rephrase any of the existing questions.
+            - Do not include explanations, comments, or any text outside
+              the JSON.
+            - Answer in English only.
+            - Return the output strictly in the following JSON format:
+
+            {{
+                "question_title": "The question goes here.",
+                "question_options": [
+                    "Option A",
+                    "Option B",
+                    "Option C",
+                    "Option D"
+                ],
+                "answer": "The correct answer from the above options"
+            }}
+
+            existing questions:
+            {existing}
+
+            {label}:
+            {text}
+            """
+
+        response = providers.gemini().models.generate_content(
+            model="gemini-2.5-flash",
+            contents=prompt,
+        )
+
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_token_count or 0
+            self.output_tokens = usage.candidates_token_count or 0
+            if summarised:
+                self.prompt_tokens += packer.prompt_tokens
+                self.output_tokens += packer.output_tokens
+
+        content = AudioQuestionGenerator.remove_markdown(response.text.strip())
+        try:
+            question = json.loads(content)
+        except json.JSONDecodeError:
+            raise ValueError("Gemini did not return valid JSON.")
+        if not isinstance(question, dict):
+            raise ValueError("Gemini did not return a JSON object.")
+        return question
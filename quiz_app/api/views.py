@@ -1,21 +1,89 @@
-from django.db import DatabaseError
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from rest_framework import generics, status
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, Throttled
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from quiz_app.models import Quiz
+from quiz_app.models import (AttemptAnswer, Quiz, QuizAttempt, QuizBatch,
+                             QuizBatchItem, QuizQuestions, QuizStats,
+                             QuizTranscript)
+from quiz_app.scoring import get_answer_index, score_answers
+from quiz_app.search import search_quiz_ids
+from quiz_app.stats import record_attempt
+from quiz_app.transfer import QuizImporter, export_lines
+from quiz_app.validators import question_errors
+from .admission import AdmissionController, AdmissionRejected
+from .batch import (expand_playlist, resume_batch, start_batch,
+                    validate_urls, validation_error)
+from .idempotency import IdempotentRequests
+from .instrumentation import PipelineTimer
+from .pagination import QuizSearchPagination
 from .permissions import IsOwner, CookieJWTAuthentication
 from .serializers import (
+    AttemptSubmitSerializer,
+    CachedQuizSerializer,
     CreateQuizSerializer,
     MyQuizzesSerializer,
+    QuestionForQuizzesSerializer,
+    QuizAttemptSerializer,
+    QuizBatchCreateSerializer,
+    QuizBatchSerializer,
     QuizSinglePatchSerializer,
+    QuizStatsSerializer,
     YoutubeURLSerializer,
+    hide_answers,
 )
-from .utils import AudioQuestionGenerator
+from .singleflight import SingleFlight, SingleFlightTimeout
+from .utils import AudioQuestionGenerator, QuestionRegenerator
+from .ytdlp import YtDlpTimeout
+
+
+def quiz_serializer_class():
+    """
+    Returns the serializer for reading quizzes: with
+    `QUIZ_DENORMALISED_QUESTIONS` enabled, questions are read from the
+    `questions_cache` column instead of the related table.
+    """
+    if settings.QUIZ_DENORMALISED_QUESTIONS:
+        return CachedQuizSerializer
+    return MyQuizzesSerializer
+
+
+def owned_answer_index(request, pk):
+    """
+    Returns the cached answer index of the quiz (see `quiz_app.scoring`)
+    after checking that the quiz exists and belongs to the user.
+    """
+    answer_index = get_answer_index(pk)
+    if answer_index is None:
+        raise Http404("Quiz not found.")
+    if answer_index["owner_id"] != request.user.id:
+        raise PermissionDenied(
+            "You do not have permission to access this quiz."
+            )
+    return answer_index
+
+
+def video_id_of(video_url):
+    return parse_qs(urlparse(video_url).query).get("v", [""])[0]
+
+
+class GenerationFailed(Exception):
+    """
+    Carries the error response of a failed quiz processing step.
+    """
+
+    def __init__(self, response):
+        super().__init__(response.data.get("detail"))
+        self.response = response
 
 
 class CreateQuizView(APIView):
@@ -31,11 +99,37 @@ class CreateQuizView(APIView):
     - Cleans up and refines the generated text.
     - Deletes temporary transcription and generation files.
 
+    The processing steps only run while a generation slot is held (see
+    `AdmissionController`), which caps concurrent generations globally
+    and per user.
+
+    Concurrent requests for the same video are coalesced (see
+    `SingleFlight`): only the first one runs the processing steps, the
+    others wait a few seconds for its result and each receives its own
+    copy of the quiz.
+
+    Requests may carry an `Idempotency-Key` header (see
+    `IdempotentRequests`): retries with the same key return the quiz of
+    the first request instead of generating another one.
+
+    Every stage is timed (see `PipelineTimer`). The measurements are stored
+    as a `GenerationRun`, logged and returned in the `Server-Timing` header.
+
     Returns:
         - 201 Created: Successfully generated and saved the quiz.
         - 400 Bad Request: Validation errors in the submitted data.
+        - 409 Conflict: The first request with the same
+          `Idempotency-Key` did not finish in time. The `Retry-After`
+          header tells the client when to try again.
+        - 422 Unprocessable Entity: The `Idempotency-Key` was used for
+          a different request.
+        - 429 Too Many Requests: No generation slot became free in time.
+          The `Retry-After` header tells the client when to try again.
         - 500 Internal Server Error: If any processing step (audio download,
           transcription, question generation, or cleanup) fails.
+        - 503 Service Unavailable: A concurrent generation of the same video
+          did not finish in time. The `Retry-After` header tells the client
+          when to try again.
 
     Requires JWT authentication and that the user is the resource owner.
 
@@ -46,40 +140,132 @@ class CreateQuizView(APIView):
     permission_classes = [IsAuthenticated, IsOwner]
 
     def post(self, request):
+        return IdempotentRequests().run(
+            request,
+            lambda: self.process(request),
+            lambda quiz: Response(CreateQuizSerializer(quiz).data,
+                                  status=status.HTTP_201_CREATED),
+        )
+
+    def process(self, request):
+        timer = PipelineTimer(owner=request.user)
         serializer = YoutubeURLSerializer(
             data=request.data,
             context={"request": request}
         )
 
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with timer.count_queries():
+                response = self.validate_and_create(request, serializer,
+                                                    timer)
+        except Exception as e:
+            timer.finish(getattr(e, "status_code", 500))
+            raise
 
-        url = serializer.validated_data["url"]
-        generate = AudioQuestionGenerator()
+        timer.finish(response.status_code)
+        response["Server-Timing"] = timer.server_timing()
+        return response
 
-        error_response = (
-            self.handle_audio_download(generate, url)
-            or self.handle_transcription(generate)
-            or self.handle_question_generation(generate)
-            or self.handle_text_cleaning(generate)
-            or self.handle_delete_transcribed(generate)
-        )
+    def validate_and_create(self, request, serializer, timer):
+        # The validation looks up the video metadata, which can time out.
+        with timer.stage("validate"):
+            is_valid = serializer.is_valid()
 
-        if error_response:
-            return error_response
+        if not is_valid:
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
 
+        timer.video_id = serializer.validated_data["video_id"]
+        return self.create_quiz(request, serializer, timer)
+
+    def create_quiz(self, request, serializer, timer):
         try:
-            quiz = serializer.create()
+            quiz = self.build_quiz(request.user, serializer, timer)
+        except AdmissionRejected as e:
+            raise Throttled(
+                wait=e.retry_after,
+                detail=(
+                    "Too many quizzes are being generated. "
+                    "Please try again later."
+                ),
+            )
+        except GenerationFailed as e:
+            return e.response
+        except SingleFlightTimeout as e:
             return Response(
-                CreateQuizSerializer(quiz).data,
-                status=status.HTTP_201_CREATED
+                {"detail": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
+        return Response(
+            CreateQuizSerializer(quiz).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def build_quiz(self, user, serializer, timer, admission=None,
+                   whisper_model=None, singleflight=None):
+        singleflight = singleflight or SingleFlight()
+        with timer.stage("content"):
+            content = singleflight.run(
+                serializer.validated_data["video_id"],
+                lambda: self.generate_content(
+                    user, serializer, timer, admission, whisper_model
+                ),
+            )
+
+        with timer.stage("save"):
+            return serializer.create(content=content)
+
+    def generate_content(self, user, serializer, timer, admission=None,
+                         whisper_model=None):
+        url = serializer.validated_data["url"]
+        admission = admission or AdmissionController()
+
+        with timer.stage("admission"):
+            slot = admission.acquire(user)
+
+        generate = AudioQuestionGenerator(whisper_model=whisper_model)
+        try:
+            error_response = (
+                self.run_stage(timer, "download",
+                               self.handle_audio_download, generate, url)
+                or self.run_stage(timer, "transcribe",
+                                  self.handle_transcription, generate)
+                or self.run_stage(timer, "generate",
+                                  self.handle_question_generation, generate)
+                or self.run_stage(timer, "clean",
+                                  self.handle_text_cleaning, generate)
+                or self.run_stage(timer, "cleanup",
+                                  self.handle_delete_transcribed, generate)
             )
+            timer.collect(generate)
+
+            if error_response:
+                raise GenerationFailed(error_response)
+
+            content = serializer.load_content(
+                f"media/{generate.generated_text}.txt"
+            )
+            if isinstance(generate.transcript, str):
+                content["transcript"] = generate.transcript
+            return content
         finally:
             generate.delete_generated_text()
+            admission.release(slot)
+
+    def run_stage(self, timer, name, handler, *args):
+        with timer.stage(name):
+            return handler(*args)
 
     def handle_audio_download(self, generate, url):
         try:
             generate.download_audio(url)
+        except YtDlpTimeout as e:
+            return Response(
+                {"detail": f"Audio download failed: {str(e)}"},
+                status=status.HTTP_504_GATEWAY_TIMEOUT,
+            )
         except Exception as e:
             return Response(
                 {"detail": f"Audio download failed: {str(e)}"},
@@ -128,11 +314,158 @@ class CreateQuizView(APIView):
             )
 
 
+class QuizBatchCreateView(APIView):
+    """
+    Create quizzes for several YouTube videos at once.
+
+    Accepts either a list of video URLs (`urls`) or a playlist URL
+    (`playlist_url`), whose videos are listed with yt-dlp's flat
+    extraction. The metadata of all videos is checked in parallel; invalid
+    videos become "rejected" items, the others are generated one after
+    another in the background (see `BatchRunner`), sharing one Whisper
+    model. The batch can be followed at `createQuiz/batch/<id>/`.
+
+    Returns:
+        - 202 Accepted: The batch with the status of every item.
+        - 400 Bad Request: Invalid input, an unreadable or empty playlist,
+          or too many videos.
+
+    Requires JWT authentication.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = QuizBatchCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        urls = serializer.validated_data.get("urls")
+        if urls is None:
+            try:
+                urls = expand_playlist(
+                    serializer.validated_data["playlist_url"]
+                )
+            except Exception as e:
+                return Response(
+                    {"detail": f"Playlist could not be read: {str(e)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            error = self.playlist_error(urls)
+            if error:
+                return Response({"detail": error},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        validated = validate_urls(urls, {"request": request})
+
+        with transaction.atomic():
+            batch = QuizBatch.objects.create(owner=request.user)
+            items = QuizBatchItem.objects.bulk_create([
+                self.build_item(batch, position, url, url_serializer)
+                for position, (url, url_serializer)
+                in enumerate(zip(urls, validated))
+            ])
+
+        prepared = {
+            item.id: url_serializer
+            for item, url_serializer in zip(items, validated)
+            if item.status == QuizBatchItem.PENDING
+        }
+        if prepared and settings.QUIZ_BATCH_BACKGROUND:
+            transaction.on_commit(lambda: start_batch(
+                batch, CreateQuizView().build_quiz, prepared
+            ))
+
+        return Response(QuizBatchSerializer(batch).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+    def playlist_error(self, urls):
+        if not urls:
+            return "The playlist does not contain any videos."
+        if len(urls) > settings.QUIZ_BATCH_MAX_ITEMS:
+            return (
+                f"A batch can contain at most "
+                f"{settings.QUIZ_BATCH_MAX_ITEMS} videos."
+            )
+        return None
+
+    def build_item(self, batch, position, url, url_serializer):
+        error = validation_error(url_serializer)
+        if error:
+            return QuizBatchItem(batch=batch, position=position, url=url,
+                                 status=QuizBatchItem.REJECTED, error=error)
+        return QuizBatchItem(
+            batch=batch,
+            position=position,
+            url=url_serializer.validated_data["url"],
+            video_id=url_serializer.validated_data["video_id"],
+        )
+
+
+class QuizBatchView(APIView):
+    """
+    Retrieve a quiz batch with the status of every item.
+
+    Items left running by a worker that was recycled or killed are resumed
+    (see `resume_batch`), so following a batch keeps it going.
+
+    Only the authenticated owner of the batch can access this endpoint.
+    Requires JWT authentication.
+
+    Returns:
+        - 200 OK: The batch with its items.
+        - 401 Unauthorized / 403 Forbidden: Access denied.
+        - 404 Not Found: Batch not found.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsOwner]
+
+    def get(self, request, pk):
+        batch = get_object_or_404(
+            QuizBatch.objects.prefetch_related("items"), id=pk
+        )
+        if not IsOwner().has_object_permission(request, self, batch):
+            raise PermissionDenied(
+                "You do not have permission to access this batch."
+                )
+        if resume_batch(batch, CreateQuizView().build_quiz):
+            batch = QuizBatch.objects.prefetch_related("items").get(id=pk)
+        return Response(QuizBatchSerializer(batch).data,
+                        status=status.HTTP_200_OK)
+
+
+class GenerationSlotsView(APIView):
+    """
+    Report the current usage of the quiz generation slots.
+
+    Returns how many generations are running for all users and for the
+    authenticated user, together with the configured limits.
+
+    Returns:
+        - 200 OK: Successfully retrieved the slot usage.
+
+    Requires JWT authentication.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(
+            AdmissionController().usage(request.user),
+            status=status.HTTP_200_OK
+        )
+
+
 class MyQuizzesView(generics.ListAPIView):
     """
     Retrieve all quizzes created by the authenticated user.
 
-    Returns a list of quizzes owned by the currently authenticated user.
+    Returns a list of quizzes owned by the currently authenticated user,
+    newest first.
     Each quiz includes serialized details such as title, questions, and
     creation metadata.
 
@@ -149,8 +482,10 @@ class MyQuizzesView(generics.ListAPIView):
 
     def get(self, request, *args, **kwargs):
         try:
-            quiz = Quiz.objects.filter(owner=self.request.user)
-            serializer = MyQuizzesSerializer(
+            quiz = Quiz.objects.filter(
+                owner=self.request.user
+            ).order_by("-created_at")
+            serializer = quiz_serializer_class()(
                 quiz, many=True, context={"request": request}
             )
             return Response(
@@ -165,6 +500,109 @@ class MyQuizzesView(generics.ListAPIView):
             )
 
 
+class QuizExportView(APIView):
+    """
+    Export all quizzes of the authenticated user as NDJSON.
+
+    Streams one quiz with its questions (including the answers) per line
+    (see `quiz_app.transfer`). The quizzes are read in chunks while the
+    response is sent, so memory use does not depend on their number.
+
+    Returns:
+        - 200 OK: The NDJSON stream as `quizzes.ndjson` attachment.
+
+    Requires JWT authentication.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        response = StreamingHttpResponse(
+            export_lines(Quiz.objects.filter(owner=request.user)),
+            content_type="application/x-ndjson",
+        )
+        response["Content-Disposition"] = (
+            'attachment; filename="quizzes.ndjson"'
+        )
+        return response
+
+
+class QuizImportView(APIView):
+    """
+    Import quizzes from an NDJSON request body.
+
+    Expects the format of `quizzes/export/`; the imported quizzes belong to
+    the authenticated user. The body is read line by line and loaded in
+    batched transactions (see `QuizImporter`). Invalid lines are skipped
+    and reported with their line number.
+
+    Returns:
+        - 201 Created: `imported` (number of quizzes) and `errors`.
+        - 400 Bad Request: No quiz could be imported.
+
+    Requires JWT authentication.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        importer = QuizImporter(owner=request.user).run(request.stream or [])
+        data = {"imported": importer.imported, "errors": importer.errors}
+
+        if not importer.imported:
+            data["detail"] = "No quizzes were imported."
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class QuizSearchView(APIView):
+    """
+    Search the quizzes of the authenticated user.
+
+    Matches the query parameter `q` against the quiz title and
+    description and the question titles and options (see
+    `quiz_app.search`). Results are ranked, best match first, and
+    paginated with `page` and `page_size`.
+
+    Returns:
+        - 200 OK: A page of matching quizzes with `count`, `next`,
+          `previous` and `results`.
+        - 400 Bad Request: The query parameter `q` is missing.
+        - 404 Not Found: The requested page does not exist.
+
+    Requires JWT authentication.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = QuizSearchPagination
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"detail": "Query parameter 'q' is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        paginator = self.pagination_class()
+        quiz_ids = paginator.paginate_queryset(
+            search_quiz_ids(request.user, query), request, view=self
+        )
+        quizzes = Quiz.objects.all()
+        if not settings.QUIZ_DENORMALISED_QUESTIONS:
+            quizzes = quizzes.prefetch_related("questions")
+        quizzes = quizzes.in_bulk(quiz_ids)
+        serializer = quiz_serializer_class()(
+            [quizzes[quiz_id] for quiz_id in quiz_ids if quiz_id in quizzes],
+            many=True,
+            context={"request": request}
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+
 class QuizSingleView(APIView):
     """
     Retrieve, update, or delete a quiz by its ID.
@@ -193,7 +631,9 @@ class QuizSingleView(APIView):
 
     def get(self, request, pk):
         quiz = self.get_object(pk)
-        serializer = MyQuizzesSerializer(quiz, context={"request": request})
+        serializer = quiz_serializer_class()(
+            quiz, context={"request": request}
+        )
         return Response(serializer.data)
 
     def patch(self, request, pk):
@@ -204,15 +644,16 @@ class QuizSingleView(APIView):
         if serializer.is_valid():
             quiz = serializer.save()
             return Response(
-                MyQuizzesSerializer(quiz, context={"request": request}).data
-                )
+                quiz_serializer_class()(
+                    quiz, context={"request": request}
+                ).data
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
         quiz = self.get_object(pk)
+        question_ids = list(quiz.questions.values_list("id", flat=True))
 
-        quiz.questions.all().delete()
-        
         try:
             quiz.delete()
         except DatabaseError as e:
@@ -220,4 +661,204 @@ class QuizSingleView(APIView):
                 {"error": f"An unexpected error occurred.: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+        # Deleted after the quiz, so no quiz cache has to be refreshed.
+        QuizQuestions.objects.filter(id__in=question_ids).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class QuizAttemptsView(APIView):
+    """
+    Submit and list attempts at a quiz.
+
+    Submissions are scored on the server against the answer index of the
+    quiz (see `quiz_app.scoring`). The index is cached, so scoring needs
+    no query; only the attempt, its answers and the quiz statistics (see
+    `quiz_app.stats`) are written.
+
+    POST expects `{"answers": [{"question_id": ..., "answer": ...}]}`.
+    Unanswered questions count as wrong. GET returns the attempts of the
+    authenticated user at the quiz, newest first.
+
+    Only the authenticated owner of the quiz can access this endpoint.
+    Requires JWT authentication.
+
+    Responses:
+        - 200 OK: Attempts retrieved successfully.
+        - 201 Created: Attempt scored and saved.
+        - 400 Bad Request: Invalid answers.
+        - 401 Unauthorized / 403 Forbidden: Access denied.
+        - 404 Not Found: Quiz not found.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        owned_answer_index(request, pk)
+        attempts = QuizAttempt.objects.filter(
+            quiz_id=pk, user=request.user
+        ).order_by("-submitted_at", "-id").prefetch_related(
+            Prefetch("answers", to_attr="answer_list")
+        )
+        return Response(
+            QuizAttemptSerializer(attempts, many=True).data,
+            status=status.HTTP_200_OK
+        )
+
+    def post(self, request, pk):
+        answer_index = owned_answer_index(request, pk)
+        serializer = AttemptSubmitSerializer(
+            data=request.data, context={"answer_index": answer_index}
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        score, results = score_answers(answer_index, [
+            (answer["question_id"], answer["answer"])
+            for answer in serializer.validated_data["answers"]
+        ])
+
+        with transaction.atomic():
+            attempt = QuizAttempt.objects.create(
+                quiz_id=pk,
+                user=request.user,
+                score=score,
+                total=len(answer_index["answers"]),
+            )
+            attempt.answer_list = AttemptAnswer.objects.bulk_create([
+                AttemptAnswer(
+                    attempt=attempt,
+                    question_id=question_id,
+                    answer=answer,
+                    is_correct=is_correct,
+                )
+                for question_id, answer, is_correct in results
+            ])
+            record_attempt(pk, score, results)
+
+        return Response(
+            QuizAttemptSerializer(attempt).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+class QuizStatsView(APIView):
+    """
+    Retrieve the aggregated attempt statistics of a quiz.
+
+    The statistics are read from the incrementally maintained `QuizStats`
+    row, so the response time does not depend on the number of attempts.
+    Misses of questions that no longer belong to the quiz are left out.
+
+    Only the authenticated owner of the quiz can access this endpoint.
+    Requires JWT authentication.
+
+    Responses:
+        - 200 OK: Statistics retrieved successfully.
+        - 401 Unauthorized / 403 Forbidden: Access denied.
+        - 404 Not Found: Quiz not found.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        answer_index = owned_answer_index(request, pk)
+        stats = (
+            QuizStats.objects.filter(quiz_id=pk).first()
+            or QuizStats(quiz_id=pk)
+        )
+        serializer = QuizStatsSerializer(
+            stats, context={"answer_index": answer_index}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class QuestionRegenerateView(APIView):
+    """
+    Replace one question of a quiz with a newly generated one.
+
+    Gemini is asked for a single question based on the transcript stored
+    with the quiz (see `QuizTranscript`), so the video is neither
+    downloaded nor transcribed again. Long transcripts are summarised the
+    same way as for the original quiz (see `TranscriptPacker`). The new
+    question replaces the old one in the quiz; the old question itself is
+    kept, so answers given to it in earlier attempts still point to it and
+    rebuilt statistics match the recorded ones. The call is timed and
+    stored as a `GenerationRun`.
+
+    Only the authenticated owner of the quiz can access this endpoint.
+    Requires JWT authentication.
+
+    Responses:
+        - 201 Created: The new question.
+        - 401 Unauthorized / 403 Forbidden: Access denied.
+        - 404 Not Found: Quiz or question not found.
+        - 409 Conflict: No transcript is stored for the quiz (e.g. quizzes
+          created before transcripts were kept).
+        - 500 Internal Server Error: Gemini failed or returned an invalid
+          question.
+    """
+
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated, IsOwner]
+
+    def post(self, request, pk, question_pk):
+        quiz = get_object_or_404(Quiz, id=pk)
+        if not IsOwner().has_object_permission(request, self, quiz):
+            raise PermissionDenied(
+                "You do not have permission to access this quiz."
+                )
+        old_question = get_object_or_404(quiz.questions, id=question_pk)
+        transcript = QuizTranscript.objects.filter(quiz=quiz).first()
+        if transcript is None:
+            return Response(
+                {"detail": "No transcript is stored for this quiz."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        timer = PipelineTimer(owner=request.user,
+                              video_id=video_id_of(quiz.video_url))
+        timer.details["regenerated_question_id"] = old_question.id
+        regenerator = QuestionRegenerator(transcript.text)
+        try:
+            with timer.stage("generate"):
+                question = regenerator.generate([
+                    entry["question_title"]
+                    for entry in quiz.questions_cache
+                ])
+            timer.collect(regenerator)
+            errors = question_errors(
+                question.get("question_title"),
+                question.get("question_options"),
+                question.get("answer"),
+            )
+            if errors:
+                raise ValueError(
+                    "Gemini returned an invalid question: "
+                    + " ".join(errors)
+                )
+        except Exception as e:
+            timer.finish(status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response(
+                {"detail": f"Regenerating the question failed: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        with timer.stage("save"), transaction.atomic():
+            new_question = QuizQuestions.objects.create(
+                question_title=question["question_title"],
+                question_options=question["question_options"],
+                answer=question["answer"],
+            )
+            quiz.questions.remove(old_question)
+            quiz.questions.add(new_question)
+
+        timer.finish(status.HTTP_201_CREATED)
+        data = QuestionForQuizzesSerializer(new_question).data
+        return Response(
+            hide_answers({"questions": [data]})["questions"][0],
+            status=status.HTTP_201_CREATED
+        )
@@ -0,0 +1,231 @@
+"""
+yt-dlp in supervised subprocesses.
+
+An extractor can hang on a slow or misbehaving site, and yt-dlp has no
+overall timeout. Every yt-dlp operation therefore runs in a child
+process that is killed after a wall-clock timeout (YTDLP_INFO_TIMEOUT for
+metadata, YTDLP_DOWNLOAD_TIMEOUT for downloads), so a stuck extractor
+fails the request instead of blocking its worker forever. At most
+YTDLP_MAX_PROCESSES children run per worker process; `terminate_all()`
+kills the running ones (e.g. when gunicorn aborts a worker).
+
+Results come back over a pipe: the info dict reduced to plain JSON types
+and, for downloads, the transferred bytes (the audio itself is written to
+`media/` by the child). Exceptions of the child are raised again in the
+caller.
+
+The children are started by a fork server by default
+(YTDLP_START_METHOD): a single-threaded process that imports yt-dlp once
+and forks a child for every operation, so the children neither import
+yt-dlp again nor inherit the threads and locks of the worker. With
+YTDLP_ISOLATION disabled the operations run in the calling thread.
+"""
+
+import json
+import multiprocessing
+import pickle
+import threading
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import providers
+
+_slots = None
+_slots_lock = threading.Lock()
+_processes = set()
+
+FORKSERVER_PRELOAD = ["yt_dlp", "quiz_app.api.ytdlp"]
+
+
+class YtDlpTimeout(APIException):
+    """
+    Raised when a yt-dlp operation does not finish within its timeout.
+    """
+
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = "YouTube did not respond in time."
+    default_code = "ytdlp_timeout"
+
+
+class YtDlpFailed(Exception):
+    """
+    Raised for errors of the child process that cannot be passed back
+    as they are (e.g. unpicklable yt-dlp errors) or if it crashed.
+    """
+
+
+class DownloadBudgetExceeded(Exception):
+    """
+    Raised when an audio download exceeds QUIZ_DOWNLOAD_MAX_BYTES.
+    """
+
+
+class DownloadMeter:
+    """
+    yt-dlp progress hook that counts the downloaded bytes and stops the
+    download once it exceeds the byte budget. Downloads announcing a
+    larger size are stopped right away.
+
+    Attributes:
+        - max_bytes (int): The byte budget; 0 disables the limit.
+        - files (dict): Downloaded bytes per file.
+
+    Methods:
+        - bytes: Downloaded bytes of all files.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.files = {}
+
+    @property
+    def bytes(self):
+        return sum(self.files.values())
+
+    def __call__(self, progress):
+        name = progress.get("filename") or progress.get("tmpfilename")
+        downloaded = progress.get("downloaded_bytes") or 0
+        self.files[name] = max(self.files.get(name, 0), downloaded)
+
+        if not self.max_bytes:
+            return
+        size = progress.get("total_bytes") or 0
+        if self.bytes > self.max_bytes or size > self.max_bytes:
+            raise DownloadBudgetExceeded(
+                f"The audio exceeds the download limit of "
+                f"{self.max_bytes} bytes."
+            )
+
+
+def plain(info):
+    """
+    Returns the info dict with JSON types only, so it can be pickled.
+    """
+    return json.loads(json.dumps(info, default=str))
+
+
+def _extract_info(url, options):
+    with providers.youtube_dl(options) as ydl:
+        return plain(ydl.extract_info(url, download=False))
+
+
+def _download(url, options, max_bytes):
+    meter = DownloadMeter(max_bytes)
+    options = dict(options, progress_hooks=[meter])
+    try:
+        with providers.youtube_dl(options) as ydl:
+            info = ydl.extract_info(url, download=True)
+    except Exception as e:
+        e.download_bytes = meter.bytes
+        raise
+    return {"info": plain(info), "bytes": meter.bytes}
+
+
+def extract_info(url, options):
+    """
+    Returns the (plain) info dict of `url` without downloading.
+    """
+    return run(_extract_info, (url, options), settings.YTDLP_INFO_TIMEOUT)
+
+
+def download(url, options, max_bytes=0):
+    """
+    Downloads `url` with the given options and at most `max_bytes` bytes.
+    Returns `{"info": ..., "bytes": ...}`; errors carry the bytes
+    transferred until then as `download_bytes`.
+    """
+    return run(_download, (url, options, max_bytes),
+               settings.YTDLP_DOWNLOAD_TIMEOUT)
+
+
+def run(func, args, timeout):
+    """
+    Runs `func(*args)` in a child process and returns its result. Raises
+    `YtDlpTimeout` if no process slot becomes free or the child does not
+    answer within `timeout` seconds.
+    """
+    if not settings.YTDLP_ISOLATION:
+        return func(*args)
+
+    if not slots().acquire(timeout=timeout):
+        raise YtDlpTimeout()
+    try:
+        outcome, value = _run_child(func, args, timeout)
+    finally:
+        slots().release()
+
+    if outcome == "error":
+        raise value
+    return value
+
+
+def slots():
+    global _slots
+
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.YTDLP_MAX_PROCESSES)
+    return _slots
+
+
+def _context():
+    context = multiprocessing.get_context(settings.YTDLP_START_METHOD)
+    if settings.YTDLP_START_METHOD == "forkserver":
+        # Only takes effect before the fork server is started.
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return context
+
+
+def _run_child(func, args, timeout):
+    context = _context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_child,
+                              args=(sender, func, args),
+                              name="ytdlp",
+                              daemon=True
+                              )
+    process.start()
+    sender.close()
+    _processes.add(process)
+
+    try:
+        if not receiver.poll(timeout):
+            raise YtDlpTimeout()
+        return receiver.recv()
+    except EOFError:
+        raise YtDlpFailed(
+            f"The yt-dlp process ended unexpectedly "
+            f"(exit code {process.exitcode})."
+        )
+    finally:
+        _processes.discard(process)
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+
+def _child(sender, func, args):
+    try:
+        result = ("ok", func(*args))
+    except Exception as e:
+        try:
+            pickle.dumps(e)
+            result = ("error", e)
+        except Exception:
+            error = YtDlpFailed(f"{type(e).__name__}: {e}")
+            error.download_bytes = getattr(e, "download_bytes", None)
+            result = ("error", error)
+    sender.send(result)
+    sender.close()
+
+
+def terminate_all():
+    """
+    Kills all running yt-dlp processes of this process.
+    """
+    for process in list(_processes):
+        if process.is_alive():
+            process.kill()
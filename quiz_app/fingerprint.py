@@ -0,0 +1,170 @@
+"""
+Audio fingerprints to recognise the same recording under another video.
+
+Re-uploads and mirror channels publish the same audio under new video
+IDs, so reuse keyed by the video ID misses them. `fingerprint` reduces
+the decoded audio to one 32-bit sub-fingerprint per 100 ms (the scheme of
+Haitsma and Kalker): the spectrum of every 0.5 s frame is split into 33
+logarithmically spaced bands between 300 and 2000 Hz, and every bit tells
+whether the energy difference of two neighbouring bands grew or shrank
+since the previous frame. The bits depend on how the spectrum changes,
+not on the loudness or the codec, so a re-encoded copy yields nearly the
+same bits. A 15-minute video gives 36 KB.
+
+Two fingerprints match if their bit error rate (`bit_error_rate`) is
+low, allowing for a shift of a few seconds (e.g. a trimmed intro).
+Fingerprints are stored with their transcript as `AudioFingerprint`
+rows; `find_transcript` compares a new recording with the stored ones
+of about the same duration.
+"""
+
+import numpy as np
+from django.conf import settings
+
+from quiz_app.models import AudioFingerprint
+from quiz_app.vad import SAMPLE_RATE, load_wav
+
+DECIMATION = 3
+FILTER_TAPS = 31
+FRAME_SECONDS = 0.512
+HOP_SECONDS = 0.1
+CHUNK_FRAMES = 1000
+BAND_EDGES = np.geomspace(300.0, 2000.0, 34)
+BITS = len(BAND_EDGES) - 2
+MIN_OVERLAP = 0.8
+# Set bits of every 16-bit value, to count differing bits by lookup.
+POPCOUNT = np.unpackbits(
+    np.arange(2 ** 16, dtype="<u2").view(np.uint8)
+).reshape(-1, 16).sum(axis=1).astype(np.uint8)
+
+
+def decimate(samples, rate):
+    """
+    Returns the samples low-passed below 2400 Hz and reduced to a third
+    of the rate; the bands end at 2000 Hz, so this only saves work.
+    """
+    cutoff = 2400.0 / rate
+    offsets = np.arange(FILTER_TAPS) - (FILTER_TAPS - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * offsets)
+    taps *= np.hamming(FILTER_TAPS)
+    taps /= taps.sum()
+    filtered = np.convolve(samples, taps.astype(np.float32), mode="same")
+    return filtered[::DECIMATION], rate / DECIMATION
+
+
+def fingerprint(samples, rate=SAMPLE_RATE):
+    """
+    Returns the sub-fingerprints of the samples as a uint32 array, one per
+    `HOP_SECONDS`.
+    """
+    samples, rate = decimate(np.asarray(samples, dtype=np.float32), rate)
+    samples = np.ascontiguousarray(samples)
+    frame_samples = int(rate * FRAME_SECONDS)
+    hop = int(rate * HOP_SECONDS)
+    count = (len(samples) - frame_samples) // hop + 1
+    if count < 2:
+        return np.zeros(0, dtype=np.uint32)
+
+    window = np.hanning(frame_samples).astype(np.float32)
+    frequencies = np.fft.rfftfreq(frame_samples, 1 / rate)
+    bands = np.digitize(frequencies, BAND_EDGES) - 1
+    # One column per band; the power spectrum times this matrix sums the
+    # power of every band.
+    band_matrix = (
+        bands[:, None] == np.arange(BITS + 1)[None, :]
+    ).astype(np.float32)
+
+    energy = np.empty((count, BITS + 1), dtype=np.float32)
+    for start in range(0, count, CHUNK_FRAMES):
+        stop = min(count, start + CHUNK_FRAMES)
+        frames = np.lib.stride_tricks.as_strided(
+            samples[start * hop:],
+            shape=(stop - start, frame_samples),
+            strides=(samples.strides[0] * hop, samples.strides[0]),
+            writeable=False,
+        )
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        energy[start:stop] = power @ band_matrix
+
+    difference = np.diff(energy, axis=1)
+    bits = np.diff(difference, axis=0) > 0
+    weights = np.left_shift(np.uint32(1), np.arange(BITS, dtype=np.uint32))
+    return (bits.astype(np.uint32) * weights).sum(axis=1, dtype=np.uint32)
+
+
+def fingerprint_file(path):
+    """
+    Returns the sub-fingerprints and the duration (seconds) of the WAV
+    file at `path`.
+    """
+    samples = load_wav(path)
+    return fingerprint(samples), len(samples) / SAMPLE_RATE
+
+
+def to_bytes(prints):
+    return prints.astype("<u4").tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype="<u4")
+
+
+def bit_error_rate(first, second, max_shift=0):
+    """
+    Returns the lowest share of differing bits of the two fingerprints
+    over all shifts of up to `max_shift` sub-fingerprints. Shifts that
+    leave less than `MIN_OVERLAP` of the shorter one overlapping are not
+    considered; 1.0 is returned if there is none.
+    """
+    shortest = min(len(first), len(second))
+    if not shortest:
+        return 1.0
+
+    best = 1.0
+    for shift in range(-max_shift, max_shift + 1):
+        a = first[max(0, shift):]
+        b = second[max(0, -shift):]
+        overlap = min(len(a), len(b))
+        if overlap < MIN_OVERLAP * shortest:
+            continue
+        differing = np.bitwise_xor(a[:overlap], b[:overlap])
+        errors = POPCOUNT[differing.view(np.uint16)].sum(dtype=np.int64)
+        best = min(best, errors / (overlap * BITS))
+    return float(best)
+
+
+def find_transcript(prints, duration):
+    """
+    Returns the stored `AudioFingerprint` that matches the fingerprint
+    best and its bit error rate, or `(None, None)` if none is within
+    QUIZ_FINGERPRINT_MAX_BER. Only the latest QUIZ_FINGERPRINT_CANDIDATES
+    recordings within QUIZ_FINGERPRINT_TOLERANCE seconds of `duration`
+    are compared.
+    """
+    tolerance = settings.QUIZ_FINGERPRINT_TOLERANCE
+    candidates = (
+        AudioFingerprint.objects
+        .filter(duration__range=(duration - tolerance,
+                                 duration + tolerance))
+        .defer("data")
+        .order_by("-created_at")[:settings.QUIZ_FINGERPRINT_CANDIDATES]
+    )
+    max_shift = int(tolerance / HOP_SECONDS)
+
+    match, match_rate = None, None
+    for candidate in candidates:
+        rate = bit_error_rate(prints, from_bytes(candidate.fingerprint),
+                              max_shift)
+        if rate <= settings.QUIZ_FINGERPRINT_MAX_BER and (
+            match_rate is None or rate < match_rate
+        ):
+            match, match_rate = candidate, rate
+    return match, match_rate
+
+
+def remember_transcript(prints, duration, text, speech_seconds=None):
+    stored = AudioFingerprint.from_text(
+        duration, to_bytes(prints), text, speech_seconds
+    )
+    stored.save()
+    return stored
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_app.models import Quiz
+from quiz_app.transfer import export_lines
+
+
+class Command(BaseCommand):
+    """
+    Export quizzes as NDJSON (see `quiz_app.transfer`).
+
+    Exports the quizzes of all users, or of one user with `--owner`, to a
+    file or to standard output. Every line contains the owner's username,
+    so the file can be imported again with `import_quizzes`.
+    """
+
+    help = "Export quizzes as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Only export this user.")
+        parser.add_argument(
+            "--output", default="-",
+            help="Target file ('-' for standard output).",
+        )
+
+    def handle(self, *args, owner=None, output="-", **options):
+        quizzes = Quiz.objects.all()
+        if owner is not None:
+            if not User.objects.filter(username=owner).exists():
+                raise CommandError(f"Unknown user {owner!r}.")
+            quizzes = quizzes.filter(owner__username=owner)
+
+        if output == "-":
+            for line in export_lines(quizzes):
+                self.stdout.write(line.decode("utf-8"), ending="")
+            return
+
+        count = 0
+        with open(output, "wb") as target:
+            for line in export_lines(quizzes):
+                target.write(line)
+                count += 1
+        self.stderr.write(f"Exported {count} quizzes to {output}.")
@@ -0,0 +1,46 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_app.transfer import CHUNK_SIZE, QuizImporter
+
+
+class Command(BaseCommand):
+    """
+    Import quizzes from an NDJSON file (see `quiz_app.transfer`).
+
+    The quizzes are loaded in batched transactions of `--batch-size`
+    quizzes. They belong to `--owner` or, without it, to the user named in
+    the `owner` field of every line. Invalid lines are skipped and
+    reported.
+    """
+
+    help = "Import quizzes from an NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Source file ('-' for stdin).")
+        parser.add_argument("--owner", help="Owner of all quizzes.")
+        parser.add_argument("--batch-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, path, owner=None, batch_size=CHUNK_SIZE,
+               **options):
+        user = None
+        if owner is not None:
+            user = User.objects.filter(username=owner).first()
+            if user is None:
+                raise CommandError(f"Unknown user {owner!r}.")
+
+        importer = QuizImporter(owner=user, batch_size=batch_size)
+        if path == "-":
+            importer.run(sys.stdin.buffer)
+        else:
+            with open(path, "rb") as source:
+                importer.run(source)
+
+        for error in importer.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.imported} quizzes, "
+            f"skipped {len(importer.errors)} lines."
+        ))
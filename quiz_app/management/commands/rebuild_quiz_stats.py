@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the `QuizStats` counters from the stored attempts.
+
+    Without arguments the statistics of every quiz with attempts are
+    rebuilt; `--quiz` limits the rebuild to the given quiz IDs.
+    """
+
+    help = "Rebuild the quiz statistics from the stored attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--quiz",
+            type=int,
+            action="append",
+            dest="quiz_ids",
+            help="ID of a quiz to rebuild (can be repeated).",
+        )
+
+    def handle(self, *args, quiz_ids=None, **options):
+        count = rebuild_stats(quiz_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt statistics of {count} quizzes.")
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from quiz_app.api.batch import BatchRunner, release_stale_items
+from quiz_app.api.views import CreateQuizView
+from quiz_app.models import QuizBatch, QuizBatchItem
+
+
+class Command(BaseCommand):
+    """
+    Run the pending items of all quiz batches.
+
+    Items left running by a restarted worker are put back to pending
+    first. Use this command to resume interrupted batches or, with
+    QUIZ_BATCH_BACKGROUND disabled, to run batches in a dedicated worker
+    process instead of the web workers.
+    """
+
+    help = "Generate the quizzes of all pending quiz batch items."
+
+    def handle(self, *args, **options):
+        released = release_stale_items()
+        if released:
+            self.stdout.write(f"Released {released} stale items.")
+
+        batches = QuizBatch.objects.filter(
+            items__status=QuizBatchItem.PENDING
+        ).select_related("owner").distinct().order_by("id")
+
+        build_quiz = CreateQuizView().build_quiz
+        count = 0
+        for batch in batches:
+            BatchRunner(batch, build_quiz).run()
+            count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Ran {count} quiz batches.")
+        )
@@ -0,0 +1,80 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_app.api.utils import SharedWhisperModel
+from quiz_app.scheduler import CpuScheduler
+from quiz_app.transcription import TranscriptionServer, TranscriptionService
+
+
+class Command(BaseCommand):
+    """
+    Run the transcription service for all web workers.
+
+    The Whisper model is loaded once (at start-up with --preload, else on
+    the first request) and the service listens on the Unix socket given
+    by --socket or WHISPER_SERVICE_SOCKET until it is stopped. Set the
+    same WHISPER_SERVICE_SOCKET for the web workers to make them send
+    their audio here instead of loading Whisper themselves.
+
+    The service transcribes one audio at a time with all transcription
+    cores, so QUIZ_TRANSCRIPTION_SLOTS does not apply to it.
+    """
+
+    help = "Serve Whisper transcriptions on a Unix socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=settings.WHISPER_SERVICE_SOCKET,
+            help="Path of the Unix socket.",
+        )
+        parser.add_argument("--model", default="small")
+        parser.add_argument("--device", default="cpu")
+        parser.add_argument(
+            "--queue",
+            type=int,
+            default=settings.WHISPER_SERVICE_QUEUE,
+            help="Requests that may wait at a time.",
+        )
+        parser.add_argument(
+            "--preload",
+            action="store_true",
+            help="Load the model before accepting requests.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["socket"]
+        if not path:
+            raise CommandError(
+                "Set WHISPER_SERVICE_SOCKET or pass --socket."
+            )
+        if os.path.exists(path):
+            os.remove(path)
+
+        whisper_model = SharedWhisperModel(options["model"],
+                                           options["device"])
+        if options["preload"]:
+            whisper_model.get()
+
+        if settings.QUIZ_TRANSCRIPTION_SLOTS > 1:
+            self.stderr.write(
+                "The service transcribes one audio at a time; "
+                "QUIZ_TRANSCRIPTION_SLOTS is ignored."
+            )
+        service = TranscriptionService(whisper_model, options["queue"],
+                                       scheduler=CpuScheduler(slots=1))
+        service.start()
+
+        with TranscriptionServer(path, service) as server:
+            os.chmod(path, 0o660)
+            self.stdout.write(
+                self.style.SUCCESS(f"Transcription service on {path}.")
+            )
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(path)
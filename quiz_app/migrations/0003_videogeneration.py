@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0002_generationslot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done')], default='running', max_length=10)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
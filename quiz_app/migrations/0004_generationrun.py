@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0003_videogeneration'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('coalesced', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField()),
+                ('total_seconds', models.FloatField(blank=True, null=True)),
+                ('stage_seconds', models.JSONField(blank=True, default=dict)),
+                ('audio_seconds', models.FloatField(blank=True, null=True)),
+                ('real_time_factor', models.FloatField(blank=True, null=True)),
+                ('transcript_chars', models.PositiveIntegerField(blank=True, null=True)),
+                ('prompt_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('output_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('db_queries', models.PositiveIntegerField(blank=True, null=True)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0004_generationrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quiz',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='quizzes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['owner', '-created_at'], name='quiz_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['owner', 'updated_at'], name='quiz_owner_updated_idx'),
+        ),
+    ]
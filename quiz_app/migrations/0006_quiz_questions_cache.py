@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:44
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def backfill_questions_cache(apps, schema_editor):
+    Quiz = apps.get_model("quiz_app", "Quiz")
+
+    quizzes = Quiz.objects.prefetch_related("questions").order_by("id")
+    batch = []
+    for quiz in quizzes.iterator(chunk_size=BATCH_SIZE):
+        quiz.questions_cache = [
+            {
+                "id": question.id,
+                "question_title": question.question_title,
+                "question_options": question.question_options,
+                "answer": question.answer,
+            }
+            for question in sorted(quiz.questions.all(), key=lambda q: q.id)
+        ]
+        batch.append(quiz)
+
+        if len(batch) >= BATCH_SIZE:
+            Quiz.objects.bulk_update(batch, ["questions_cache"])
+            batch = []
+
+    if batch:
+        Quiz.objects.bulk_update(batch, ["questions_cache"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0005_quiz_owner_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_cache',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(
+            backfill_questions_cache,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0007_quizattempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='quiz_app.quiz')),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.PositiveBigIntegerField(default=0)),
+                ('score_histogram', models.JSONField(blank=True, default=dict)),
+                ('question_misses', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import OperationalError, migrations, models
+
+BATCH_SIZE = 500
+
+DOCUMENT_TABLE = "quiz_app_quizsearchdocument"
+
+SQLITE_FORWARD = [
+    # External content table: the text is stored once, in the documents.
+    f"""
+    CREATE VIRTUAL TABLE quiz_search_fts USING fts5(
+        title, description, questions,
+        content='{DOCUMENT_TABLE}', content_rowid='quiz_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER quiz_search_fts_insert AFTER INSERT ON {DOCUMENT_TABLE}
+    BEGIN
+        INSERT INTO quiz_search_fts(rowid, title, description, questions)
+        VALUES (new.quiz_id, new.title, new.description, new.questions);
+    END
+    """,
+    f"""
+    CREATE TRIGGER quiz_search_fts_delete AFTER DELETE ON {DOCUMENT_TABLE}
+    BEGIN
+        INSERT INTO quiz_search_fts(
+            quiz_search_fts, rowid, title, description, questions
+        )
+        VALUES ('delete', old.quiz_id, old.title, old.description,
+                old.questions);
+    END
+    """,
+    f"""
+    CREATE TRIGGER quiz_search_fts_update AFTER UPDATE ON {DOCUMENT_TABLE}
+    BEGIN
+        INSERT INTO quiz_search_fts(
+            quiz_search_fts, rowid, title, description, questions
+        )
+        VALUES ('delete', old.quiz_id, old.title, old.description,
+                old.questions);
+        INSERT INTO quiz_search_fts(rowid, title, description, questions)
+        VALUES (new.quiz_id, new.title, new.description, new.questions);
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS quiz_search_fts_update",
+    "DROP TRIGGER IF EXISTS quiz_search_fts_delete",
+    "DROP TRIGGER IF EXISTS quiz_search_fts_insert",
+    "DROP TABLE IF EXISTS quiz_search_fts",
+]
+
+# Same expression as quiz_app.search.POSTGRES_VECTOR.
+POSTGRES_FORWARD = [
+    f"""
+    CREATE INDEX quiz_search_vector_idx ON {DOCUMENT_TABLE} USING gin ((
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(questions, '')), 'C')
+    ))
+    """,
+]
+
+POSTGRES_BACKWARD = ["DROP INDEX IF EXISTS quiz_search_vector_idx"]
+
+
+def run_statements(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            run_statements(schema_editor, SQLITE_FORWARD)
+        except OperationalError:
+            # SQLite built without FTS5: searches fall back to LIKE.
+            pass
+    elif vendor == "postgresql":
+        run_statements(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        run_statements(schema_editor, SQLITE_BACKWARD)
+    elif vendor == "postgresql":
+        run_statements(schema_editor, POSTGRES_BACKWARD)
+
+
+def backfill_search_documents(apps, schema_editor):
+    Quiz = apps.get_model("quiz_app", "Quiz")
+    QuizSearchDocument = apps.get_model("quiz_app", "QuizSearchDocument")
+
+    batch = []
+    for quiz in Quiz.objects.order_by("id").iterator(chunk_size=BATCH_SIZE):
+        batch.append(QuizSearchDocument(
+            quiz_id=quiz.id,
+            owner_id=quiz.owner_id,
+            title=quiz.title,
+            description=quiz.description or "",
+            questions=" ".join(
+                " ".join([question["question_title"],
+                          *question["question_options"]])
+                for question in quiz.questions_cache
+            ),
+        ))
+        if len(batch) >= BATCH_SIZE:
+            QuizSearchDocument.objects.bulk_create(batch)
+            batch = []
+
+    if batch:
+        QuizSearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0008_quizstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSearchDocument',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='quiz_app.quiz')),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True, default='')),
+                ('questions', models.TextField(blank=True, default='')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(
+            backfill_search_documents,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0010_quizbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizTranscript',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='transcript', serialize=False, to='quiz_app.quiz')),
+                ('data', models.BinaryField()),
+                ('length', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('duration', models.FloatField(db_index=True)),
+                ('fingerprint', models.BinaryField()),
+                ('data', models.BinaryField()),
+                ('length', models.PositiveIntegerField()),
+                ('speech_seconds', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,7 +1,12 @@
+import zlib
+
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
+from .validators import OPTIONS_PER_QUESTION, question_errors
+
 
 class QuizQuestions(models.Model):
     """
@@ -19,10 +24,12 @@ class QuizQuestions(models.Model):
         timestamp when the question was last updated (auto-updated).
 
     Methods:
-        clean(): Ensures that `question_options`
-        contains exactly 4 items.
-        save(*args, **kwargs): Calls `full_clean`
-        before saving to enforce validation.
+        clean(): Runs the full question validation (see
+        `quiz_app.validators.question_errors`).
+        save(*args, **kwargs): Only checks the cheap invariants (4 options,
+        answer among them) before saving. Full validation of many
+        questions is done in one pass with
+        `quiz_app.validators.validate_questions`.
         __str__(): Returns the `question_title`
         as the string representation of the object.
     """
@@ -34,13 +41,21 @@ class QuizQuestions(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def clean(self):
-        if len(self.question_options) != 4:
+        errors = question_errors(
+            self.question_title, self.question_options, self.answer
+        )
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        if len(self.question_options) != OPTIONS_PER_QUESTION:
             raise ValidationError(
                 "Each question must have exactly 4 answer options."
                 )
-
-    def save(self, *args, **kwargs):
-        self.full_clean()
+        if self.answer not in self.question_options:
+            raise ValidationError(
+                "The answer must be one of the answer options."
+                )
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -60,14 +75,24 @@ class Quiz(models.Model):
         video_url (str): A video URL associated with the quiz, if applicable.
         questions (ManyToManyField): The set of quiz questions
         related to this quiz.
+        questions_cache (list): A copy of the questions (id, title, options
+        and answer) kept in sync on every write, so a quiz can be read from
+        one row without joins.
+
+    Indexes:
+        (owner, -created_at): Lists a user's quizzes newest first.
+        (owner, updated_at): Finds the latest change of a user's quizzes.
 
     Methods:
         __str__: Returns the string representation of the quiz title.
+        refresh_questions_cache(): Rebuilds `questions_cache` from
+        the related questions and touches `updated_at`.
     """
 
     owner = models.ForeignKey(User,
                               on_delete=models.CASCADE,
-                              related_name="quizzes"
+                              related_name="quizzes",
+                              db_index=False
                               )
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
@@ -75,6 +100,580 @@ class Quiz(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     video_url = models.CharField(max_length=255)
     questions = models.ManyToManyField(QuizQuestions, blank=True)
+    questions_cache = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        # Both indexes start with `owner`, so they also serve plain owner
+        # lookups and replace the implicit foreign key index.
+        indexes = [
+            models.Index(fields=["owner", "-created_at"],
+                         name="quiz_owner_created_idx"),
+            models.Index(fields=["owner", "updated_at"],
+                         name="quiz_owner_updated_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def refresh_questions_cache(self):
+        self.questions_cache = [
+            question_cache_entry(question)
+            for question in self.questions.order_by("id")
+        ]
+        # The new `updated_at` also retires the cached answer index.
+        self.updated_at = timezone.now()
+        Quiz.objects.filter(pk=self.pk).update(
+            questions_cache=self.questions_cache,
+            updated_at=self.updated_at,
+        )
+
+
+def question_cache_entry(question):
+    """
+    Returns the compact representation of a question stored in
+    `Quiz.questions_cache`.
+    """
+    return {
+        "id": question.id,
+        "question_title": question.question_title,
+        "question_options": question.question_options,
+        "answer": question.answer,
+    }
+
+
+class GenerationSlot(models.Model):
+    """
+    Represents a lease on one of the limited quiz generation slots.
+
+    A slot is held for as long as a quiz is being generated and is shared
+    through the database, so the limits apply across all server workers.
+    Slots whose lease has expired (e.g. after a crashed worker) are
+    ignored and removed on the next admission.
+
+    Attributes:
+        owner (User): The user whose generation occupies the slot.
+        acquired_at (datetime): The timestamp when the slot was acquired.
+        expires_at (datetime): The timestamp when the lease runs out.
+
+    Methods:
+        __str__: Returns the owner and the acquisition time.
+    """
+
+    owner = models.ForeignKey(User,
+                              on_delete=models.CASCADE,
+                              related_name="generation_slots"
+                              )
+    acquired_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.owner} @ {self.acquired_at}"
+
+
+class VideoGeneration(models.Model):
+    """
+    Tracks the quiz generation for one YouTube video across all workers.
+
+    The unique `video_id` makes the row act as a lock: only the request
+    that inserts it generates the quiz content, concurrent requests for
+    the same video wait for `result` and build their own quiz from it.
+
+    Attributes:
+        video_id (str): The normalised YouTube video ID.
+        status (str): Either "running" or "done".
+        result (dict): The generated quiz content (title, description
+        and questions) once the generation is done.
+        started_at (datetime): The timestamp when the generation started.
+        updated_at (datetime): The timestamp of the last status change.
+
+    Methods:
+        __str__: Returns the video ID and the status.
+    """
+
+    RUNNING = "running"
+    DONE = "done"
+    STATUS_CHOICES = [
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+    ]
+
+    video_id = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=10,
+                              choices=STATUS_CHOICES,
+                              default=RUNNING
+                              )
+    result = models.JSONField(blank=True, null=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.video_id} ({self.status})"
+
+
+class GenerationRun(models.Model):
+    """
+    Records timings and counters of one createQuiz request.
+
+    Attributes:
+        owner (User): The user who requested the quiz.
+        video_id (str): The normalised YouTube video ID.
+        status_code (int): The HTTP status code of the response.
+        coalesced (bool): Whether the quiz content was taken from a
+        concurrent generation of the same video instead of being
+        generated by this request.
+        started_at (datetime): The timestamp when the request started.
+        total_seconds (float): The wall-clock duration of the request.
+        stage_seconds (dict): The duration of every pipeline stage
+        (e.g. "download", "transcribe", "generate").
+        audio_seconds (float): The duration of the processed audio.
+        real_time_factor (float): Transcription time divided by
+        audio duration.
+        transcript_chars (int): The length of the transcript.
+        prompt_tokens (int): Tokens sent to Gemini.
+        output_tokens (int): Tokens generated by Gemini.
+        db_queries (int): Database queries executed by the request.
+        details (dict): Additional pipeline specific measurements.
+
+    Methods:
+        __str__: Returns the video ID and the total duration.
+    """
+
+    owner = models.ForeignKey(User,
+                              on_delete=models.SET_NULL,
+                              related_name="generation_runs",
+                              null=True,
+                              blank=True
+                              )
+    video_id = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    coalesced = models.BooleanField(default=False)
+    started_at = models.DateTimeField()
+    total_seconds = models.FloatField(null=True, blank=True)
+    stage_seconds = models.JSONField(default=dict, blank=True)
+    audio_seconds = models.FloatField(null=True, blank=True)
+    real_time_factor = models.FloatField(null=True, blank=True)
+    transcript_chars = models.PositiveIntegerField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    output_tokens = models.PositiveIntegerField(null=True, blank=True)
+    db_queries = models.PositiveIntegerField(null=True, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"{self.video_id} ({self.total_seconds}s)"
+
+
+class QuizAttempt(models.Model):
+    """
+    Represents one submitted attempt at a quiz, scored on the server.
+
+    Attributes:
+        quiz (Quiz): The quiz that was taken.
+        user (User): The user who submitted the attempt.
+        score (int): The number of correctly answered questions.
+        total (int): The number of questions of the quiz at submission.
+        submitted_at (datetime): The timestamp of the submission.
+
+    Methods:
+        __str__: Returns the user, the quiz and the score.
+    """
+
+    quiz = models.ForeignKey(Quiz,
+                             on_delete=models.CASCADE,
+                             related_name="attempts"
+                             )
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name="quiz_attempts"
+                             )
+    score = models.PositiveIntegerField()
+    total = models.PositiveIntegerField()
+    submitted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["quiz", "user", "-submitted_at"],
+                         name="attempt_quiz_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.quiz} ({self.score}/{self.total})"
+
+
+class AttemptAnswer(models.Model):
+    """
+    Represents the answer given to one question within an attempt.
+
+    Attributes:
+        attempt (QuizAttempt): The attempt the answer belongs to.
+        question (QuizQuestions): The answered question (kept empty
+        if the question is deleted later).
+        answer (str): The submitted answer option (empty if the question
+        was not answered).
+        is_correct (bool): Whether the answer was correct at submission.
+
+    Methods:
+        __str__: Returns the submitted answer.
+    """
+
+    attempt = models.ForeignKey(QuizAttempt,
+                                on_delete=models.CASCADE,
+                                related_name="answers"
+                                )
+    question = models.ForeignKey(QuizQuestions,
+                                 on_delete=models.SET_NULL,
+                                 related_name="attempt_answers",
+                                 null=True,
+                                 blank=True
+                                 )
+    answer = models.CharField(max_length=255)
+    is_correct = models.BooleanField()
+
+    def __str__(self):
+        return self.answer
+
+
+class QuizStats(models.Model):
+    """
+    Holds aggregated statistics of the attempts at a quiz.
+
+    The counters are updated together with every new attempt (see
+    `quiz_app.stats.record_attempt`), so reading them never has to scan
+    the attempts. They can be rebuilt from the attempts with the
+    `rebuild_quiz_stats` management command.
+
+    Attributes:
+        quiz (Quiz): The quiz the statistics belong to.
+        attempt_count (int): The number of attempts.
+        score_sum (int): The sum of all scores.
+        score_histogram (dict): The number of attempts per score
+        (keys are scores as strings).
+        question_misses (dict): The number of wrong or missing answers per
+        question (keys are question IDs as strings).
+        updated_at (datetime): The timestamp of the last update.
+
+    Methods:
+        add_attempt(score, missed_question_ids): Counts one attempt.
+        average_score: The mean score of all attempts, or None.
+        __str__: Returns the quiz and the number of attempts.
+    """
+
+    quiz = models.OneToOneField(Quiz,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name="stats"
+                                )
+    attempt_count = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveBigIntegerField(default=0)
+    score_histogram = models.JSONField(default=dict, blank=True)
+    question_misses = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def add_attempt(self, score, missed_question_ids):
+        self.attempt_count += 1
+        self.score_sum += score
+        key = str(score)
+        self.score_histogram[key] = self.score_histogram.get(key, 0) + 1
+        for question_id in missed_question_ids:
+            key = str(question_id)
+            self.question_misses[key] = self.question_misses.get(key, 0) + 1
+
+    @property
+    def average_score(self):
+        if not self.attempt_count:
+            return None
+        return self.score_sum / self.attempt_count
+
+    def __str__(self):
+        return f"{self.quiz} ({self.attempt_count} attempts)"
+
+
+class QuizSearchDocument(models.Model):
+    """
+    Holds the searchable text of a quiz for the full-text search.
+
+    The document is rewritten whenever the quiz or its questions change
+    (see `quiz_app.signals`). Depending on the database it is indexed by
+    an SQLite FTS5 table or a PostgreSQL GIN index (see
+    `quiz_app.search`). On SQLite, schema changes to this model rebuild
+    the table and drop the FTS5 triggers of migration 0009, so such a
+    migration has to create them again.
+
+    Attributes:
+        quiz (Quiz): The indexed quiz.
+        owner (User): The owner of the quiz, to search one user's quizzes.
+        title (str): The title of the quiz.
+        description (str): The description of the quiz.
+        questions (str): The question titles and options of the quiz.
+
+    Methods:
+        __str__: Returns the title of the quiz.
+    """
+
+    quiz = models.OneToOneField(Quiz,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name="search_document"
+                                )
+    owner = models.ForeignKey(User,
+                              on_delete=models.CASCADE,
+                              related_name="quiz_search_documents"
+                              )
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default="")
+    questions = models.TextField(blank=True, default="")
 
     def __str__(self):
         return self.title
+
+
+class QuizBatch(models.Model):
+    """
+    Represents a set of quizzes requested together, e.g. all videos of a
+    playlist.
+
+    Attributes:
+        owner (User): The user who requested the quizzes.
+        created_at (datetime): The timestamp when the batch was submitted.
+        updated_at (datetime): The timestamp of the last change.
+
+    Methods:
+        status: "running" while items are pending or running,
+        otherwise "done".
+        __str__: Returns the owner and the submission time.
+    """
+
+    RUNNING = "running"
+    DONE = "done"
+
+    owner = models.ForeignKey(User,
+                              on_delete=models.CASCADE,
+                              related_name="quiz_batches"
+                              )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def status(self):
+        if any(item.status in QuizBatchItem.OPEN_STATUSES
+               for item in self.items.all()):
+            return self.RUNNING
+        return self.DONE
+
+    def __str__(self):
+        return f"{self.owner} @ {self.created_at}"
+
+
+class QuizBatchItem(models.Model):
+    """
+    Represents one video of a `QuizBatch` and the state of its quiz.
+
+    Attributes:
+        batch (QuizBatch): The batch the item belongs to.
+        position (int): The position of the video within the batch.
+        url (str): The submitted video URL.
+        video_id (str): The normalised YouTube video ID (empty if the
+        URL was rejected).
+        status (str): "pending", "running", "done", "failed" or
+        "rejected" (invalid URL or video).
+        error (str): Why the item failed or was rejected.
+        quiz (Quiz): The generated quiz, once done.
+        updated_at (datetime): The timestamp of the last status change.
+
+    Methods:
+        __str__: Returns the URL and the status.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    REJECTED = "rejected"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+        (REJECTED, "Rejected"),
+    ]
+    OPEN_STATUSES = (PENDING, RUNNING)
+
+    batch = models.ForeignKey(QuizBatch,
+                              on_delete=models.CASCADE,
+                              related_name="items"
+                              )
+    position = models.PositiveSmallIntegerField()
+    url = models.CharField(max_length=255)
+    video_id = models.CharField(max_length=64, blank=True, default="")
+    status = models.CharField(max_length=10,
+                              choices=STATUS_CHOICES,
+                              default=PENDING
+                              )
+    error = models.TextField(blank=True, default="")
+    quiz = models.ForeignKey(Quiz,
+                             on_delete=models.SET_NULL,
+                             related_name="batch_items",
+                             null=True,
+                             blank=True
+                             )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["position"]
+        constraints = [
+            models.UniqueConstraint(fields=["batch", "position"],
+                                    name="batch_item_position_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.url} ({self.status})"
+
+
+class QuizTranscript(models.Model):
+    """
+    Keeps the transcript a quiz was generated from, zlib-compressed.
+
+    The transcript allows generating single replacement questions later
+    without downloading and transcribing the video again.
+
+    Attributes:
+        quiz (Quiz): The quiz generated from the transcript.
+        data (bytes): The compressed UTF-8 transcript.
+        length (int): The length of the transcript in characters.
+        created_at (datetime): The timestamp when it was stored.
+
+    Methods:
+        from_text(quiz, text): Returns an unsaved, compressed transcript.
+        text: The decompressed transcript.
+        __str__: Returns the quiz and the transcript length.
+    """
+
+    COMPRESSION_LEVEL = 9
+
+    quiz = models.OneToOneField(Quiz,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name="transcript"
+                                )
+    data = models.BinaryField()
+    length = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def from_text(cls, quiz, text):
+        return cls(
+            quiz=quiz,
+            data=zlib.compress(text.encode("utf-8"), cls.COMPRESSION_LEVEL),
+            length=len(text),
+        )
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.data)).decode("utf-8")
+
+    def __str__(self):
+        return f"{self.quiz} ({self.length} characters)"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Remembers a quiz creation request sent with an `Idempotency-Key`
+    header, so retries of the request return its result instead of
+    generating another quiz.
+
+    Attributes:
+        owner (User): The user who sent the request.
+        key (str): The value of the `Idempotency-Key` header.
+        fingerprint (str): SHA-256 of the request path and body; a retry
+        must send the same request.
+        status (str): Either "running" or "done".
+        quiz (Quiz): The created quiz, once done.
+        created_at (datetime): The timestamp of the first request.
+        updated_at (datetime): The timestamp of the last status change.
+
+    Methods:
+        __str__: Returns the key and the status.
+    """
+
+    RUNNING = "running"
+    DONE = "done"
+    STATUS_CHOICES = [
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+    ]
+
+    owner = models.ForeignKey(User,
+                              on_delete=models.CASCADE,
+                              related_name="idempotency_keys"
+                              )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10,
+                              choices=STATUS_CHOICES,
+                              default=RUNNING
+                              )
+    quiz = models.ForeignKey(Quiz,
+                             on_delete=models.SET_NULL,
+                             related_name="+",
+                             null=True,
+                             blank=True
+                             )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "key"],
+                                    name="idempotency_key_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+
+class AudioFingerprint(models.Model):
+    """
+    Keeps the fingerprint of a transcribed recording with its transcript,
+    so the transcript can be reused for the same audio under another
+    video (see `quiz_app.fingerprint`).
+
+    Attributes:
+        duration (float): Duration of the recording in seconds; candidates
+        for a match are looked up by it.
+        fingerprint (bytes): The sub-fingerprints (little-endian uint32).
+        data (bytes): The zlib-compressed UTF-8 transcript.
+        length (int): The length of the transcript in characters.
+        speech_seconds (float): Duration of the transcribed speech, if
+        the voice activity detection ran.
+        created_at (datetime): The timestamp when it was stored.
+
+    Methods:
+        from_text(duration, fingerprint, text, speech_seconds): Returns
+        an unsaved fingerprint with the compressed transcript.
+        text: The decompressed transcript.
+        __str__: Returns the duration and the transcript length.
+    """
+
+    duration = models.FloatField(db_index=True)
+    fingerprint = models.BinaryField()
+    data = models.BinaryField()
+    length = models.PositiveIntegerField()
+    speech_seconds = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def from_text(cls, duration, fingerprint, text, speech_seconds=None):
+        return cls(
+            duration=duration,
+            fingerprint=fingerprint,
+            data=zlib.compress(text.encode("utf-8"),
+                               QuizTranscript.COMPRESSION_LEVEL),
+            length=len(text),
+            speech_seconds=speech_seconds,
+        )
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.data)).decode("utf-8")
+
+    def __str__(self):
+        return f"{self.duration:.0f} s ({self.length} characters)"
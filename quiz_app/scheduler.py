@@ -0,0 +1,219 @@
+"""
+CPU scheduling of the transcriptions.
+
+Whisper (torch) starts one thread per core by default, so a running
+transcription slows down every other request of the machine. The
+`CpuScheduler` limits the transcriptions:
+
+- At most QUIZ_TRANSCRIPTION_SLOTS transcriptions run at the same time
+  on the machine, each with an equal share of the transcription cores as
+  torch threads, so together they never use more threads than there are
+  cores for them. Further transcriptions wait for a free slot (at most
+  QUIZ_TRANSCRIPTION_WAIT seconds). The slots are lock files
+  (QUIZ_TRANSCRIPTION_LOCK_DIR), so they are shared by all processes of
+  the machine. Every process transcribes one audio at a time (see
+  `TranscriptionService`), so more than one slot only lets several web
+  workers transcribe at once.
+- Only if QUIZ_TRANSCRIPTION_CORES is set, its last cores are reserved
+  for the transcriptions and gunicorn pins every worker to the remaining
+  ones after the fork (see gunicorn.conf.py). Otherwise transcriptions
+  may use every core and the workers are not pinned, so requests keep
+  all cores while nothing is transcribed.
+
+The split is always made over the cores of the machine, even in a process
+that is already pinned to the request cores: before pinning, the cores
+are recorded in the QUIZLY_CPU_CORES environment variable, which
+`available_cores` prefers and child processes inherit.
+
+Transcriptions run on a dedicated thread (see `TranscriptionService`),
+which is pinned to the transcription cores and whose nice value is raised to
+QUIZ_TRANSCRIPTION_NICE, so the kernel prefers request threads whenever
+they compete for a core. Torch creates its worker threads from that
+thread, so they inherit the pinning and the nice value.
+
+Pinning and nice values are Linux features; elsewhere only the slots
+apply.
+"""
+
+import errno
+import fcntl
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from core.metrics import registry
+
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS")
+CORES_VARIABLE = "QUIZLY_CPU_CORES"
+
+
+class CpuSlotTimeout(Exception):
+    """
+    Raised when no transcription slot became free in time.
+    """
+
+
+def process_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cores():
+    """
+    Returns the cores recorded by `remember_cores`, or those the process
+    may run on if none were recorded.
+    """
+    recorded = os.environ.get(CORES_VARIABLE)
+    if recorded:
+        return sorted(int(core) for core in recorded.split(","))
+    return process_cores()
+
+
+def remember_cores():
+    """
+    Records the cores the process may run on in QUIZLY_CPU_CORES, unless
+    they were recorded before, so that schedulers built after pinning the
+    process still split all of them.
+    """
+    os.environ.setdefault(CORES_VARIABLE,
+                          ",".join(str(core) for core in process_cores()))
+
+
+def set_torch_threads(threads):
+    """
+    Sets the torch threads of the process; before torch is imported, the
+    environment variables it reads on import are set instead.
+    """
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    else:
+        for variable in THREAD_VARIABLES:
+            os.environ[variable] = str(threads)
+
+
+class CpuScheduler:
+    """
+    Assigns the cores of the machine to transcriptions and requests.
+
+    Attributes:
+        - cores (list): Cores the transcriptions run on.
+        - request_cores (list): Cores left for the requests (all cores if
+          none or every core is reserved).
+        - reserved (bool): Whether `cores` are reserved for the
+          transcriptions (QUIZ_TRANSCRIPTION_CORES is set).
+        - slots (int): Transcriptions running at the same time.
+        - nice (int): Nice value of the transcription threads.
+        - wait (float): Seconds a transcription waits for a slot.
+        - lock_dir (str): Directory of the slot lock files.
+        - poll_interval (float): Seconds between two attempts to get a
+          slot.
+
+    Methods:
+        - threads: Torch threads per transcription.
+        - transcription_slot(): Context manager holding a slot.
+        - prepare_thread(): Pins the calling thread to the reserved cores
+          and raises its nice value.
+        - pin_requests(): Pins the calling process to the request cores
+          if cores are reserved.
+    """
+
+    poll_interval = 0.2
+
+    def __init__(self, cores=None, slots=None, nice=None, wait=None,
+                 lock_dir=None, available=None):
+        available = available or available_cores()
+        reserved = (
+            settings.QUIZ_TRANSCRIPTION_CORES
+            if cores is None else cores
+        )
+        slots = (
+            settings.QUIZ_TRANSCRIPTION_SLOTS
+            if slots is None else slots
+        )
+
+        self.reserved = reserved > 0
+        if self.reserved:
+            reserved = min(reserved, len(available))
+            self.cores = available[-reserved:]
+            self.request_cores = available[:-reserved] or available
+        else:
+            self.cores = self.request_cores = available
+        self.slots = min(max(1, slots), len(self.cores))
+        self.nice = (
+            settings.QUIZ_TRANSCRIPTION_NICE
+            if nice is None else nice
+        )
+        self.wait = (
+            settings.QUIZ_TRANSCRIPTION_WAIT
+            if wait is None else wait
+        )
+        self.lock_dir = lock_dir or settings.QUIZ_TRANSCRIPTION_LOCK_DIR
+
+    @property
+    def threads(self):
+        return max(1, len(self.cores) // self.slots)
+
+    @contextmanager
+    def transcription_slot(self):
+        started = time.monotonic()
+        index, descriptor = self.acquire()
+        registry.observe("quizly_transcription_slot_wait_seconds",
+                         time.monotonic() - started)
+
+        set_torch_threads(self.threads)
+        try:
+            yield index
+        finally:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+
+    def acquire(self):
+        os.makedirs(self.lock_dir, exist_ok=True)
+        deadline = time.monotonic() + self.wait
+
+        while True:
+            for index in range(self.slots):
+                descriptor = os.open(
+                    os.path.join(self.lock_dir, f"slot-{index}.lock"),
+                    os.O_RDWR | os.O_CREAT,
+                    0o600,
+                )
+                try:
+                    fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return index, descriptor
+                except OSError as e:
+                    os.close(descriptor)
+                    if e.errno not in (errno.EAGAIN, errno.EACCES):
+                        raise
+
+            if time.monotonic() + self.poll_interval > deadline:
+                raise CpuSlotTimeout(
+                    "No transcription slot became free in time."
+                )
+            time.sleep(self.poll_interval)
+
+    def prepare_thread(self):
+        # On Linux both calls change only the calling thread (pid 0 and
+        # the thread ID); threads it starts later inherit the settings.
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.cores)
+
+        if not self.nice or not hasattr(threading, "get_native_id"):
+            return
+        thread = threading.get_native_id()
+        try:
+            if os.getpriority(os.PRIO_PROCESS, thread) < self.nice:
+                os.setpriority(os.PRIO_PROCESS, thread, self.nice)
+        except OSError:
+            pass
+
+    def pin_requests(self):
+        if self.reserved and hasattr(os, "sched_setaffinity"):
+            remember_cores()
+            os.sched_setaffinity(0, self.request_cores)
@@ -0,0 +1,80 @@
+"""
+Server-side scoring of quiz attempts.
+
+The correct answers of a quiz are kept as an answer index
+(`{question_id: answer}`) together with the quiz owner. The index is
+built from `Quiz.questions_cache` and stored in Django's cache under a
+key containing the `updated_at` of the quiz, which changes whenever its
+questions do (see `Quiz.refresh_questions_cache`). Scoring a submission
+therefore usually reads only the owner and `updated_at` of the quiz, and
+an index cached before a change is never used again, even by workers
+whose local memory cache was not told about the change.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.metrics import registry
+
+from .models import Quiz
+
+
+def answer_index_key(quiz_id, version):
+    return f"quiz_app:answer_index:{quiz_id}:{version.timestamp()}"
+
+
+def get_answer_index(quiz_id):
+    """
+    Returns `{"owner_id": ..., "answers": {question_id: answer}}` for the
+    quiz, or None if the quiz does not exist.
+    """
+    quiz = Quiz.objects.filter(id=quiz_id).values_list(
+        "owner_id", "updated_at"
+    ).first()
+    if quiz is None:
+        return None
+
+    owner_id, version = quiz
+    key = answer_index_key(quiz_id, version)
+    index = cache.get(key)
+    if index is not None:
+        registry.inc("quizly_cache_requests_total",
+                     cache="answer_index", result="hit")
+        return index
+
+    registry.inc("quizly_cache_requests_total",
+                 cache="answer_index", result="miss")
+    questions = Quiz.objects.filter(id=quiz_id).values_list(
+        "questions_cache", flat=True
+    ).first() or []
+    index = {
+        "owner_id": owner_id,
+        "answers": {
+            question["id"]: question["answer"] for question in questions
+        },
+    }
+    cache.set(key, index, settings.QUIZ_ANSWER_INDEX_TTL)
+    return index
+
+
+def score_answers(answer_index, answers):
+    """
+    Scores `answers` (a list of `(question_id, answer)` pairs) against
+    the answer index and returns the score and a list of
+    `(question_id, answer, is_correct)` triples. Questions of the quiz
+    without an answer are added as wrong with an empty answer, so they
+    are stored and counted as misses like wrong answers.
+    """
+    correct_answers = answer_index["answers"]
+    results = [
+        (question_id, answer, correct_answers.get(question_id) == answer)
+        for question_id, answer in answers
+    ]
+    answered = {question_id for question_id, _ in answers}
+    results += [
+        (question_id, "", False)
+        for question_id in correct_answers
+        if question_id not in answered
+    ]
+    score = sum(1 for _, _, is_correct in results if is_correct)
+    return score, results
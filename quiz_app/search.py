@@ -0,0 +1,144 @@
+"""
+Full-text search over the quizzes of a user.
+
+Every quiz has a `QuizSearchDocument` with its title, description and
+questions, rewritten by `index_quiz` whenever the quiz or its questions
+change. The documents are indexed depending on the database:
+
+- SQLite: the FTS5 table `quiz_search_fts` (kept in sync with the
+  documents by triggers), ranked with bm25.
+- PostgreSQL: a GIN index on the weighted `tsvector` of the documents,
+  ranked with ts_rank.
+- Otherwise (or if SQLite was built without FTS5), a case-insensitive
+  substring match ordered by creation date.
+
+Title matches rank above description matches, which rank above question
+matches.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import QuizSearchDocument
+
+FTS_TABLE = "quiz_search_fts"
+
+# Must match the expression of the GIN index created in migration 0009,
+# otherwise PostgreSQL cannot use the index.
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(questions, '')), 'C')"
+)
+
+_fts_available = {}
+
+
+def index_quiz(quiz):
+    """
+    Creates or rewrites the search document of the quiz from the quiz
+    row and its `questions_cache`.
+    """
+    document = search_document(quiz)
+    QuizSearchDocument.objects.update_or_create(
+        quiz_id=quiz.id,
+        defaults={
+            "owner_id": document.owner_id,
+            "title": document.title,
+            "description": document.description,
+            "questions": document.questions,
+        },
+    )
+
+
+def search_document(quiz):
+    """
+    Returns the (unsaved) search document of the quiz, e.g. to create
+    many documents with `bulk_create`.
+    """
+    return QuizSearchDocument(
+        quiz_id=quiz.id,
+        owner_id=quiz.owner_id,
+        title=quiz.title,
+        description=quiz.description or "",
+        questions=" ".join(
+            " ".join([question["question_title"],
+                      *question["question_options"]])
+            for question in quiz.questions_cache
+        ),
+    )
+
+
+def search_quiz_ids(owner, query):
+    """
+    Returns the IDs of the owner's quizzes matching `query`, best match
+    first.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return []
+
+    if connection.vendor == "sqlite" and fts_available():
+        return _search_sqlite(owner, terms)
+    if connection.vendor == "postgresql":
+        return _search_postgresql(owner, query)
+    return _search_fallback(owner, terms)
+
+
+def fts_available():
+    alias = connection.alias
+    if alias not in _fts_available:
+        with connection.cursor() as cursor:
+            _fts_available[alias] = (
+                FTS_TABLE in connection.introspection.table_names(cursor)
+            )
+    return _fts_available[alias]
+
+
+def _search_sqlite(owner, terms):
+    # Every term is quoted (no FTS5 syntax from user input) and matched
+    # as a prefix; all terms must match.
+    match = " ".join(
+        '"{}"*'.format(term.replace('"', '""')) for term in terms
+    )
+    document_table = QuizSearchDocument._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT fts.rowid FROM {FTS_TABLE} AS fts "
+            f"JOIN {document_table} AS document "
+            "ON document.quiz_id = fts.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND document.owner_id = %s "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0), fts.rowid DESC",
+            [match, owner.id],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_postgresql(owner, query):
+    document_table = QuizSearchDocument._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT quiz_id FROM {document_table} "
+            f"WHERE owner_id = %s AND ({POSTGRES_VECTOR}) "
+            "@@ websearch_to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(({POSTGRES_VECTOR}), "
+            "websearch_to_tsquery('simple', %s)) DESC, quiz_id DESC",
+            [owner.id, query, query],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(owner, terms):
+    documents = QuizSearchDocument.objects.filter(owner=owner)
+    for term in terms:
+        documents = documents.filter(
+            Q(title__icontains=term)
+            | Q(description__icontains=term)
+            | Q(questions__icontains=term)
+        )
+    return list(
+        documents.order_by("-quiz__created_at", "-quiz_id")
+        .values_list("quiz_id", flat=True)
+    )
@@ -0,0 +1,74 @@
+"""
+Signal handlers keeping `Quiz.questions_cache` (and with it the cached
+answer index of `quiz_app.scoring`) and the search document of
+`quiz_app.search` in sync with the quiz and its related `QuizQuestions`.
+
+- Adding, removing or clearing questions of a quiz refreshes the quiz.
+- Saving a question refreshes every quiz containing it.
+- Deleting a question refreshes the quizzes it belonged to (the through
+  rows are removed without an m2m_changed signal).
+- Saving a quiz rewrites its search document.
+"""
+
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .models import Quiz, QuizQuestions
+from .search import index_quiz
+
+
+def refresh_quiz(quiz):
+    quiz.refresh_questions_cache()
+    index_quiz(quiz)
+
+
+def refresh_quizzes(quiz_ids):
+    for quiz in Quiz.objects.filter(id__in=quiz_ids):
+        refresh_quiz(quiz)
+
+
+@receiver(m2m_changed, sender=Quiz.questions.through)
+def questions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        refresh_quiz(instance)
+    elif action == "post_clear":
+        refresh_quizzes(instance._quiz_ids_before_clear)
+    else:
+        refresh_quizzes(pk_set)
+
+
+@receiver(m2m_changed, sender=Quiz.questions.through)
+def remember_quizzes_before_clear(sender, instance, action, reverse,
+                                  **kwargs):
+    if reverse and action == "pre_clear":
+        instance._quiz_ids_before_clear = list(
+            instance.quiz_set.values_list("id", flat=True)
+        )
+
+
+@receiver(post_save, sender=QuizQuestions)
+def question_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    refresh_quizzes(instance.quiz_set.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=QuizQuestions)
+def remember_quizzes_before_delete(sender, instance, **kwargs):
+    instance._quiz_ids_before_delete = list(
+        instance.quiz_set.values_list("id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=QuizQuestions)
+def question_deleted(sender, instance, **kwargs):
+    refresh_quizzes(getattr(instance, "_quiz_ids_before_delete", []))
+
+
+@receiver(post_save, sender=Quiz)
+def quiz_saved(sender, instance, **kwargs):
+    index_quiz(instance)
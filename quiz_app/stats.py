@@ -0,0 +1,84 @@
+"""
+Incrementally maintained statistics of quiz attempts.
+
+`record_attempt` updates the `QuizStats` row of a quiz while the attempt
+is written, locking the row so concurrent attempts do not lose counts.
+`rebuild_stats` recomputes the rows from the stored attempts, e.g. after
+a bug or a manual data fix.
+"""
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import AttemptAnswer, Quiz, QuizAttempt, QuizStats
+
+
+def record_attempt(quiz_id, score, results):
+    """
+    Adds one attempt to the statistics of the quiz. `results` are the
+    `(question_id, answer, is_correct)` triples of
+    `quiz_app.scoring.score_answers`. Must run inside the transaction
+    writing the attempt.
+    """
+    locked = QuizStats.objects.select_for_update()
+    stats = locked.filter(quiz_id=quiz_id).first()
+    if stats is None:
+        QuizStats.objects.get_or_create(quiz_id=quiz_id)
+        stats = locked.get(quiz_id=quiz_id)
+    stats.add_attempt(score, [
+        question_id
+        for question_id, _, is_correct in results
+        if not is_correct
+    ])
+    stats.save()
+    return stats
+
+
+def rebuild_stats(quiz_ids=None):
+    """
+    Recomputes the statistics of the given quizzes (all quizzes with
+    attempts if None) from the stored attempts. The existing rows are
+    locked first, so attempts submitted meanwhile wait for the rebuild.
+    A rebuild of all quizzes also removes the rows of quizzes without
+    attempts. Returns the number of rebuilt quizzes.
+    """
+    with transaction.atomic():
+        if quiz_ids is None:
+            quiz_ids = QuizAttempt.objects.values_list(
+                "quiz_id", flat=True
+            ).distinct()
+            replaced = QuizStats.objects.all()
+        else:
+            quiz_ids = Quiz.objects.filter(id__in=quiz_ids).values_list(
+                "id", flat=True
+            )
+            replaced = QuizStats.objects.filter(quiz_id__in=quiz_ids)
+        rebuilt = {
+            quiz_id: QuizStats(quiz_id=quiz_id) for quiz_id in quiz_ids
+        }
+        # Lock the existing rows until the rebuilt ones replace them.
+        list(replaced.select_for_update().values_list("quiz_id", flat=True))
+
+        attempts = QuizAttempt.objects.filter(quiz_id__in=rebuilt)
+        for row in attempts.values("quiz_id", "score").annotate(
+            count=Count("id"), total=Sum("score")
+        ):
+            stats = rebuilt[row["quiz_id"]]
+            stats.attempt_count += row["count"]
+            stats.score_sum += row["total"]
+            stats.score_histogram[str(row["score"])] = row["count"]
+
+        misses = AttemptAnswer.objects.filter(
+            attempt__quiz_id__in=rebuilt,
+            is_correct=False,
+            question__isnull=False,
+        )
+        for row in misses.values("attempt__quiz_id", "question_id").annotate(
+            count=Count("id")
+        ):
+            stats = rebuilt[row["attempt__quiz_id"]]
+            stats.question_misses[str(row["question_id"])] = row["count"]
+
+        replaced.delete()
+        QuizStats.objects.bulk_create(rebuilt.values(), batch_size=500)
+    return len(rebuilt)
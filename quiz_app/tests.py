@@ -1,16 +1,66 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import wave
+from io import StringIO
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from unittest.mock import MagicMock, patch
 
+import numpy as np
+
 from django.contrib.auth.models import User
-from django.db import DatabaseError
+from django.core.cache import cache
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Max
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIRequestFactory
 from rest_framework.test import APITestCase
 
-from quiz_app.models import Quiz, QuizQuestions
+from quiz_app.models import (AttemptAnswer, AudioFingerprint, GenerationRun,
+                             GenerationSlot, IdempotencyKey, Quiz,
+                             QuizAttempt, QuizBatch, QuizBatchItem,
+                             QuizQuestions, QuizStats, QuizTranscript,
+                             VideoGeneration)
+from quiz_app.api.admission import AdmissionController, AdmissionRejected
+from quiz_app.api.batch import BatchRunner
+from quiz_app.api.idempotency import (IdempotencyInProgress,
+                                      IdempotentRequests,
+                                      request_fingerprint)
+from quiz_app.api.instrumentation import PipelineTimer
+from quiz_app.api.prompting import TranscriptPacker, count_tokens, split_chunks
+from quiz_app.api.singleflight import (SingleFlight, SingleFlightTimeout,
+                                       keep_alive)
+from quiz_app.api.utils import AudioQuestionGenerator, SharedWhisperModel
+from quiz_app.transcription import (TranscriptionClient, TranscriptionError,
+                                    TranscriptionServer, TranscriptionService,
+                                    transcribe_file)
+from quiz_app.transfer import export_lines
+from quiz_app.validators import validate_questions
+from quiz_app import fingerprint, vad
+from quiz_app.stats import rebuild_stats
+from quiz_app.scheduler import CORES_VARIABLE, CpuScheduler, CpuSlotTimeout
 from quiz_app.api.permissions import IsOwner
+from quiz_app.api.serializers import YoutubeURLSerializer
+from quiz_app.api import ytdlp
+from quiz_app.api.ytdlp import (DownloadBudgetExceeded, DownloadMeter,
+                                YtDlpFailed, YtDlpTimeout)
 
 
+# yt-dlp is patched in the tests; only forked children see the patches.
+@override_settings(YTDLP_START_METHOD="fork")
 class CreateQuizViewTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -88,6 +138,19 @@ class CreateQuizViewTest(APITestCase):
             len(response.data["questions"]),
             1)
 
+    @patch("quiz_app.api.ytdlp.extract_info",
+           side_effect=YtDlpTimeout())
+    def test_create_quiz_returns_504_when_youtube_hangs(self, _):
+        response = self.client.post(
+            self.url,
+            self.valid_payload,
+            format="json"
+            )
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_504_GATEWAY_TIMEOUT
+            )
+
     def test_create_quiz_invalid_url(self):
         response = self.client.post(
             self.url,
@@ -410,3 +473,2218 @@ class QuizSingleViewPermissionAndErrorTests(APITestCase):
             status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         self.assertIn("DB Error", str(response.data))
+
+
+@override_settings(YTDLP_START_METHOD="fork")
+class AdmissionControlTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="busy",
+            password="pass1"
+            )
+        self.other = User.objects.create_user(
+            username="idle",
+            password="pass2"
+            )
+        self.controller = AdmissionController(
+            global_limit=2, user_limit=1, wait=0, retry_after=15
+        )
+
+    def test_user_limit_rejects_second_generation(self):
+        self.controller.acquire(self.user)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            self.controller.acquire(self.user)
+        self.assertEqual(ctx.exception.retry_after, 15)
+        self.assertEqual(GenerationSlot.objects.count(), 1)
+
+    def test_global_limit_rejects_other_users(self):
+        self.controller.acquire(self.user)
+        self.controller.acquire(self.other)
+        third = User.objects.create_user(username="third", password="p")
+        with self.assertRaises(AdmissionRejected):
+            self.controller.acquire(third)
+
+    def test_release_frees_slot(self):
+        with self.controller.admit(self.user):
+            self.assertEqual(
+                self.controller.usage(self.user)["user"]["used"], 1
+                )
+        self.assertEqual(GenerationSlot.objects.count(), 0)
+        self.controller.acquire(self.user)
+
+    def test_expired_slot_is_ignored(self):
+        GenerationSlot.objects.create(
+            owner=self.user,
+            expires_at=timezone.now() - timedelta(seconds=1)
+            )
+        self.controller.acquire(self.user)
+        self.assertEqual(GenerationSlot.objects.count(), 1)
+
+    @patch("yt_dlp.YoutubeDL")
+    def test_create_quiz_returns_429_with_retry_after(self, mock_yt_dlp):
+        extract_info_mock = (
+            mock_yt_dlp.return_value.__enter__.return_value.extract_info
+        )
+        extract_info_mock.return_value = {"duration": 60}
+        GenerationSlot.objects.create(
+            owner=self.user,
+            expires_at=timezone.now() + timedelta(minutes=5)
+            )
+        self.client.force_authenticate(user=self.user)
+
+        with self.settings(QUIZ_MAX_CONCURRENT_GENERATIONS_PER_USER=1,
+                           QUIZ_ADMISSION_WAIT=0,
+                           QUIZ_ADMISSION_RETRY_AFTER=42):
+            response = self.client.post(
+                reverse("create-quiz"),
+                {"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"},
+                format="json"
+                )
+
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        self.assertEqual(response["Retry-After"], "42")
+        self.assertEqual(GenerationSlot.objects.count(), 1)
+
+    def test_slots_endpoint_reports_usage(self):
+        GenerationSlot.objects.create(
+            owner=self.other,
+            expires_at=timezone.now() + timedelta(minutes=5)
+            )
+        self.client.force_authenticate(user=self.user)
+        with self.settings(QUIZ_MAX_CONCURRENT_GENERATIONS=3):
+            response = self.client.get(reverse("create-quiz-slots"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["global"], {"used": 1, "limit": 3})
+        self.assertEqual(response.data["user"]["used"], 0)
+
+
+@override_settings(YTDLP_START_METHOD="fork")
+class SingleFlightTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="follower",
+            password="pass1"
+            )
+        self.content = {
+            "title": "Shared Quiz",
+            "description": "Generated once.",
+            "questions": [
+                {
+                    "question_title": "What is 2+2?",
+                    "question_options": ["1", "2", "3", "4"],
+                    "answer": "4"
+                }
+            ]
+        }
+
+    def test_leader_stores_result_for_followers(self):
+        work = MagicMock(return_value=self.content)
+        flight = SingleFlight(timeout=5, result_ttl=60)
+
+        self.assertEqual(flight.run("abc", work), self.content)
+        self.assertEqual(flight.run("abc", work), self.content)
+        work.assert_called_once()
+
+        stored = VideoGeneration.objects.get(video_id="abc")
+        self.assertEqual(stored.status, VideoGeneration.DONE)
+
+    def test_failed_leader_releases_video(self):
+        flight = SingleFlight(timeout=5, result_ttl=60)
+
+        with self.assertRaises(RuntimeError):
+            flight.run("abc", MagicMock(side_effect=RuntimeError("boom")))
+        self.assertFalse(VideoGeneration.objects.exists())
+
+    def test_leader_survives_removed_row(self):
+        flight = SingleFlight(timeout=5, result_ttl=60)
+
+        def work():
+            # Another worker takes the row for abandoned meanwhile.
+            VideoGeneration.objects.filter(video_id="abc").delete()
+            return self.content
+
+        self.assertEqual(flight.run("abc", work), self.content)
+        self.assertFalse(VideoGeneration.objects.exists())
+
+    def test_follower_gives_up_after_wait(self):
+        VideoGeneration.objects.create(video_id="abc")
+        flight = SingleFlight(timeout=60, result_ttl=60, wait=0.3,
+                              retry_after=7)
+        flight.poll_interval = 0.1
+        work = MagicMock()
+
+        with self.assertRaises(SingleFlightTimeout) as raised:
+            flight.run("abc", work)
+        work.assert_not_called()
+        self.assertEqual(raised.exception.retry_after, 7)
+
+    def test_keep_alive_refreshes_rows_while_running(self):
+        queryset = MagicMock()
+
+        with keep_alive(queryset, 0.05):
+            time.sleep(0.3)
+        calls = queryset.update.call_count
+        time.sleep(0.1)
+
+        self.assertGreaterEqual(calls, 2)
+        self.assertEqual(queryset.update.call_count, calls)
+
+    @patch("quiz_app.api.views.AudioQuestionGenerator.download_audio")
+    @patch("yt_dlp.YoutubeDL")
+    def test_follower_receives_own_quiz_copy(self, mock_yt_dlp,
+                                             mock_download):
+        extract_info_mock = (
+            mock_yt_dlp.return_value.__enter__.return_value.extract_info
+        )
+        extract_info_mock.return_value = {"duration": 60}
+        VideoGeneration.objects.create(
+            video_id="dQw4w9WgXcQ",
+            status=VideoGeneration.DONE,
+            result=self.content
+            )
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(
+            reverse("create-quiz"),
+            {"url": "https://youtu.be/dQw4w9WgXcQ"},
+            format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["title"], "Shared Quiz")
+        mock_download.assert_not_called()
+        quiz = Quiz.objects.get(id=response.data["id"])
+        self.assertEqual(quiz.owner, self.user)
+        self.assertEqual(quiz.questions.count(), 1)
+
+
+@override_settings(YTDLP_START_METHOD="fork")
+class PipelineInstrumentationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="timed",
+            password="pass1"
+            )
+
+    def test_timer_records_stages_and_server_timing(self):
+        timer = PipelineTimer(owner=self.user, video_id="abc")
+        generate = MagicMock(
+            audio_duration=120,
+            transcript_chars=500,
+            prompt_tokens=800,
+            output_tokens=300,
+            )
+
+        with timer.count_queries():
+            with timer.stage("transcribe"):
+                User.objects.count()
+        timer.stage_seconds["transcribe"] = 30.0
+        timer.collect(generate)
+        run = timer.finish(201)
+
+        self.assertEqual(run.db_queries, 1)
+        self.assertFalse(run.coalesced)
+        self.assertEqual(run.real_time_factor, 0.25)
+        self.assertEqual(run.prompt_tokens, 800)
+        self.assertIn("transcribe;dur=30000.0", timer.server_timing())
+        self.assertIn("total;dur=", timer.server_timing())
+
+    def test_timer_records_process_cpu_share_per_stage(self):
+        timer = PipelineTimer(owner=self.user, video_id="abc")
+
+        with timer.stage("busy"):
+            deadline = time.process_time() + 0.2
+            while time.process_time() < deadline:
+                pass
+        with timer.stage("idle"):
+            time.sleep(0.2)
+        run = timer.finish(201)
+
+        self.assertGreater(run.details["process_cpu_share"]["busy"], 0.5)
+        self.assertLess(run.details["process_cpu_share"]["idle"], 0.5)
+        self.assertGreaterEqual(
+            run.details["process_cpu_seconds"]["busy"], 0.2
+        )
+
+    @patch("yt_dlp.YoutubeDL")
+    @patch("whisper.load_model")
+    @patch(
+        "quiz_app.api.views.AudioQuestionGenerator.generate_questions_gemini"
+        )
+    def test_create_quiz_records_run(self, mock_generate_gemini,
+                                     mock_whisper_model, mock_yt_dlp):
+        extract_info_mock = (
+            mock_yt_dlp.return_value.__enter__.return_value.extract_info
+        )
+        extract_info_mock.return_value = {"duration": 60}
+        mock_whisper_model.return_value.transcribe.return_value = {
+            "text": "This is a test transcript."
+            }
+        self.client.force_authenticate(user=self.user)
+
+        with patch("builtins.open", new_callable=MagicMock) as mock_open:
+            mock_read = mock_open.return_value.__enter__.return_value.read
+            mock_read.return_value = (
+                '{"title": "Timed Quiz", "questions": [{'
+                '"question_title": "Q?", "question_options": '
+                '["a", "b", "c", "d"], "answer": "a"}]}'
+            )
+            response = self.client.post(
+                reverse("create-quiz"),
+                {"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"},
+                format="json"
+                )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        for stage in ("download", "transcribe", "generate", "save"):
+            self.assertIn(f"{stage};dur=", response["Server-Timing"])
+
+        run = GenerationRun.objects.get()
+        self.assertEqual(run.owner, self.user)
+        self.assertEqual(run.video_id, "dQw4w9WgXcQ")
+        self.assertEqual(run.status_code, 201)
+        self.assertEqual(run.audio_seconds, 60)
+        self.assertEqual(run.transcript_chars, 26)
+        self.assertGreater(run.db_queries, 0)
+
+    @patch("quiz_app.api.ytdlp.extract_info", side_effect=YtDlpTimeout())
+    def test_validation_timeout_records_run(self, _):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post(
+            reverse("create-quiz"),
+            {"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"},
+            format="json"
+            )
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_504_GATEWAY_TIMEOUT)
+        run = GenerationRun.objects.get()
+        self.assertEqual(run.status_code, 504)
+        self.assertIn("validate", run.stage_seconds)
+
+
+@patch("quiz_app.api.ytdlp.extract_info", return_value={"duration": 60})
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="retrier",
+            password="pass1"
+            )
+        self.client.force_authenticate(user=self.user)
+        self.payload = {"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"}
+
+    def build_quiz(self, user, serializer, timer):
+        return Quiz.objects.create(
+            owner=user,
+            title="Retried Quiz",
+            video_url=serializer.validated_data["url"]
+            )
+
+    def post(self, key, payload=None):
+        return self.client.post(
+            reverse("create-quiz"),
+            payload or self.payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key
+            )
+
+    def test_retry_returns_original_quiz(self, _):
+        with patch("quiz_app.api.views.CreateQuizView.build_quiz",
+                   side_effect=self.build_quiz) as mock_build:
+            first = self.post("retry-1")
+            retry = self.post("retry-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        mock_build.assert_called_once()
+        self.assertEqual(Quiz.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self, _):
+        with patch("quiz_app.api.views.CreateQuizView.build_quiz",
+                   side_effect=self.build_quiz):
+            for _ in range(2):
+                self.client.post(reverse("create-quiz"), self.payload,
+                                 format="json")
+
+        self.assertEqual(Quiz.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_for_other_request_is_rejected(self, _):
+        with patch("quiz_app.api.views.CreateQuizView.build_quiz",
+                   side_effect=self.build_quiz):
+            self.post("retry-1")
+            response = self.post(
+                "retry-1",
+                {"url": "https://www.youtube.com/watch?v=other"}
+                )
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Quiz.objects.count(), 1)
+
+    def test_failed_request_can_be_retried(self, _):
+        with patch("quiz_app.api.views.CreateQuizView.build_quiz",
+                   side_effect=AdmissionRejected(retry_after=5)):
+            response = self.post("retry-1")
+        self.assertEqual(response.status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        with patch("quiz_app.api.views.CreateQuizView.build_quiz",
+                   side_effect=self.build_quiz):
+            response = self.post("retry-1")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_retry_of_running_request_times_out(self, _):
+        factory = APIRequestFactory()
+        request = factory.post("/api/createQuiz/", self.payload,
+                               format="json")
+        request.data = self.payload
+        request.user = self.user
+        request.headers = {"Idempotency-Key": "retry-1"}
+        IdempotencyKey.objects.create(owner=self.user, key="retry-1",
+                                      fingerprint=request_fingerprint(request))
+        requests = IdempotentRequests(ttl=60, timeout=60, wait=0.3,
+                                      retry_after=7)
+        requests.poll_interval = 0.1
+        work = MagicMock()
+
+        with self.assertRaises(IdempotencyInProgress) as raised:
+            requests.run(request, work, MagicMock())
+        work.assert_not_called()
+        self.assertEqual(raised.exception.wait, 7)
+
+    def test_request_survives_removed_key(self, _):
+        def build_quiz(user, serializer, timer):
+            # A retry takes the key for abandoned meanwhile.
+            IdempotencyKey.objects.filter(key="retry-1").delete()
+            return self.build_quiz(user, serializer, timer)
+
+        with patch("quiz_app.api.views.CreateQuizView.build_quiz",
+                   side_effect=build_quiz):
+            response = self.post("retry-1")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Quiz.objects.count(), 1)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "SQLite query plans")
+class QuizQueryPlanTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="planner",
+            password="pass1"
+            )
+        for number in range(3):
+            Quiz.objects.create(
+                owner=self.user,
+                title=f"Quiz {number}",
+                video_url="http://example.com/video"
+                )
+
+    def test_list_query_uses_owner_created_index(self):
+        plan = Quiz.objects.filter(
+            owner=self.user
+        ).order_by("-created_at").explain()
+
+        self.assertIn("quiz_owner_created_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertNotIn("SCAN", plan)
+
+    def test_latest_update_query_uses_owner_updated_index(self):
+        plan = Quiz.objects.filter(
+            owner=self.user
+        ).values("owner").annotate(latest=Max("updated_at")).explain()
+
+        self.assertIn("quiz_owner_updated_idx", plan)
+        self.assertNotIn("SCAN", plan)
+
+    def test_detail_query_uses_primary_key(self):
+        quiz = Quiz.objects.filter(owner=self.user).first()
+        plan = Quiz.objects.filter(id=quiz.id).explain()
+
+        self.assertIn("PRIMARY KEY", plan)
+        self.assertNotIn("SCAN", plan)
+
+
+class QuestionsCacheTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="cached",
+            password="pass1"
+            )
+        self.quiz = Quiz.objects.create(
+            owner=self.user,
+            title="Cached Quiz",
+            video_url="http://example.com/video"
+            )
+        self.question = QuizQuestions.objects.create(
+            question_title="Old title?",
+            question_options=["A", "B", "C", "D"],
+            answer="A",
+            )
+        self.quiz.questions.add(self.question)
+        self.client.force_authenticate(user=self.user)
+
+    def cache(self):
+        self.quiz.refresh_from_db()
+        return self.quiz.questions_cache
+
+    def test_adding_questions_fills_cache(self):
+        self.assertEqual(self.cache(), [{
+            "id": self.question.id,
+            "question_title": "Old title?",
+            "question_options": ["A", "B", "C", "D"],
+            "answer": "A",
+        }])
+
+    def test_updating_question_refreshes_cache(self):
+        self.question.question_title = "New title?"
+        self.question.save()
+        self.assertEqual(self.cache()[0]["question_title"], "New title?")
+
+    def test_removing_and_deleting_questions_refresh_cache(self):
+        other = QuizQuestions.objects.create(
+            question_title="Other?",
+            question_options=["A", "B", "C", "D"],
+            answer="B",
+            )
+        self.quiz.questions.add(other)
+        self.assertEqual(len(self.cache()), 2)
+
+        self.quiz.questions.remove(other)
+        self.assertEqual(len(self.cache()), 1)
+
+        self.question.delete()
+        self.assertEqual(self.cache(), [])
+
+    def test_cached_reads_match_joined_reads(self):
+        url = reverse("quiz-single-view", kwargs={"pk": self.quiz.id})
+        joined = self.client.get(url).data
+
+        with self.settings(QUIZ_DENORMALISED_QUESTIONS=True):
+            cached = self.client.get(url).data
+            listed = self.client.get(reverse("quizzes-view")).data
+
+        self.assertEqual(cached, joined)
+        self.assertEqual(listed[0]["questions"], joined["questions"])
+
+    def test_cached_list_does_not_query_questions(self):
+        for number in range(3):
+            Quiz.objects.create(
+                owner=self.user,
+                title=f"Quiz {number}",
+                video_url="http://example.com/video"
+                )
+
+        with self.settings(QUIZ_DENORMALISED_QUESTIONS=True):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse("quizzes-view"))
+
+        self.assertEqual(len(response.data), 4)
+
+
+@override_settings(YTDLP_START_METHOD="fork")
+class QuestionValidationTest(APITestCase):
+    def question(self, **overrides):
+        question = {
+            "question_title": "What is 2+2?",
+            "question_options": ["1", "2", "3", "4"],
+            "answer": "4",
+        }
+        question.update(overrides)
+        return question
+
+    def test_valid_batch_passes(self):
+        validate_questions([self.question(), self.question()])
+
+    def test_errors_are_reported_per_index(self):
+        with self.assertRaises(ValidationError) as ctx:
+            validate_questions([
+                self.question(),
+                self.question(question_options=["1", "1", "3", "4"],
+                              answer="1"),
+                self.question(answer="5"),
+                self.question(question_title="x" * 256),
+                self.question(question_options=["1", "2"]),
+            ])
+
+        errors = ctx.exception.detail["questions"]
+        self.assertEqual(sorted(errors), [1, 2, 3, 4])
+        self.assertIn("distinct", str(errors[1]))
+        self.assertIn("one of the answer options", str(errors[2]))
+        self.assertIn("255", str(errors[3]))
+        self.assertIn("exactly 4", str(errors[4]))
+
+    def test_save_checks_cheap_invariants_only(self):
+        with self.assertRaises(ValidationError):
+            QuizQuestions(
+                question_title="Q?",
+                question_options=["A", "B", "C", "D"],
+                answer="E",
+            ).save()
+
+        with self.assertNumQueries(1):
+            QuizQuestions(
+                question_title="Q?",
+                question_options=["A", "B", "C", "D"],
+                answer="A",
+            ).save()
+
+    def test_serializer_rejects_invalid_generated_questions(self):
+        user = User.objects.create_user(username="v", password="p")
+        content = {
+            "title": "Broken Quiz",
+            "questions": [self.question(answer="5")],
+        }
+        with patch("yt_dlp.YoutubeDL") as mock_yt_dlp:
+            mock_yt_dlp.return_value.__enter__.return_value \
+                .extract_info.return_value = {"duration": 60}
+            request = APIRequestFactory().post("/")
+            request.user = user
+            serializer = YoutubeURLSerializer(
+                data={"url": "https://youtu.be/dQw4w9WgXcQ"},
+                context={"request": request},
+            )
+            self.assertTrue(serializer.is_valid())
+
+        with self.assertRaises(ValidationError):
+            serializer.create(content=content)
+        self.assertFalse(Quiz.objects.filter(title="Broken Quiz").exists())
+
+
+class QuizAttemptTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="taker",
+            password="pass1"
+            )
+        self.quiz = Quiz.objects.create(
+            owner=self.user,
+            title="Attempt Quiz",
+            video_url="http://example.com/video"
+            )
+        self.questions = [
+            QuizQuestions.objects.create(
+                question_title=f"Question {number}?",
+                question_options=["A", "B", "C", "D"],
+                answer="A",
+                )
+            for number in range(3)
+        ]
+        self.quiz.questions.add(*self.questions)
+        self.url = reverse("quiz-attempts", kwargs={"pk": self.quiz.id})
+        self.client.force_authenticate(user=self.user)
+
+    def submit(self, answers):
+        return self.client.post(self.url, {"answers": [
+            {"question_id": question.id, "answer": answer}
+            for question, answer in answers
+        ]}, format="json")
+
+    def test_submission_is_scored_and_stored(self):
+        response = self.submit([
+            (self.questions[0], "A"),
+            (self.questions[1], "B"),
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["score"], 1)
+        self.assertEqual(response.data["total"], 3)
+        # The unanswered third question is stored as a wrong answer.
+        self.assertEqual(
+            [(answer["answer"], answer["is_correct"])
+             for answer in response.data["answers"]],
+            [("A", True), ("B", False), ("", False)]
+        )
+        attempt = QuizAttempt.objects.get(id=response.data["id"])
+        self.assertEqual(attempt.answers.count(), 3)
+
+    def test_cached_answer_index_scores_without_reading_quiz(self):
+        self.submit([(self.questions[0], "A")])
+
+        # Only the version of the quiz, the savepoint, the attempt, its
+        # answers and the locked statistics row are accessed.
+        with self.assertNumQueries(7):
+            response = self.submit([(self.questions[0], "A")])
+        self.assertEqual(response.data["score"], 1)
+
+    def test_question_update_invalidates_answer_index(self):
+        self.submit([(self.questions[0], "A")])
+
+        self.questions[0].answer = "B"
+        self.questions[0].save()
+
+        response = self.submit([(self.questions[0], "B")])
+        self.assertEqual(response.data["score"], 1)
+
+    def test_answer_index_of_changed_quiz_is_not_reused(self):
+        self.submit([(self.questions[0], "A")])
+        new = QuizQuestions.objects.create(
+            question_title="New question?",
+            question_options=["A", "B", "C", "D"],
+            answer="C",
+            )
+
+        # Another worker regenerates a question; nothing is removed from
+        # the cache of this one.
+        with patch("django.core.cache.cache.delete"):
+            self.quiz.questions.remove(self.questions[0])
+            self.quiz.questions.add(new)
+
+        response = self.submit([(new, "C")])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["score"], 1)
+        self.assertEqual(response.data["total"], 3)
+
+    def test_rejects_unknown_and_duplicate_questions(self):
+        other = QuizQuestions.objects.create(
+            question_title="Other?",
+            question_options=["A", "B", "C", "D"],
+            answer="A",
+            )
+
+        response = self.submit([(other, "A")])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.submit([
+            (self.questions[0], "A"),
+            (self.questions[0], "B"),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+    def test_only_owner_can_submit(self):
+        other = User.objects.create_user(username="other", password="p")
+        self.client.force_authenticate(user=other)
+
+        response = self.submit([(self.questions[0], "A")])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        missing = reverse("quiz-attempts", kwargs={"pk": 9999})
+        response = self.client.post(missing, {"answers": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_lists_own_attempts_newest_first(self):
+        self.submit([(self.questions[0], "A")])
+        self.submit([(self.questions[0], "B")])
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [attempt["score"] for attempt in response.data], [0, 1]
+        )
+
+    def test_answers_can_be_hidden_from_quiz_reads(self):
+        url = reverse("quiz-single-view", kwargs={"pk": self.quiz.id})
+
+        with self.settings(QUIZ_EXPOSE_ANSWERS=False):
+            joined = self.client.get(url).data
+            with self.settings(QUIZ_DENORMALISED_QUESTIONS=True):
+                cached = self.client.get(url).data
+
+        for data in (joined, cached):
+            self.assertNotIn("answer", data["questions"][0])
+            self.assertIn("question_options", data["questions"][0])
+
+
+class QuizStatsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="stats",
+            password="pass1"
+            )
+        self.quiz = Quiz.objects.create(
+            owner=self.user,
+            title="Stats Quiz",
+            video_url="http://example.com/video"
+            )
+        self.questions = [
+            QuizQuestions.objects.create(
+                question_title=f"Question {number}?",
+                question_options=["A", "B", "C", "D"],
+                answer="A",
+                )
+            for number in range(2)
+        ]
+        self.quiz.questions.add(*self.questions)
+        self.url = reverse("quiz-stats", kwargs={"pk": self.quiz.id})
+        self.client.force_authenticate(user=self.user)
+
+    def submit(self, *answers):
+        response = self.client.post(
+            reverse("quiz-attempts", kwargs={"pk": self.quiz.id}),
+            {"answers": [
+                {"question_id": question.id, "answer": answer}
+                for question, answer in zip(self.questions, answers)
+            ]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_empty_stats(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["attempt_count"], 0)
+        self.assertIsNone(response.data["average_score"])
+        self.assertIsNone(response.data["most_missed_question"])
+
+    def test_attempts_update_counters(self):
+        self.submit("A", "A")
+        self.submit("A", "B")
+        self.submit("C", "B")
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data["attempt_count"], 3)
+        self.assertEqual(response.data["average_score"], 1.0)
+        self.assertEqual(response.data["question_count"], 2)
+        self.assertEqual(response.data["score_histogram"],
+                         {"0": 1, "1": 1, "2": 1})
+        self.assertEqual(response.data["question_misses"], [
+            {"question_id": self.questions[1].id, "misses": 2},
+            {"question_id": self.questions[0].id, "misses": 1},
+        ])
+        self.assertEqual(response.data["most_missed_question"],
+                         self.questions[1].id)
+
+    def test_unanswered_questions_count_as_misses(self):
+        self.submit("A")
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data["question_misses"], [
+            {"question_id": self.questions[1].id, "misses": 1},
+        ])
+
+    def test_full_rebuild_removes_stats_without_attempts(self):
+        self.submit("A", "B")
+        QuizAttempt.objects.all().delete()
+
+        rebuild_stats()
+
+        self.assertFalse(QuizStats.objects.exists())
+
+    def test_read_does_not_depend_on_attempt_count(self):
+        for _ in range(5):
+            self.submit("A", "B")
+        self.client.get(self.url)
+
+        # The version of the quiz and its statistics row.
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+
+    def test_only_owner_can_read_stats(self):
+        other = User.objects.create_user(username="other", password="p")
+        self.client.force_authenticate(user=other)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rebuild_command_matches_incremental_counters(self):
+        self.submit("A", "B")
+        self.submit("B", "B")
+        expected = self.client.get(self.url).data
+
+        QuizStats.objects.update(attempt_count=0, score_sum=0,
+                                 score_histogram={}, question_misses={})
+        out = StringIO()
+        call_command("rebuild_quiz_stats", stdout=out)
+
+        self.assertIn("1 quizzes", out.getvalue())
+        self.assertEqual(self.client.get(self.url).data, expected)
+
+
+class QuizSearchTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="searcher",
+            password="pass1"
+            )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("quiz-search")
+
+    def create_quiz(self, title, description="", question="Question?",
+                    owner=None):
+        quiz = Quiz.objects.create(
+            owner=owner or self.user,
+            title=title,
+            description=description,
+            video_url="http://example.com/video"
+            )
+        quiz.questions.add(QuizQuestions.objects.create(
+            question_title=question,
+            question_options=["Alpha", "Beta", "Gamma", "Delta"],
+            answer="Alpha",
+            ))
+        return quiz
+
+    def search(self, query, **params):
+        return self.client.get(self.url, {"q": query, **params})
+
+    def titles(self, response):
+        return [quiz["title"] for quiz in response.data["results"]]
+
+    def test_matches_title_description_and_questions(self):
+        self.create_quiz("Photosynthesis basics")
+        self.create_quiz("Biology", description="All about photosynthesis")
+        self.create_quiz("Plants", question="Where does photosynthesis run?")
+        self.create_quiz("Unrelated")
+
+        response = self.search("photosynthesis")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(self.titles(response),
+                         ["Photosynthesis basics", "Biology", "Plants"])
+
+    def test_matches_options_and_prefixes(self):
+        self.create_quiz("Greek letters")
+
+        self.assertEqual(self.titles(self.search("gamm")), ["Greek letters"])
+        self.assertEqual(self.search("gamma epsilon").data["count"], 0)
+
+    def test_only_searches_own_quizzes(self):
+        other = User.objects.create_user(username="other", password="p")
+        self.create_quiz("Secret history", owner=other)
+
+        self.assertEqual(self.search("history").data["count"], 0)
+
+    def test_index_follows_updates_and_deletes(self):
+        quiz = self.create_quiz("Old name")
+        quiz.title = "Renamed quiz"
+        quiz.save()
+
+        self.assertEqual(self.search("old").data["count"], 0)
+        self.assertEqual(self.titles(self.search("renamed")),
+                         ["Renamed quiz"])
+
+        quiz.delete()
+        self.assertEqual(self.search("renamed").data["count"], 0)
+
+    def test_results_are_paginated(self):
+        for number in range(5):
+            self.create_quiz(f"Chemistry {number}")
+
+        response = self.search("chemistry", page_size=2, page=3)
+
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+    def test_fallback_without_full_text_index(self):
+        self.create_quiz("Physics", description="Newton and motion")
+
+        with patch("quiz_app.search.fts_available", return_value=False):
+            response = self.search("newton motion")
+
+        self.assertEqual(self.titles(response), ["Physics"])
+
+    def test_query_is_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(YTDLP_START_METHOD="fork")
+class QuizBatchTest(APITestCase):
+    GENERATED = """
+        {
+            "title": "Batch Quiz",
+            "description": "Generated in a batch.",
+            "questions": [
+                {
+                    "question_title": "What is 2+2?",
+                    "question_options": ["1", "2", "3", "4"],
+                    "answer": "4"
+                }
+            ]
+        }
+        """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="teacher",
+            password="pass1"
+            )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("create-quiz-batch")
+        yt_dlp_patch = patch("yt_dlp.YoutubeDL")
+        self.mock_yt_dlp = yt_dlp_patch.start()
+        self.addCleanup(yt_dlp_patch.stop)
+        self.extract_info = (
+            self.mock_yt_dlp.return_value.__enter__.return_value.extract_info
+        )
+        self.extract_info.side_effect = self.fake_extract_info
+
+    def fake_extract_info(self, url, download=False):
+        if "list=" in url:
+            return {"entries": [{"id": "video1"}, None, {"id": "video2"}]}
+        if url.endswith("v=toolong"):
+            return {"duration": 3600}
+        return {"duration": 60}
+
+    def submit(self, payload, run=None):
+        with patch("quiz_app.api.views.start_batch") as mock_start:
+            if run is not None:
+                mock_start.side_effect = run
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, payload, format="json")
+        return response, mock_start
+
+    def test_urls_are_validated_and_scheduled(self):
+        response, mock_start = self.submit({"urls": [
+            "https://www.youtube.com/watch?v=first",
+            "https://youtu.be/second",
+            "https://www.youtube.com/watch?v=toolong",
+            "https://www.invalid.com/watch?v=123",
+        ]})
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], QuizBatch.RUNNING)
+        items = response.data["items"]
+        self.assertEqual([item["status"] for item in items],
+                         ["pending", "pending", "rejected", "rejected"])
+        self.assertEqual(items[1]["video_id"], "second")
+        self.assertIn("15 minutes", items[2]["error"])
+
+        batch, _, prepared = mock_start.call_args.args
+        self.assertEqual(batch.id, response.data["id"])
+        self.assertEqual(len(prepared), 2)
+
+    @override_settings(YTDLP_ISOLATION=False)
+    def test_playlist_is_expanded_flat(self):
+        response, _ = self.submit({
+            "playlist_url": "https://www.youtube.com/playlist?list=PL123"
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual([item["video_id"] for item in response.data["items"]],
+                         ["video1", "video2"])
+        flat_options = [
+            call.args[0] for call in self.mock_yt_dlp.call_args_list
+            if call.args and call.args[0].get("extract_flat")
+        ]
+        self.assertEqual(len(flat_options), 1)
+
+    def test_rejects_invalid_input(self):
+        urls = ["https://youtu.be/video"]
+        for payload in [
+            {},
+            {"urls": urls, "playlist_url": "https://youtube.com/?list=1"},
+            {"urls": urls * 3},
+            {"playlist_url": "https://www.youtube.com/watch?v=abc"},
+        ]:
+            with self.settings(QUIZ_BATCH_MAX_ITEMS=2):
+                response, _ = self.submit(payload)
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST, payload)
+        self.assertFalse(QuizBatch.objects.exists())
+
+    @patch("whisper.load_model")
+    @patch(
+        "quiz_app.api.views.AudioQuestionGenerator.generate_questions_gemini"
+        )
+    def test_batch_generates_quizzes_with_one_whisper_model(
+        self, mock_generate_gemini, mock_load_model
+    ):
+        mock_load_model.return_value.transcribe.return_value = {
+            "text": "A transcript."
+        }
+
+        def run(batch, build_quiz, prepared):
+            BatchRunner(batch, build_quiz, prepared).run()
+
+        with patch("builtins.open", new_callable=MagicMock) as mock_open:
+            mock_open.return_value.__enter__.return_value.read \
+                .return_value = self.GENERATED
+            response, _ = self.submit({"urls": [
+                "https://youtu.be/first",
+                "https://youtu.be/second",
+            ]}, run=run)
+
+        batch = self.client.get(
+            reverse("quiz-batch", kwargs={"pk": response.data["id"]})
+        ).data
+        self.assertEqual(batch["status"], QuizBatch.DONE)
+        self.assertEqual([item["status"] for item in batch["items"]],
+                         ["done", "done"])
+        self.assertEqual(Quiz.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(mock_load_model.call_count, 1)
+        self.assertEqual(GenerationRun.objects.count(), 2)
+
+    def test_failed_items_are_recorded(self):
+        batch = QuizBatch.objects.create(owner=self.user)
+        item = QuizBatchItem.objects.create(
+            batch=batch, position=0,
+            url="https://www.youtube.com/watch?v=broken", video_id="broken"
+        )
+        build_quiz = MagicMock(side_effect=RuntimeError("Download failed"))
+
+        BatchRunner(batch, build_quiz).run()
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, QuizBatchItem.FAILED)
+        self.assertEqual(item.error, "Download failed")
+        self.assertEqual(GenerationRun.objects.get().status_code, 500)
+
+    def test_released_item_keeps_result_of_its_new_runner(self):
+        batch = QuizBatch.objects.create(owner=self.user)
+        item = QuizBatchItem.objects.create(
+            batch=batch, position=0,
+            url="https://www.youtube.com/watch?v=slow", video_id="slow"
+        )
+
+        def build_quiz(*args, **kwargs):
+            # The item is released and claimed by another runner meanwhile.
+            QuizBatchItem.objects.filter(id=item.id).update(
+                status=QuizBatchItem.PENDING
+            )
+            raise RuntimeError("Too slow")
+
+        BatchRunner(batch, build_quiz).run()
+
+        item.refresh_from_db()
+        self.assertEqual(item.status, QuizBatchItem.PENDING)
+        self.assertEqual(item.error, "")
+
+    @override_settings(QUIZ_MAX_CONCURRENT_GENERATIONS=2,
+                       QUIZ_MAX_CONCURRENT_GENERATIONS_PER_USER=3)
+    def test_items_run_up_to_the_admission_limit(self):
+        batch = QuizBatch.objects.create(owner=self.user)
+
+        self.assertEqual(BatchRunner(batch, MagicMock()).workers, 2)
+
+    def test_command_resumes_stale_and_pending_items(self):
+        batch = QuizBatch.objects.create(owner=self.user)
+        stale = QuizBatchItem.objects.create(
+            batch=batch, position=0, url="https://www.youtube.com/watch?v=a",
+            video_id="a", status=QuizBatchItem.RUNNING
+        )
+        QuizBatchItem.objects.filter(id=stale.id).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        QuizBatchItem.objects.create(
+            batch=batch, position=1, url="https://www.youtube.com/watch?v=b",
+            video_id="b"
+        )
+        quiz = Quiz.objects.create(owner=self.user, title="Q",
+                                   video_url="http://example.com/video")
+
+        with patch("quiz_app.api.views.CreateQuizView.build_quiz",
+                   return_value=quiz) as mock_build:
+            call_command("run_quiz_batches", stdout=StringIO())
+
+        self.assertEqual(mock_build.call_count, 2)
+        self.assertEqual(
+            list(batch.items.values_list("status", flat=True)),
+            [QuizBatchItem.DONE, QuizBatchItem.DONE]
+        )
+
+    def test_reading_batch_resumes_stale_items(self):
+        batch = QuizBatch.objects.create(owner=self.user)
+        stale = QuizBatchItem.objects.create(
+            batch=batch, position=0, url="https://www.youtube.com/watch?v=a",
+            video_id="a", status=QuizBatchItem.RUNNING
+        )
+        QuizBatchItem.objects.filter(id=stale.id).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        QuizBatchItem.objects.create(
+            batch=batch, position=1, url="https://www.youtube.com/watch?v=b",
+            video_id="b", status=QuizBatchItem.RUNNING
+        )
+
+        with patch("quiz_app.api.batch.start_batch") as mock_start:
+            response = self.client.get(
+                reverse("quiz-batch", kwargs={"pk": batch.id})
+            )
+
+        self.assertEqual(
+            [item["status"] for item in response.data["items"]],
+            [QuizBatchItem.PENDING, QuizBatchItem.RUNNING]
+        )
+        mock_start.assert_called_once()
+        self.assertEqual(mock_start.call_args.args[0], batch)
+
+    def test_only_owner_can_read_batch(self):
+        batch = QuizBatch.objects.create(owner=self.user)
+        other = User.objects.create_user(username="other", password="p")
+        self.client.force_authenticate(user=other)
+
+        response = self.client.get(
+            reverse("quiz-batch", kwargs={"pk": batch.id})
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QuizTransferTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="archivist",
+            password="pass1"
+            )
+        self.client.force_authenticate(user=self.user)
+        for number in range(3):
+            quiz = Quiz.objects.create(
+                owner=self.user,
+                title=f"Quiz {number}",
+                description=f"Description {number}",
+                video_url="https://www.youtube.com/watch?v=abc"
+                )
+            quiz.questions.add(QuizQuestions.objects.create(
+                question_title=f"Question {number}?",
+                question_options=["A", "B", "C", "D"],
+                answer="B",
+                ))
+
+    def export(self):
+        response = self.client.get(reverse("quiz-export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content)
+
+    def import_lines(self, body):
+        return self.client.generic(
+            "POST", reverse("quiz-import"), body,
+            content_type="application/x-ndjson"
+        )
+
+    def test_export_streams_one_quiz_per_line(self):
+        lines = self.export().decode("utf-8").splitlines()
+
+        self.assertEqual(len(lines), 3)
+        first = json.loads(lines[0])
+        self.assertEqual(first["title"], "Quiz 0")
+        self.assertEqual(first["owner"], "archivist")
+        self.assertEqual(first["questions"], [{
+            "question_title": "Question 0?",
+            "question_options": ["A", "B", "C", "D"],
+            "answer": "B",
+        }])
+
+    def test_export_reads_quizzes_in_chunks_without_joins(self):
+        with self.assertNumQueries(1):
+            lines = list(export_lines(Quiz.objects.all(), chunk_size=2))
+        self.assertEqual(len(lines), 3)
+
+    def test_import_round_trip(self):
+        Quiz.objects.update(created_at=datetime(2024, 5, 1, 12, 0,
+                                                tzinfo=dt_timezone.utc))
+        body = self.export()
+        other = User.objects.create_user(username="other", password="p")
+        self.client.force_authenticate(user=other)
+
+        response = self.import_lines(body)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"imported": 3, "errors": []})
+        imported = Quiz.objects.filter(owner=other).order_by("id")
+        self.assertEqual(imported.count(), 3)
+        quiz = imported.first()
+        self.assertEqual(quiz.created_at,
+                         datetime(2024, 5, 1, 12, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(quiz.questions.get().answer, "B")
+        self.assertEqual(quiz.questions_cache[0]["id"],
+                         quiz.questions.get().id)
+        self.assertEqual(
+            self.client.get(reverse("quiz-search"),
+                            {"q": "question"}).data["count"],
+            3
+        )
+
+    def test_import_skips_invalid_lines(self):
+        valid = self.export().splitlines()[0]
+        body = b"\n".join([
+            valid,
+            b"not json",
+            json.dumps({"title": "No questions"}).encode(),
+            json.dumps({"title": "Bad", "questions": [{
+                "question_title": "Q?",
+                "question_options": ["A", "B", "C", "D"],
+                "answer": "E",
+            }]}).encode(),
+            json.dumps(dict(json.loads(valid),
+                            created_at="yesterday")).encode(),
+        ])
+
+        response = self.import_lines(body)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["imported"], 1)
+        self.assertEqual([error["line"] for error in response.data["errors"]],
+                         [2, 3, 4, 5])
+
+    def test_import_without_valid_lines_fails(self):
+        response = self.import_lines(b"not json\n")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_commands_round_trip_in_batches(self):
+        with tempfile.NamedTemporaryFile(suffix=".ndjson") as backup:
+            call_command("export_quizzes", output=backup.name,
+                         stderr=StringIO())
+            Quiz.objects.all().delete()
+
+            out = StringIO()
+            # One owner lookup, then per batch: savepoint, questions,
+            # quizzes, their creation dates, through rows, search
+            # documents and release.
+            with self.assertNumQueries(1 + 2 * 7):
+                call_command("import_quizzes", backup.name, batch_size=2,
+                             stdout=out)
+
+        self.assertIn("Imported 3 quizzes", out.getvalue())
+        self.assertEqual(Quiz.objects.filter(owner=self.user).count(), 3)
+
+
+@override_settings(YTDLP_START_METHOD="fork")
+class QuestionRegenerateTest(APITestCase):
+    TRANSCRIPT = "Photosynthesis turns light into chemical energy. " * 200
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="editor",
+            password="pass1"
+            )
+        self.client.force_authenticate(user=self.user)
+        self.quiz = Quiz.objects.create(
+            owner=self.user,
+            title="Plants",
+            video_url="https://www.youtube.com/watch?v=plants"
+            )
+        self.questions = [
+            QuizQuestions.objects.create(
+                question_title=f"Question {number}?",
+                question_options=["A", "B", "C", "D"],
+                answer="A",
+                )
+            for number in range(2)
+        ]
+        self.quiz.questions.add(*self.questions)
+        QuizTranscript.from_text(self.quiz, self.TRANSCRIPT).save()
+        self.url = reverse("question-regenerate", kwargs={
+            "pk": self.quiz.id, "question_pk": self.questions[0].id
+        })
+
+    def gemini_response(self, text, prompt_tokens=900, output_tokens=60):
+        response = MagicMock()
+        response.text = text
+        response.usage_metadata.prompt_token_count = prompt_tokens
+        response.usage_metadata.candidates_token_count = output_tokens
+        return response
+
+    def test_transcript_is_stored_compressed(self):
+        transcript = QuizTranscript.objects.get(quiz=self.quiz)
+
+        self.assertEqual(transcript.text, self.TRANSCRIPT)
+        self.assertEqual(transcript.length, len(self.TRANSCRIPT))
+        self.assertLess(len(transcript.data), len(self.TRANSCRIPT) / 10)
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_question_is_replaced(self, mock_client):
+        mock_client.return_value.models.generate_content.return_value = \
+            self.gemini_response("""```json
+            {"question_title": "What does photosynthesis produce?",
+             "question_options": ["Light", "Energy", "Water", "Soil"],
+             "answer": "Energy"}
+            ```""")
+
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["answer"], "Energy")
+        self.quiz.refresh_from_db()
+        self.assertEqual(
+            [entry["question_title"] for entry in self.quiz.questions_cache],
+            ["Question 1?", "What does photosynthesis produce?"]
+        )
+        prompt = mock_client.return_value.models.generate_content.call_args \
+            .kwargs["contents"]
+        self.assertIn("Question 1?", prompt)
+        self.assertIn("Photosynthesis turns light", prompt)
+
+        run = GenerationRun.objects.get()
+        self.assertEqual(run.video_id, "plants")
+        self.assertEqual(run.prompt_tokens, 900)
+        self.assertEqual(set(run.stage_seconds), {"generate", "save"})
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_past_attempts_keep_replaced_question(self, mock_client):
+        mock_client.return_value.models.generate_content.return_value = \
+            self.gemini_response(json.dumps({
+                "question_title": "What does photosynthesis produce?",
+                "question_options": ["Light", "Energy", "Water", "Soil"],
+                "answer": "Energy",
+            }))
+        attempts_url = reverse("quiz-attempts", kwargs={"pk": self.quiz.id})
+        self.client.post(attempts_url, {"answers": [
+            {"question_id": self.questions[0].id, "answer": "B"},
+        ]}, format="json")
+
+        self.client.post(self.url)
+
+        answer = AttemptAnswer.objects.get(answer="B")
+        self.assertEqual(answer.question_id, self.questions[0].id)
+        self.assertFalse(
+            self.quiz.questions.filter(id=self.questions[0].id).exists()
+        )
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        recorded = stats.question_misses
+        rebuild_stats([self.quiz.id])
+        stats.refresh_from_db()
+        self.assertEqual(stats.question_misses, recorded)
+
+    @override_settings(QUIZ_TOKEN_ENCODING="", QUIZ_PROMPT_TOKEN_BUDGET=100,
+                       QUIZ_SUMMARY_CHUNK_TOKENS=60,
+                       QUIZ_SUMMARY_MAX_CHUNKS=4)
+    @patch("quiz_app.api.providers.gemini")
+    def test_long_transcript_is_summarised(self, mock_client):
+        def generate_content(model, contents):
+            if "Summarise part" in contents:
+                return self.gemini_response("Plants make sugar.", 10, 5)
+            return self.gemini_response(json.dumps({
+                "question_title": "What do plants make?",
+                "question_options": ["Sugar", "Salt", "Sand", "Steel"],
+                "answer": "Sugar",
+            }))
+
+        generate_content_mock = \
+            mock_client.return_value.models.generate_content
+        generate_content_mock.side_effect = generate_content
+
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        prompt = generate_content_mock.call_args.kwargs["contents"]
+        self.assertIn("transcript summary:", prompt)
+        self.assertIn("Plants make sugar.", prompt)
+        run = GenerationRun.objects.get()
+        self.assertEqual(run.details["summary_chunks"], 4)
+        self.assertEqual(run.prompt_tokens, 900 + 4 * 10)
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_missing_token_counts_are_recorded_as_zero(self, mock_client):
+        mock_client.return_value.models.generate_content.return_value = \
+            self.gemini_response(json.dumps({
+                "question_title": "What does photosynthesis produce?",
+                "question_options": ["Light", "Energy", "Water", "Soil"],
+                "answer": "Energy",
+            }), prompt_tokens=None, output_tokens=None)
+
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run = GenerationRun.objects.get()
+        self.assertEqual((run.prompt_tokens, run.output_tokens), (0, 0))
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_invalid_question_keeps_old_one(self, mock_client):
+        mock_client.return_value.models.generate_content.return_value = \
+            self.gemini_response(json.dumps({
+                "question_title": "Broken?",
+                "question_options": ["A", "B"],
+                "answer": "A",
+            }))
+
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertTrue(
+            QuizQuestions.objects.filter(id=self.questions[0].id).exists()
+        )
+
+    def test_requires_stored_transcript(self):
+        QuizTranscript.objects.all().delete()
+
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    @patch("yt_dlp.YoutubeDL")
+    @patch("whisper.load_model")
+    @patch(
+        "quiz_app.api.views.AudioQuestionGenerator.generate_questions_gemini"
+        )
+    def test_create_quiz_stores_transcript(
+        self, mock_generate_gemini, mock_load_model, mock_yt_dlp
+    ):
+        mock_yt_dlp.return_value.__enter__.return_value \
+            .extract_info.return_value = {"duration": 60}
+        mock_load_model.return_value.transcribe.return_value = {
+            "text": "A stored transcript."
+        }
+
+        with patch("builtins.open", new_callable=MagicMock) as mock_open:
+            mock_open.return_value.__enter__.return_value.read \
+                .return_value = QuizBatchTest.GENERATED
+            response = self.client.post(
+                reverse("create-quiz"),
+                {"url": "https://www.youtube.com/watch?v=stored"},
+                format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        transcript = QuizTranscript.objects.get(quiz_id=response.data["id"])
+        self.assertEqual(transcript.text, "A stored transcript.")
+
+    def test_question_must_belong_to_quiz(self):
+        other = QuizQuestions.objects.create(
+            question_title="Other?",
+            question_options=["A", "B", "C", "D"],
+            answer="A",
+            )
+        url = reverse("question-regenerate", kwargs={
+            "pk": self.quiz.id, "question_pk": other.id
+        })
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ImportTimeTest(SimpleTestCase):
+    """
+    Loads the URLconf in a fresh interpreter with `python -X importtime`
+    and checks that the heavy pipeline dependencies are not imported and
+    that the boot stays within QUIZLY_IMPORT_BUDGET_MS (default 1000 ms).
+    """
+
+    HEAVY_MODULES = ("yt_dlp", "google.genai", "whisper", "torch")
+
+    def import_times(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="core.settings")
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c",
+             "import django; django.setup(); import core.urls"],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=env,
+            check=True,
+        )
+
+        times = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+        return times
+
+    def test_urlconf_does_not_import_pipeline_dependencies(self):
+        times = self.import_times()
+
+        for module in self.HEAVY_MODULES:
+            self.assertNotIn(module, times)
+
+        budget_ms = int(os.getenv("QUIZLY_IMPORT_BUDGET_MS", "1000"))
+        self.assertLess(times["core.urls"] / 1000, budget_ms)
+
+
+class TranscriptionServiceTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.socket_path = os.path.join(directory.name, "whisper.sock")
+        self.audio_path = os.path.join(directory.name, "audio.wav")
+        with open(self.audio_path, "wb") as file:
+            file.write(b"RIFF")
+
+        self.model = MagicMock()
+        self.model.transcribe.side_effect = self.transcribe
+        self.received = []
+        whisper_model = MagicMock()
+        whisper_model.get.return_value = self.model
+
+        self.service = TranscriptionService(whisper_model, queue_size=1)
+        server = TranscriptionServer(self.socket_path, self.service)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.client = TranscriptionClient(self.socket_path, timeout=10)
+
+    def transcribe(self, path):
+        with open(path, "rb") as file:
+            self.received.append((path, file.read()))
+        return {"text": f"Transcript {len(self.received)}"}
+
+    def test_transcribes_file_path(self):
+        self.service.start()
+
+        result = self.client.transcribe(path=self.audio_path)
+
+        self.assertEqual(result["text"], "Transcript 1")
+        self.assertEqual(self.received, [(self.audio_path, b"RIFF")])
+
+    def test_transcribes_audio_bytes_and_removes_temporary_file(self):
+        self.service.start()
+
+        result = self.client.transcribe(audio=b"audio bytes", suffix=".mp3")
+
+        self.assertEqual(result["text"], "Transcript 1")
+        path, content = self.received[0]
+        self.assertEqual(content, b"audio bytes")
+        self.assertTrue(path.endswith(".mp3"))
+        self.assertFalse(os.path.exists(path))
+
+    def test_full_queue_is_refused(self):
+        # Without a running worker the first request fills the queue.
+        self.service.submit(self.audio_path)
+
+        with self.assertRaises(TranscriptionError) as raised:
+            self.client.transcribe(path=self.audio_path)
+        self.assertTrue(raised.exception.busy)
+
+    def test_failed_transcription_is_reported(self):
+        self.model.transcribe.side_effect = RuntimeError("bad audio")
+        self.service.start()
+
+        with self.assertRaisesMessage(TranscriptionError, "bad audio"):
+            self.client.transcribe(path=self.audio_path)
+
+    @override_settings(WHISPER_SERVICE_MAX_AUDIO_SIZE=4)
+    def test_oversized_audio_is_refused(self):
+        self.service.start()
+
+        with self.assertRaisesMessage(TranscriptionError, "too large"):
+            self.client.transcribe(audio=b"audio bytes")
+        self.assertEqual(self.received, [])
+
+    @override_settings(MEDIA_ROOT="/nonexistent/media")
+    def test_paths_outside_audio_directories_are_refused(self):
+        self.service.start()
+
+        with self.assertRaisesMessage(TranscriptionError, "audio directory"):
+            self.client.transcribe(path=os.path.abspath(__file__))
+        self.assertEqual(self.received, [])
+
+    def test_unavailable_service(self):
+        client = TranscriptionClient(self.socket_path + ".missing")
+
+        with self.assertRaises(TranscriptionError):
+            client.transcribe(path=self.audio_path)
+
+    def test_generator_uses_service(self):
+        self.service.start()
+        generator = AudioQuestionGenerator(job_id="service")
+        generator.whisper_model = MagicMock()
+        audio_file = f"media/{generator.audio_track}.wav"
+        os.makedirs("media", exist_ok=True)
+        with open(audio_file, "wb") as file:
+            file.write(b"RIFF")
+        self.addCleanup(generator.delete_transcribed_text)
+
+        with override_settings(WHISPER_SERVICE_SOCKET=self.socket_path):
+            generator.transcribe_whisper()
+
+        self.assertEqual(generator.transcript, "Transcript 1")
+        self.assertEqual(self.received[0][0], os.path.abspath(audio_file))
+        self.assertFalse(os.path.exists(audio_file))
+        generator.whisper_model.get.assert_not_called()
+
+
+class PreloadedWhisperModelTest(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(setattr, SharedWhisperModel, "preloaded", None)
+
+    @patch("whisper.load_model")
+    def test_generators_share_preloaded_model(self, mock_load_model):
+        SharedWhisperModel.preload()
+
+        first = AudioQuestionGenerator().whisper_model.get()
+        second = AudioQuestionGenerator().whisper_model.get()
+
+        self.assertIs(first, second)
+        mock_load_model.assert_called_once_with("small", device="cpu")
+
+    def test_given_model_takes_precedence(self):
+        SharedWhisperModel.preloaded = MagicMock()
+        whisper_model = SharedWhisperModel()
+
+        generator = AudioQuestionGenerator(whisper_model=whisper_model)
+        self.assertIs(generator.whisper_model, whisper_model)
+
+
+class VoiceActivityDetectionTest(SimpleTestCase):
+    RATE = vad.SAMPLE_RATE
+
+    def setUp(self):
+        self.random = np.random.default_rng(0)
+
+    def silence(self, seconds):
+        return self.random.normal(0, 0.0005, int(seconds * self.RATE))
+
+    def speech(self, seconds):
+        # A voiced signal (120 Hz with harmonics) whose loudness rises
+        # and falls four times per second, like syllables.
+        t = np.arange(int(seconds * self.RATE)) / self.RATE
+        phase = 2 * np.pi * 120 * t
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 15))
+        envelope = np.sqrt(np.clip(np.sin(2 * np.pi * 4 * t), 0, None))
+        return 0.2 * voiced * envelope
+
+    def tone(self, seconds):
+        t = np.arange(int(seconds * self.RATE)) / self.RATE
+        return 0.2 * (np.sin(2 * np.pi * 440 * t)
+                      + 0.5 * np.sin(2 * np.pi * 660 * t))
+
+    def noise(self, seconds):
+        return self.random.normal(0, 0.1, int(seconds * self.RATE))
+
+    def recording(self):
+        return np.concatenate([
+            self.silence(3), self.speech(4), self.silence(2),
+            self.tone(3), self.noise(2), self.speech(2), self.silence(1),
+        ]).astype(np.float32)
+
+    def write_wav(self, samples, rate=None, channels=1):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "audio.wav")
+        pcm = (np.clip(samples, -1, 1) * 32767).astype(np.int16)
+        if channels > 1:
+            pcm = np.repeat(pcm, channels)
+        with wave.open(path, "wb") as file:
+            file.setnchannels(channels)
+            file.setsampwidth(2)
+            file.setframerate(rate or self.RATE)
+            file.writeframes(pcm.tobytes())
+        return path
+
+    def test_only_speech_segments_are_kept(self):
+        segments = vad.speech_segments(self.recording())
+
+        self.assertEqual(len(segments), 2)
+        (first_start, first_end), (second_start, second_end) = segments
+        self.assertAlmostEqual(first_start, 3, delta=0.3)
+        self.assertAlmostEqual(first_end, 7, delta=0.3)
+        self.assertAlmostEqual(second_start, 14, delta=0.3)
+        self.assertAlmostEqual(second_end, 16, delta=0.3)
+
+    def test_extract_speech_reports_skipped_audio(self):
+        speech = vad.extract_speech(self.write_wav(self.recording()))
+
+        self.assertAlmostEqual(speech.audio_seconds, 17, delta=0.01)
+        self.assertAlmostEqual(speech.speech_seconds, 6.6, delta=0.5)
+        self.assertAlmostEqual(
+            speech.skipped_seconds, 17 - speech.speech_seconds
+        )
+        self.assertEqual(
+            len(speech.samples), round(speech.speech_seconds * self.RATE)
+        )
+
+    def test_stereo_and_other_rates_are_converted(self):
+        samples = vad.load_wav(
+            self.write_wav(self.speech(1), rate=8000, channels=2)
+        )
+
+        self.assertEqual(samples.dtype, np.float32)
+        self.assertEqual(len(samples), 2 * self.RATE)
+
+    def test_recording_without_speech_is_kept_whole(self):
+        speech = vad.extract_speech(self.write_wav(self.silence(2)))
+
+        self.assertEqual(speech.segments, [(0.0, 2.0)])
+        self.assertEqual(speech.skipped_seconds, 0)
+
+    def test_transcribe_file_passes_only_speech(self):
+        model = MagicMock()
+        model.transcribe.return_value = {"text": "Hello."}
+
+        result = transcribe_file(model, self.write_wav(self.recording()))
+
+        audio = model.transcribe.call_args.args[0]
+        self.assertIsInstance(audio, np.ndarray)
+        self.assertEqual(result["text"], "Hello.")
+        self.assertLess(result["speech_seconds"], result["audio_seconds"])
+
+    def test_transcribe_file_without_detection(self):
+        model = MagicMock()
+        model.transcribe.return_value = {"text": "Hello."}
+        path = self.write_wav(self.recording())
+
+        with override_settings(QUIZ_VAD_ENABLED=False):
+            result = transcribe_file(model, path)
+
+        model.transcribe.assert_called_once_with(path)
+        self.assertIsNone(result["speech_seconds"])
+
+    def test_undecodable_file_is_transcribed_whole(self):
+        model = MagicMock()
+        model.transcribe.return_value = {"text": "Hello."}
+        path = self.write_wav(self.speech(1))
+        with open(path, "wb") as file:
+            file.write(b"not a wav file")
+
+        result = transcribe_file(model, path)
+
+        model.transcribe.assert_called_once_with(path)
+        self.assertEqual(result["text"], "Hello.")
+
+
+@override_settings(QUIZ_TOKEN_ENCODING="", QUIZ_PROMPT_TOKEN_BUDGET=100,
+                   QUIZ_SUMMARY_CHUNK_TOKENS=60, QUIZ_SUMMARY_MAX_CHUNKS=8)
+class TranscriptPackingTest(SimpleTestCase):
+    # Without an encoding, tokens are estimated as 4 characters each.
+
+    def transcript(self, sentences):
+        return " ".join(
+            f"Sentence number {number:03d} is about plants."
+            for number in range(sentences)
+        )
+
+    def gemini(self, mock_gemini, prompt_tokens=10, output_tokens=5):
+        def generate_content(model, contents):
+            part = re.search(r"part (\d+) of", contents)
+            response = MagicMock()
+            response.text = (
+                f"Summary {part.group(1)}." if part else '{"title": "Q"}'
+            )
+            response.usage_metadata.prompt_token_count = prompt_tokens
+            response.usage_metadata.candidates_token_count = output_tokens
+            return response
+
+        mock_gemini.return_value.models.generate_content.side_effect = \
+            generate_content
+        return mock_gemini.return_value.models.generate_content
+
+    def test_token_estimate(self):
+        self.assertEqual(count_tokens("12345678"), 2)
+        self.assertEqual(count_tokens("123456789"), 3)
+
+    def test_chunks_end_at_sentences(self):
+        chunks = split_chunks(self.transcript(20), 60)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk), 60)
+            self.assertTrue(chunk.endswith("plants."))
+        self.assertEqual(" ".join(chunks), self.transcript(20))
+
+    def test_overlong_sentence_is_split_between_words(self):
+        chunks = split_chunks("word " * 200, 60)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(count_tokens(chunk) <= 60 for chunk in chunks))
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_transcript_within_budget_is_kept(self, mock_gemini):
+        transcript = self.transcript(8)
+
+        text, summarised = TranscriptPacker().pack(transcript)
+
+        self.assertEqual(text, transcript)
+        self.assertFalse(summarised)
+        mock_gemini.assert_not_called()
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_long_transcript_is_summarised_in_parallel(self, mock_gemini):
+        generate_content = self.gemini(mock_gemini)
+        packer = TranscriptPacker()
+
+        text, summarised = packer.pack(self.transcript(40))
+
+        self.assertTrue(summarised)
+        self.assertEqual(generate_content.call_count, packer.summary_chunks)
+        self.assertEqual(
+            text.split("\n\n"),
+            [f"Summary {number}." for number in
+             range(1, packer.summary_chunks + 1)]
+        )
+        self.assertEqual(packer.prompt_tokens, 10 * packer.summary_chunks)
+
+    @override_settings(QUIZ_SUMMARY_MAX_CHUNKS=3)
+    @patch("quiz_app.api.providers.gemini")
+    def test_chunks_grow_to_bound_the_number_of_calls(self, mock_gemini):
+        generate_content = self.gemini(mock_gemini)
+
+        TranscriptPacker().pack(self.transcript(200))
+
+        self.assertLessEqual(generate_content.call_count, 3)
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_generator_builds_quiz_from_summary(self, mock_gemini):
+        generate_content = self.gemini(mock_gemini)
+        generator = AudioQuestionGenerator(job_id="packing")
+        os.makedirs("media", exist_ok=True)
+        generator.write_file(f"media/{generator.transcribed_text}.txt",
+                             self.transcript(40))
+        self.addCleanup(generator.delete_transcribed_text)
+        self.addCleanup(generator.delete_generated_text)
+
+        generator.generate_questions_gemini()
+
+        prompt = generate_content.call_args.kwargs["contents"]
+        self.assertIn("transcript summary:", prompt)
+        self.assertIn(f"Summary {generator.summary_chunks}.", prompt)
+        self.assertEqual(generator.prompt_tokens,
+                         10 * (generator.summary_chunks + 1))
+
+    @patch("quiz_app.api.providers.gemini")
+    def test_generator_accepts_missing_token_counts(self, mock_gemini):
+        self.gemini(mock_gemini, prompt_tokens=None, output_tokens=None)
+        generator = AudioQuestionGenerator(job_id="packing")
+        os.makedirs("media", exist_ok=True)
+        generator.write_file(f"media/{generator.transcribed_text}.txt",
+                             self.transcript(40))
+        self.addCleanup(generator.delete_transcribed_text)
+        self.addCleanup(generator.delete_generated_text)
+
+        generator.generate_questions_gemini()
+
+        self.assertGreater(generator.summary_chunks, 0)
+        self.assertEqual(generator.prompt_tokens, 0)
+        self.assertEqual(generator.output_tokens, 0)
+
+
+class CpuSchedulerTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.lock_dir = directory.name
+
+    def scheduler(self, **options):
+        options.setdefault("lock_dir", self.lock_dir)
+        options.setdefault("available", list(range(8)))
+        return CpuScheduler(**options)
+
+    def test_cores_are_split_between_transcriptions_and_requests(self):
+        scheduler = self.scheduler(cores=4, slots=2)
+
+        self.assertEqual(scheduler.cores, [4, 5, 6, 7])
+        self.assertEqual(scheduler.request_cores, [0, 1, 2, 3])
+        self.assertEqual(scheduler.threads, 2)
+
+    def test_requests_share_cores_if_all_are_reserved(self):
+        scheduler = self.scheduler(cores=16, slots=32)
+
+        self.assertEqual(scheduler.cores, list(range(8)))
+        self.assertEqual(scheduler.request_cores, list(range(8)))
+        self.assertEqual(scheduler.slots, 8)
+        self.assertEqual(scheduler.threads, 1)
+
+    def test_requests_are_not_pinned_without_reserved_cores(self):
+        scheduler = self.scheduler(cores=0, slots=2)
+
+        with patch("os.sched_setaffinity", create=True) as set_affinity:
+            scheduler.pin_requests()
+
+        self.assertFalse(scheduler.reserved)
+        self.assertEqual(scheduler.cores, list(range(8)))
+        self.assertEqual(scheduler.request_cores, list(range(8)))
+        self.assertEqual(scheduler.threads, 4)
+        set_affinity.assert_not_called()
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "Linux only")
+    def test_scheduler_of_pinned_worker_splits_all_cores(self):
+        affinity = set(range(8))
+
+        def set_affinity(pid, cores):
+            affinity.clear()
+            affinity.update(cores)
+
+        with patch.dict(os.environ), \
+                patch("os.sched_getaffinity",
+                      side_effect=lambda pid: set(affinity)), \
+                patch("os.sched_setaffinity", side_effect=set_affinity):
+            os.environ.pop(CORES_VARIABLE, None)
+            # gunicorn's post_fork pins the worker ...
+            CpuScheduler(cores=4, lock_dir=self.lock_dir).pin_requests()
+            # ... which builds its transcription scheduler later.
+            scheduler = CpuScheduler(cores=4, lock_dir=self.lock_dir)
+
+        self.assertEqual(sorted(affinity), [0, 1, 2, 3])
+        self.assertEqual(scheduler.cores, [4, 5, 6, 7])
+        self.assertEqual(scheduler.request_cores, [0, 1, 2, 3])
+
+    def test_slot_sets_torch_threads(self):
+        scheduler = self.scheduler(cores=4, slots=2)
+
+        with patch.dict(os.environ), patch.dict(sys.modules, {"torch": None}):
+            with scheduler.transcription_slot():
+                self.assertEqual(os.environ["OMP_NUM_THREADS"], "2")
+
+    def test_excess_transcriptions_wait_for_a_slot(self):
+        first = self.scheduler(cores=2, slots=1)
+        second = self.scheduler(cores=2, slots=1, wait=0.5)
+        second.poll_interval = 0.1
+
+        with first.transcription_slot():
+            with self.assertRaises(CpuSlotTimeout):
+                with second.transcription_slot():
+                    pass
+
+        with second.transcription_slot() as index:
+            self.assertEqual(index, 0)
+
+    def test_second_slot_is_used_while_first_is_taken(self):
+        first = self.scheduler(cores=4, slots=2)
+        second = self.scheduler(cores=4, slots=2, wait=0)
+
+        with first.transcription_slot() as first_index:
+            with second.transcription_slot() as second_index:
+                self.assertEqual((first_index, second_index), (0, 1))
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "Linux only")
+    def test_transcription_thread_is_pinned_and_deprioritised(self):
+        cores = sorted(os.sched_getaffinity(0))
+        scheduler = CpuScheduler(cores=1, nice=5, lock_dir=self.lock_dir)
+        seen = {}
+
+        def prepare():
+            scheduler.prepare_thread()
+            seen["cores"] = sorted(os.sched_getaffinity(0))
+            seen["nice"] = os.getpriority(os.PRIO_PROCESS,
+                                          threading.get_native_id())
+
+        thread = threading.Thread(target=prepare)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(seen["cores"], cores[-1:])
+        self.assertGreaterEqual(seen["nice"], 5)
+        self.assertEqual(sorted(os.sched_getaffinity(0)), cores)
+
+    def test_service_transcribes_within_a_slot(self):
+        scheduler = MagicMock()
+        model = MagicMock()
+        model.transcribe.return_value = {"text": "Scheduled."}
+        whisper_model = MagicMock()
+        whisper_model.get.return_value = model
+        service = TranscriptionService(whisper_model, queue_size=1,
+                                       scheduler=scheduler)
+        service.start()
+
+        with override_settings(QUIZ_VAD_ENABLED=False):
+            result = service.submit("audio.wav").result(timeout=10)
+
+        self.assertEqual(result["text"], "Scheduled.")
+        scheduler.prepare_thread.assert_called_once()
+        scheduler.transcription_slot.assert_called_once()
+
+
+class AudioFingerprintTest(APITestCase):
+    RATE = vad.SAMPLE_RATE
+
+    def speech(self, seconds, seed):
+        # Voiced syllables with a random pitch contour, so the spectrum
+        # changes like in speech.
+        random = np.random.default_rng(seed)
+        t = np.arange(int(seconds * self.RATE)) / self.RATE
+        knots = np.arange(0, seconds + 0.25, 0.25)
+        pitch = np.interp(t, knots, random.uniform(100, 250, len(knots)))
+        phase = 2 * np.pi * np.cumsum(pitch) / self.RATE
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 15))
+        envelope = np.clip(np.sin(2 * np.pi * 3 * t), 0, None)
+        return (0.2 * voiced * envelope).astype(np.float32)
+
+    def copy(self, samples):
+        # Quieter, noisier, low-passed and with the first 1.23 s trimmed.
+        random = np.random.default_rng(1)
+        copy = 0.6 * samples + random.normal(0, 0.005, len(samples))
+        copy = np.convolve(copy, np.ones(3) / 3, mode="same")
+        return copy[int(1.23 * self.RATE):].astype(np.float32)
+
+    def write_audio(self, generator, samples):
+        path = f"media/{generator.audio_track}.wav"
+        os.makedirs("media", exist_ok=True)
+        pcm = (np.clip(samples, -1, 1) * 32767).astype(np.int16)
+        with wave.open(path, "wb") as file:
+            file.setnchannels(1)
+            file.setsampwidth(2)
+            file.setframerate(self.RATE)
+            file.writeframes(pcm.tobytes())
+        self.addCleanup(generator.delete_transcribed_text)
+
+    def transcribe(self, samples, text="Transcribed."):
+        generator = AudioQuestionGenerator()
+        self.write_audio(generator, samples)
+        with patch.object(generator, "transcribe_audio",
+                          return_value={"text": text,
+                                        "speech_seconds": 20.0}
+                          ) as mock_transcribe:
+            generator.transcribe_whisper()
+        return generator, mock_transcribe
+
+    def test_copy_matches_and_other_audio_does_not(self):
+        original = fingerprint.fingerprint(self.speech(30, seed=0))
+        copy = fingerprint.fingerprint(self.copy(self.speech(30, seed=0)))
+        other = fingerprint.fingerprint(self.speech(30, seed=2))
+
+        self.assertLess(fingerprint.bit_error_rate(original, copy, 30),
+                        0.2)
+        self.assertGreater(fingerprint.bit_error_rate(original, other, 30),
+                           0.4)
+        self.assertAlmostEqual(len(original), 30 * 10, delta=10)
+        self.assertEqual(
+            len(fingerprint.to_bytes(original)), 4 * len(original)
+            )
+
+    def test_transcript_of_same_audio_is_reused(self):
+        first, first_transcribe = self.transcribe(self.speech(30, seed=0))
+        second, second_transcribe = self.transcribe(
+            self.copy(self.speech(30, seed=0)), text="Not used."
+            )
+
+        first_transcribe.assert_called_once()
+        second_transcribe.assert_not_called()
+        self.assertFalse(first.transcript_reused)
+        self.assertTrue(second.transcript_reused)
+        self.assertEqual(second.transcript, "Transcribed.")
+        self.assertEqual(second.speech_seconds, 20.0)
+        self.assertLess(second.fingerprint_ber, 0.2)
+        self.assertEqual(AudioFingerprint.objects.count(), 1)
+
+    def test_other_audio_is_transcribed(self):
+        self.transcribe(self.speech(30, seed=0))
+        other, transcribe = self.transcribe(self.speech(30, seed=2),
+                                            text="Other.")
+
+        transcribe.assert_called_once()
+        self.assertEqual(other.transcript, "Other.")
+        self.assertEqual(AudioFingerprint.objects.count(), 2)
+
+    @override_settings(QUIZ_FINGERPRINT_ENABLED=False)
+    def test_disabled_fingerprinting_stores_nothing(self):
+        self.transcribe(self.speech(30, seed=0))
+        _, transcribe = self.transcribe(self.speech(30, seed=0))
+
+        transcribe.assert_called_once()
+        self.assertFalse(AudioFingerprint.objects.exists())
+
+
+@override_settings(YTDLP_START_METHOD="fork")
+class AudioDownloadTest(SimpleTestCase):
+    def progress(self, downloaded, total=None, filename="media/audio"):
+        return {"status": "downloading", "filename": filename,
+                "downloaded_bytes": downloaded, "total_bytes": total}
+
+    def test_meter_counts_bytes_per_file(self):
+        meter = DownloadMeter(max_bytes=0)
+
+        meter(self.progress(100))
+        meter(self.progress(250))
+        meter(self.progress(40, filename="media/other"))
+
+        self.assertEqual(meter.bytes, 290)
+
+    def test_meter_stops_download_over_budget(self):
+        meter = DownloadMeter(max_bytes=1000)
+        meter(self.progress(900))
+
+        with self.assertRaises(DownloadBudgetExceeded):
+            meter(self.progress(1001))
+
+    def test_meter_stops_download_announcing_larger_size(self):
+        meter = DownloadMeter(max_bytes=1000)
+
+        with self.assertRaises(DownloadBudgetExceeded):
+            meter(self.progress(10, total=5000))
+
+    @override_settings(QUIZ_AUDIO_MIN_ABR=64, QUIZ_DOWNLOAD_FRAGMENTS=3,
+                       QUIZ_DOWNLOAD_MAX_BYTES=1000, YTDLP_ISOLATION=False)
+    @patch("yt_dlp.YoutubeDL")
+    def test_download_selects_small_audio_and_reports_bytes(
+        self, mock_yt_dlp
+    ):
+        def extract_info(url, download):
+            options = mock_yt_dlp.call_args.args[0]
+            for hook in options["progress_hooks"]:
+                hook(self.progress(600))
+            return {"duration": 60}
+
+        mock_yt_dlp.return_value.__enter__.return_value.extract_info \
+            .side_effect = extract_info
+        generator = AudioQuestionGenerator(job_id="download")
+
+        generator.download_audio("https://www.youtube.com/watch?v=abc")
+
+        options = mock_yt_dlp.call_args.args[0]
+        self.assertEqual(options["format"], "wa[abr>=64]/ba/w")
+        self.assertEqual(options["concurrent_fragment_downloads"], 3)
+        self.assertEqual(generator.download_bytes, 600)
+        self.assertEqual(generator.audio_duration, 60)
+
+    @override_settings(QUIZ_DOWNLOAD_MAX_BYTES=1000)
+    @patch("yt_dlp.YoutubeDL")
+    def test_download_over_budget_removes_partial_file(self, mock_yt_dlp):
+        generator = AudioQuestionGenerator(job_id="budget")
+        partial = f"media/{generator.audio_track}.webm.part"
+
+        def extract_info(url, download):
+            with open(partial, "wb") as file:
+                file.write(b"x" * 2000)
+            options = mock_yt_dlp.call_args.args[0]
+            options["progress_hooks"][0](self.progress(2000))
+
+        mock_yt_dlp.return_value.__enter__.return_value.extract_info \
+            .side_effect = extract_info
+
+        with self.assertRaises(DownloadBudgetExceeded):
+            generator.download_audio("https://www.youtube.com/watch?v=abc")
+
+        self.assertFalse(os.path.exists(partial))
+        self.assertEqual(generator.download_bytes, 2000)
+
+
+@override_settings(YTDLP_ISOLATION=True, YTDLP_START_METHOD="fork",
+                   YTDLP_MAX_PROCESSES=2)
+class YtDlpIsolationTest(SimpleTestCase):
+    def test_result_of_child_is_returned(self):
+        self.assertEqual(ytdlp.run(lambda a, b: a + b, (2, 3), timeout=10), 5)
+
+    def test_runs_in_child_process(self):
+        self.assertNotEqual(ytdlp.run(os.getpid, (), timeout=10), os.getpid())
+
+    @override_settings(YTDLP_START_METHOD="forkserver")
+    def test_runs_in_forkserver_child(self):
+        self.assertNotEqual(ytdlp.run(os.getpid, (), timeout=60), os.getpid())
+
+    def test_error_of_child_is_raised(self):
+        def fail():
+            raise ValueError("Unsupported URL")
+
+        with self.assertRaisesMessage(ValueError, "Unsupported URL"):
+            ytdlp.run(fail, (), timeout=10)
+
+    def test_unpicklable_error_is_wrapped(self):
+        class LocalError(Exception):
+            pass
+
+        def fail():
+            error = LocalError("broken extractor")
+            error.download_bytes = 42
+            raise error
+
+        with self.assertRaisesMessage(YtDlpFailed, "broken extractor") as ctx:
+            ytdlp.run(fail, (), timeout=10)
+        self.assertEqual(ctx.exception.download_bytes, 42)
+
+    def test_crashed_child_fails(self):
+        with self.assertRaises(YtDlpFailed):
+            ytdlp.run(os._exit, (1,), timeout=10)
+
+    def test_hanging_child_is_killed(self):
+        started = time.monotonic()
+
+        with self.assertRaises(YtDlpTimeout):
+            ytdlp.run(time.sleep, (30,), timeout=0.5)
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(ytdlp._processes, set())
+
+    @patch("yt_dlp.YoutubeDL")
+    def test_extract_info_returns_plain_info(self, mock_yt_dlp):
+        mock_yt_dlp.return_value.__enter__.return_value.extract_info \
+            .return_value = {"duration": 60, "upload": timedelta(days=1)}
+
+        info = ytdlp.extract_info("https://www.youtube.com/watch?v=abc", {})
+
+        self.assertEqual(info, {"duration": 60, "upload": "1 day, 0:00:00"})
@@ -0,0 +1,339 @@
+"""
+Transcription service shared by all web workers.
+
+`python manage.py run_transcription_service` loads the Whisper model once
+and listens on a Unix socket (WHISPER_SERVICE_SOCKET). Web workers send
+it the path of a downloaded audio file or the audio bytes themselves and
+receive the transcript, so torch and the model only live in that one
+process and the web workers stay small.
+
+Requests are answered by one worker thread in the order they arrive.
+At most WHISPER_SERVICE_QUEUE requests wait at a time; further requests
+are refused instead of piling up behind a long transcription. The worker
+thread transcribes only while it holds a slot of the `CpuScheduler`.
+
+Without the service, every web worker process runs its own
+`TranscriptionService` (`local_service()`) without the socket, so
+transcriptions never run on the request threads.
+
+Every message is a 4-byte big-endian length followed by a JSON object.
+A request is either `{"path": "..."}` or `{"size": n, "suffix": ".wav"}`
+followed by `n` bytes of audio. The answer is the result of
+`transcribe_file` or `{"error": "...", "busy": bool}`. Audio larger than
+WHISPER_SERVICE_MAX_AUDIO_SIZE is refused before it is read, and paths
+must lie in `MEDIA_ROOT` (where the web workers download the audio) or
+the temporary directory, so a client cannot make the service read any
+file it can access.
+
+With QUIZ_VAD_ENABLED, `transcribe_file` passes only the speech of the
+audio to Whisper (see `quiz_app.vad`), both here and in the web workers.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from core.metrics import registry
+from quiz_app.scheduler import CpuScheduler
+
+logger = logging.getLogger("quiz_app.transcription")
+
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 1024 * 1024
+SUFFIX = re.compile(r"\.[A-Za-z0-9]{1,10}")
+
+
+class TranscriptionError(Exception):
+    """
+    Raised when the transcription service cannot transcribe the audio.
+    `busy` is True if the request was refused because the queue is full.
+    """
+
+    def __init__(self, message, busy=False):
+        super().__init__(message)
+        self.busy = busy
+
+
+def transcribe_file(model, path):
+    """
+    Transcribes the audio file at `path` with a loaded Whisper model.
+
+    With QUIZ_VAD_ENABLED only the speech segments are transcribed. If the
+    detection fails (e.g. the file is no PCM WAV), the whole file is
+    transcribed.
+
+    Returns a dict with `text`, `audio_seconds` and `speech_seconds` (the
+    durations are None without detection).
+    """
+    speech = None
+    if settings.QUIZ_VAD_ENABLED:
+        from quiz_app.vad import extract_speech
+
+        try:
+            speech = extract_speech(path)
+        except Exception as e:
+            logger.warning("Voice activity detection skipped for %s: %s",
+                           path, e)
+
+    if speech is None:
+        return {
+            "text": model.transcribe(path)["text"],
+            "audio_seconds": None,
+            "speech_seconds": None,
+        }
+
+    registry.inc("quizly_vad_skipped_seconds_total",
+                 amount=speech.skipped_seconds)
+    return {
+        "text": model.transcribe(speech.samples)["text"],
+        "audio_seconds": speech.audio_seconds,
+        "speech_seconds": speech.speech_seconds,
+    }
+
+
+def send_message(sock, message, payload=b""):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(HEADER.pack(len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def receive_message(sock):
+    """
+    Returns the JSON object of the next message and, if its header
+    announces a `size`, the audio bytes that follow it.
+
+    Raises:
+        - TranscriptionError: If the message or the announced audio is
+          larger than allowed.
+    """
+    (length,) = HEADER.unpack(receive_exactly(sock, HEADER.size))
+    if length > MAX_MESSAGE_SIZE:
+        raise TranscriptionError("Message is too large.")
+    message = json.loads(receive_exactly(sock, length))
+
+    size = message.get("size")
+    if size and (not isinstance(size, int) or size < 0
+                 or size > settings.WHISPER_SERVICE_MAX_AUDIO_SIZE):
+        raise TranscriptionError("Audio is too large.")
+    payload = receive_exactly(sock, size) if size else None
+    return message, payload
+
+
+def audio_path(path):
+    """
+    Returns the real path of an audio file sent by a client, which must
+    lie in `MEDIA_ROOT` or the temporary directory.
+    """
+    path = os.path.realpath(path)
+    for directory in (settings.MEDIA_ROOT, tempfile.gettempdir()):
+        directory = os.path.realpath(directory)
+        if os.path.commonpath([path, directory]) == directory:
+            return path
+    raise TranscriptionError("Audio path is not in an audio directory.")
+
+
+def receive_exactly(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise TranscriptionError("Connection closed unexpectedly.")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class TranscriptionService:
+    """
+    Runs the transcriptions one after another on a single worker thread
+    with one Whisper model. The thread runs with a lower priority and
+    transcribes only while it holds a slot of the scheduler.
+
+    Attributes:
+        - whisper_model (SharedWhisperModel): The model to transcribe with.
+        - jobs (Queue): Waiting transcriptions (`Future`, audio path,
+          model of the job or None).
+        - scheduler (CpuScheduler): Assigns the cores.
+
+    Methods:
+        - start(): Starts the worker thread.
+        - submit(path, whisper_model): Queues the audio file and returns a
+          `Future` of the result of `transcribe_file`. Raises
+          `TranscriptionError` if the queue is full.
+    """
+
+    def __init__(self, whisper_model, queue_size=None, scheduler=None):
+        self.whisper_model = whisper_model
+        self.jobs = queue.Queue(
+            maxsize=queue_size or settings.WHISPER_SERVICE_QUEUE
+        )
+        self.scheduler = scheduler or CpuScheduler()
+
+    def start(self):
+        thread = threading.Thread(target=self.work,
+                                  name="transcription-worker",
+                                  daemon=True
+                                  )
+        thread.start()
+        return thread
+
+    def submit(self, path, whisper_model=None):
+        future = Future()
+        try:
+            self.jobs.put_nowait((future, path, whisper_model))
+        except queue.Full:
+            raise TranscriptionError(
+                "The transcription queue is full.", busy=True
+            )
+        return future
+
+    def work(self):
+        self.scheduler.prepare_thread()
+        while True:
+            future, path, whisper_model = self.jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                model = (whisper_model or self.whisper_model).get()
+                with self.scheduler.transcription_slot():
+                    future.set_result(transcribe_file(model, path))
+            except Exception as e:
+                logger.exception("Transcription of %s failed.", path)
+                future.set_exception(e)
+
+
+_local_service = None
+_local_service_lock = threading.Lock()
+
+
+def local_service():
+    """
+    Returns the transcription service of this process, starting it on
+    first use. Jobs pass their own model.
+    """
+    global _local_service
+
+    with _local_service_lock:
+        if _local_service is None:
+            _local_service = TranscriptionService(None)
+            _local_service.start()
+    return _local_service
+
+
+class TranscriptionHandler(socketserver.BaseRequestHandler):
+    """
+    Answers one request of a web worker. Audio bytes are written to a
+    temporary file, which is removed after the transcription.
+    """
+
+    def handle(self):
+        temporary = None
+        try:
+            message, payload = receive_message(self.request)
+            if payload is not None:
+                suffix = message.get("suffix")
+                if not isinstance(suffix, str) or \
+                        not SUFFIX.fullmatch(suffix):
+                    suffix = ".wav"
+                with tempfile.NamedTemporaryFile(
+                    suffix=suffix, delete=False
+                ) as file:
+                    file.write(payload)
+                temporary = path = file.name
+            else:
+                path = audio_path(message["path"])
+
+            response = self.server.service.submit(path).result()
+            result = "ok"
+        except TranscriptionError as e:
+            response = {"error": str(e), "busy": e.busy}
+            result = "busy" if e.busy else "error"
+        except Exception as e:
+            response = {"error": str(e), "busy": False}
+            result = "error"
+        finally:
+            if temporary and os.path.exists(temporary):
+                os.remove(temporary)
+
+        registry.inc("quizly_transcription_requests_total", result=result)
+        try:
+            send_message(self.request, response)
+        except OSError:
+            logger.warning("Client left before the transcript was sent.")
+
+
+class TranscriptionServer(socketserver.ThreadingMixIn,
+                          socketserver.UnixStreamServer):
+    """
+    Accepts the connections of the web workers; every connection gets a
+    thread that waits for its queued transcription.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        self.service = service
+        super().__init__(path, TranscriptionHandler)
+
+
+class TranscriptionClient:
+    """
+    Sends audio to the transcription service.
+
+    Attributes:
+        - path (str): Path of the Unix socket of the service.
+        - timeout (float): Seconds to wait for a transcript, including
+          the time spent in the queue.
+
+    Methods:
+        - transcribe(path, audio, suffix): Transcribes the audio file at
+          `path` or the `audio` bytes and returns the result of
+          `transcribe_file` (`text`, `audio_seconds`, `speech_seconds`).
+
+    Raises:
+        - TranscriptionError: If the service is unreachable, refuses the
+          request or fails to transcribe the audio.
+    """
+
+    def __init__(self, path=None, timeout=None):
+        self.path = path or settings.WHISPER_SERVICE_SOCKET
+        self.timeout = timeout or settings.WHISPER_SERVICE_TIMEOUT
+
+    def transcribe(self, path=None, audio=None, suffix=".wav"):
+        if audio is not None:
+            message = {"size": len(audio), "suffix": suffix}
+        else:
+            message, audio = {"path": os.path.abspath(path)}, b""
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                try:
+                    send_message(sock, message, audio)
+                except BrokenPipeError:
+                    # The service refused the request before reading
+                    # the audio; its answer tells why.
+                    pass
+                response, _ = receive_message(sock)
+        except (OSError, ValueError) as e:
+            raise TranscriptionError(
+                f"Transcription service unavailable: {e}"
+            )
+
+        if "error" in response:
+            raise TranscriptionError(response["error"],
+                                     busy=response.get("busy", False))
+        return response
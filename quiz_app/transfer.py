@@ -0,0 +1,225 @@
+"""
+Export and import of quizzes as NDJSON (one JSON object per line).
+
+Every line holds one quiz with its questions:
+
+    {"owner": "...", "title": "...", "description": "...",
+     "video_url": "...", "created_at": "...",
+     "questions": [{"question_title": "...", "question_options": [...],
+                    "answer": "..."}]}
+
+`export_lines` reads the quizzes in chunks with `iterator()` and takes the
+questions from `Quiz.questions_cache`, so memory use does not grow with
+the number of quizzes. `QuizImporter` validates the lines and bulk-loads
+them in batches, one transaction per batch; quizzes keep the `created_at`
+of their line. The answers are always exported, as the format is meant
+for backups and migrations.
+"""
+
+import json
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import Quiz, QuizQuestions, QuizSearchDocument
+from .models import question_cache_entry
+from .search import search_document
+from .validators import validate_questions
+
+CHUNK_SIZE = 500
+QUESTION_FIELDS = ("question_title", "question_options", "answer")
+
+
+def export_lines(quizzes, chunk_size=CHUNK_SIZE):
+    """
+    Yields one NDJSON line (bytes) per quiz of the queryset.
+    """
+    rows = quizzes.order_by("id").values_list(
+        "owner__username",
+        "title",
+        "description",
+        "video_url",
+        "created_at",
+        "questions_cache",
+    )
+    for (owner, title, description, video_url, created_at,
+         questions) in rows.iterator(chunk_size=chunk_size):
+        line = json.dumps({
+            "owner": owner,
+            "title": title,
+            "description": description,
+            "video_url": video_url,
+            "created_at": created_at,
+            "questions": [
+                {field: question[field] for field in QUESTION_FIELDS}
+                for question in questions
+            ],
+        }, cls=DjangoJSONEncoder, ensure_ascii=False)
+        yield (line + "\n").encode("utf-8")
+
+
+class QuizImporter:
+    """
+    Bulk-loads quizzes from NDJSON lines.
+
+    Valid lines are collected into batches of `batch_size` quizzes. Every
+    batch is written in one transaction with one `bulk_create` per table;
+    `questions_cache` and the search documents are filled directly, since
+    bulk inserts bypass the signal handlers. `bulk_create` sets
+    `created_at` to the current time, so the `created_at` of the lines is
+    written afterwards with `bulk_update`. Invalid lines are skipped and
+    reported with their line number.
+
+    Attributes:
+        - owner (User): Owner of all imported quizzes; if None, the
+          `owner` username of every line is used.
+        - batch_size (int): Quizzes per transaction.
+        - imported (int): Number of imported quizzes.
+        - errors (list): `{"line": ..., "errors": ...}` per skipped line.
+
+    Methods:
+        - run(lines): Imports the lines (str or bytes) and returns self.
+    """
+
+    def __init__(self, owner=None, batch_size=CHUNK_SIZE):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.imported = 0
+        self.errors = []
+        self.owners = {}
+
+    def run(self, lines):
+        batch = []
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+
+            try:
+                batch.append(self.parse(line))
+            except ValidationError as e:
+                self.errors.append({"line": number, "errors": e.detail})
+                continue
+
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+
+        if batch:
+            self.write(batch)
+        return self
+
+    def parse(self, line):
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValidationError("Line does not contain valid JSON.")
+        if not isinstance(data, dict):
+            raise ValidationError("Line must contain a JSON object.")
+
+        title = data.get("title")
+        questions = data.get("questions")
+        if not isinstance(title, str) or not title.strip():
+            raise ValidationError({"title": ["This field is required."]})
+        if len(title) > 255:
+            raise ValidationError(
+                {"title": ["Ensure this field has no more than 255 "
+                           "characters."]}
+            )
+        if not isinstance(questions, list) or not questions:
+            raise ValidationError(
+                {"questions": ["At least one question is required."]}
+            )
+        if any(not isinstance(question, dict) for question in questions):
+            raise ValidationError(
+                {"questions": ["Every question must be a JSON object."]}
+            )
+        validate_questions(questions)
+        created_at = self.created_at(data.get("created_at"))
+
+        return Quiz(
+            owner=self.line_owner(data.get("owner")),
+            title=title,
+            description=data.get("description") or "",
+            video_url=str(data.get("video_url") or "")[:255],
+        ), [
+            QuizQuestions(**{
+                field: question[field] for field in QUESTION_FIELDS
+            })
+            for question in questions
+        ], created_at
+
+    def created_at(self, value):
+        if value in (None, ""):
+            return None
+        try:
+            created_at = parse_datetime(value) if isinstance(value, str) \
+                else None
+        except ValueError:
+            created_at = None
+        if created_at is None:
+            raise ValidationError(
+                {"created_at": ["Enter a valid date/time."]}
+            )
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+        return created_at
+
+    def line_owner(self, username):
+        if self.owner is not None:
+            return self.owner
+        if username not in self.owners:
+            self.owners[username] = User.objects.filter(
+                username=username
+            ).first()
+        if self.owners[username] is None:
+            raise ValidationError({"owner": [f"Unknown user {username!r}."]})
+        return self.owners[username]
+
+    def write(self, batch):
+        with transaction.atomic():
+            questions = QuizQuestions.objects.bulk_create(
+                [question for _, quiz_questions, _ in batch
+                 for question in quiz_questions],
+                batch_size=self.batch_size,
+            )
+
+            offset = 0
+            quizzes = []
+            for quiz, quiz_questions, _ in batch:
+                created = questions[offset:offset + len(quiz_questions)]
+                offset += len(quiz_questions)
+                quiz.questions_cache = [
+                    question_cache_entry(question) for question in created
+                ]
+                quizzes.append(quiz)
+            Quiz.objects.bulk_create(quizzes, batch_size=self.batch_size)
+
+            dated = []
+            for quiz, _, created_at in batch:
+                if created_at is not None:
+                    quiz.created_at = created_at
+                    dated.append(quiz)
+            Quiz.objects.bulk_update(dated, ["created_at"],
+                                     batch_size=self.batch_size)
+
+            through = Quiz.questions.through
+            through.objects.bulk_create(
+                [
+                    through(quiz_id=quiz.id, quizquestions_id=entry["id"])
+                    for quiz in quizzes
+                    for entry in quiz.questions_cache
+                ],
+                batch_size=self.batch_size,
+            )
+            QuizSearchDocument.objects.bulk_create(
+                [search_document(quiz) for quiz in quizzes],
+                batch_size=self.batch_size,
+            )
+
+        self.imported += len(batch)
@@ -0,0 +1,79 @@
+from rest_framework.exceptions import ValidationError
+
+OPTIONS_PER_QUESTION = 4
+MAX_TEXT_LENGTH = 255
+
+
+def question_errors(question_title, question_options, answer):
+    """
+    Returns the problems of one question as a list of messages.
+
+    Checks that the title is set, that there are exactly 4 distinct
+    options, that the answer is one of them and that no text exceeds
+    255 characters.
+    """
+    errors = []
+
+    if not question_title or not isinstance(question_title, str):
+        errors.append("The question title must not be empty.")
+    elif len(question_title) > MAX_TEXT_LENGTH:
+        errors.append(
+            f"The question title must not exceed {MAX_TEXT_LENGTH} "
+            "characters."
+        )
+
+    if (
+        not isinstance(question_options, (list, tuple))
+        or len(question_options) != OPTIONS_PER_QUESTION
+    ):
+        errors.append("Each question must have exactly 4 answer options.")
+        return errors
+
+    if not all(isinstance(option, str) and option
+               for option in question_options):
+        errors.append("Answer options must be non-empty texts.")
+        return errors
+
+    if len(set(question_options)) != OPTIONS_PER_QUESTION:
+        errors.append("The 4 answer options must be distinct.")
+    if any(len(option) > MAX_TEXT_LENGTH for option in question_options):
+        errors.append(
+            f"Answer options must not exceed {MAX_TEXT_LENGTH} characters."
+        )
+    if answer not in question_options:
+        errors.append("The answer must be one of the answer options.")
+
+    return errors
+
+
+def validate_questions(questions):
+    """
+    Validates a batch of questions in one pass.
+
+    `questions` may contain dicts (e.g. parsed JSON) or `QuizQuestions`
+    instances. Raises a `ValidationError` mapping the index of every
+    invalid question to its messages, so callers can check a whole batch
+    before inserting it with `bulk_create`.
+    """
+    errors = {}
+
+    for index, question in enumerate(questions):
+        if isinstance(question, dict):
+            values = (
+                question.get("question_title"),
+                question.get("question_options"),
+                question.get("answer"),
+            )
+        else:
+            values = (
+                question.question_title,
+                question.question_options,
+                question.answer,
+            )
+
+        messages = question_errors(*values)
+        if messages:
+            errors[index] = messages
+
+    if errors:
+        raise ValidationError({"questions": errors})